@@ -76,6 +76,15 @@ DATABASES = {
     }
 }
 
+# Cache (local memory by default; use a shared backend such as Redis or
+# Memcached when running several workers so cache-based state is shared)
+CACHES = {
+    'default': {
+        'BACKEND': _env('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': _env('CACHE_LOCATION', 'campuscare'),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -94,6 +103,11 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# How permission-checked media is sent: '' (Django FileResponse), 'nginx'
+# (X-Accel-Redirect to an internal location at MEDIA_ACCEL_PREFIX aliased to
+# MEDIA_ROOT) or 'apache' (X-Sendfile, needs mod_xsendfile)
+MEDIA_SENDFILE = _env('MEDIA_SENDFILE', '')
+MEDIA_ACCEL_PREFIX = _env('MEDIA_ACCEL_PREFIX', '/protected-media/')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -113,6 +127,13 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = _env('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = _env('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = _env('DEFAULT_FROM_EMAIL', 'CampusCare <noreply@campuscare.edu>')
+EMAIL_TIMEOUT = int(_env('EMAIL_TIMEOUT', '10'))
+# Issue emails are queued in the outbox table and sent by run_mail_worker;
+# failures retry after BACKOFF * 2**(attempt-1) seconds (capped) up to MAX_ATTEMPTS
+MAIL_OUTBOX_BATCH_SIZE = int(_env('MAIL_OUTBOX_BATCH_SIZE', '50'))
+MAIL_OUTBOX_MAX_ATTEMPTS = int(_env('MAIL_OUTBOX_MAX_ATTEMPTS', '8'))
+MAIL_OUTBOX_BACKOFF = int(_env('MAIL_OUTBOX_BACKOFF', '30'))
+MAIL_OUTBOX_MAX_BACKOFF = int(_env('MAIL_OUTBOX_MAX_BACKOFF', '3600'))
 
 # Chatbot
 CHATBOT_ENABLED = _env('CHATBOT_ENABLED', 'True').lower() in ('true', '1', 'yes')
@@ -120,6 +141,67 @@ CHATBOT_USE_GEMINI = _env('CHATBOT_USE_GEMINI', 'True').lower() in ('true', '1',
 CHATBOT_USE_OPENAI = _env('CHATBOT_USE_OPENAI', 'False').lower() in ('true', '1', 'yes')
 GEMINI_API_KEY = _env('GEMINI_API_KEY', '')
 OPENAI_API_KEY = _env('OPENAI_API_KEY', '')
+GEMINI_MODEL = _env('GEMINI_MODEL', 'gemini-1.5-flash')
+OPENAI_MODEL = _env('OPENAI_MODEL', 'gpt-3.5-turbo')
+# Optional API endpoint overrides (proxies, local fakes)
+GEMINI_API_ENDPOINT = _env('GEMINI_API_ENDPOINT', '')
+OPENAI_BASE_URL = _env('OPENAI_BASE_URL', '')
+# Per-call deadlines for LLM requests, in seconds
+CHATBOT_LLM_CONNECT_TIMEOUT = float(_env('CHATBOT_LLM_CONNECT_TIMEOUT', '3'))
+CHATBOT_LLM_READ_TIMEOUT = float(_env('CHATBOT_LLM_READ_TIMEOUT', '15'))
+# Chat messages allowed per user, as count/period (s, m, h, d)
+CHATBOT_RATE_LIMIT = _env('CHATBOT_RATE_LIMIT', '10/m')
+# Rate limiter state: 'database' (shared), 'redis' (shared; needs the redis package) or 'local' (per process)
+RATELIMIT_STORE = _env('RATELIMIT_STORE', 'database')
+RATELIMIT_REDIS_URL = _env('RATELIMIT_REDIS_URL', 'redis://127.0.0.1:6379/0')
+# Queue ChatMessage rows in memory and write them in batches (journaled, at-least-once)
+CHATBOT_WRITE_BEHIND = _env('CHATBOT_WRITE_BEHIND', 'False').lower() in ('true', '1', 'yes')
+CHATBOT_WRITE_BEHIND_BATCH = int(_env('CHATBOT_WRITE_BEHIND_BATCH', '50'))
+CHATBOT_WRITE_BEHIND_INTERVAL = float(_env('CHATBOT_WRITE_BEHIND_INTERVAL', '1'))
+CHATBOT_WRITE_BEHIND_JOURNAL_DIR = BASE_DIR / 'var' / 'chat_journal'
+# Rows queued per worker while the database is unavailable; further messages are written directly
+CHATBOT_WRITE_BEHIND_MAX_QUEUE = int(_env('CHATBOT_WRITE_BEHIND_MAX_QUEUE', '10000'))
+# Chat messages older than this are moved to gzip archives by archive_chat_messages
+CHATBOT_RETENTION_DAYS = int(_env('CHATBOT_RETENTION_DAYS', '90'))
+CHATBOT_ARCHIVE_DIR = BASE_DIR / 'var' / 'chat_archive'
+# Widget streams replies over Server-Sent Events instead of waiting for the full reply
+CHATBOT_STREAMING = _env('CHATBOT_STREAMING', 'True').lower() in ('true', '1', 'yes')
+# Serve chat_send from the async view (run under ASGI, e.g. uvicorn campuscare.asgi:application)
+CHATBOT_ASYNC = _env('CHATBOT_ASYNC', 'False').lower() in ('true', '1', 'yes')
+# Async view: delay before hedging to the next backend, and overall LLM budget (seconds)
+CHATBOT_HEDGE_DELAY = float(_env('CHATBOT_HEDGE_DELAY', '0.5'))
+CHATBOT_LATENCY_BUDGET = float(_env('CHATBOT_LATENCY_BUDGET', '8'))
+# Circuit breaker per LLM backend: trip when at least MIN_CALLS calls in WINDOW
+# seconds have an ERROR_RATE share of failures or calls slower than SLOW_MS,
+# then skip the backend for COOLDOWN seconds before sending a probe
+CHATBOT_BREAKER_WINDOW = float(_env('CHATBOT_BREAKER_WINDOW', '60'))
+CHATBOT_BREAKER_MIN_CALLS = int(_env('CHATBOT_BREAKER_MIN_CALLS', '5'))
+CHATBOT_BREAKER_ERROR_RATE = float(_env('CHATBOT_BREAKER_ERROR_RATE', '0.5'))
+CHATBOT_BREAKER_SLOW_MS = float(_env('CHATBOT_BREAKER_SLOW_MS', '5000'))
+CHATBOT_BREAKER_COOLDOWN = float(_env('CHATBOT_BREAKER_COOLDOWN', '30'))
+# LLM reply cache: 'local' (per process), 'django' (shared cache) or 'off'
+CHATBOT_RESPONSE_CACHE = _env('CHATBOT_RESPONSE_CACHE', 'local')
+CHATBOT_RESPONSE_CACHE_TTL = int(_env('CHATBOT_RESPONSE_CACHE_TTL', '3600'))
+CHATBOT_RESPONSE_CACHE_MAX_ENTRIES = int(_env('CHATBOT_RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+CHATBOT_RESPONSE_CACHE_DROP_STOP_WORDS = True
+CHATBOT_FAQ_RETRIEVAL = _env('CHATBOT_FAQ_RETRIEVAL', 'True').lower() in ('true', '1', 'yes')
+CHATBOT_FAQ_MIN_CONFIDENCE = float(_env('CHATBOT_FAQ_MIN_CONFIDENCE', '0.2'))
+CHATBOT_FAQ_INDEX_DIR = BASE_DIR / 'var' / 'faq_index'
+# Seconds a worker trusts its FAQ index before re-reading the FAQ table's version
+CHATBOT_FAQ_INDEX_RECHECK = float(_env('CHATBOT_FAQ_INDEX_RECHECK', '5'))
+# Per-user cache of latest issue summaries for "track my issue" answers
+CHATBOT_ISSUE_CONTEXT_SIZE = 5
+CHATBOT_ISSUE_CONTEXT_TTL = 600
+# Local intent classifier (train with train_intent_model); confident messages skip the LLM
+CHATBOT_LOCAL_INTENT = _env('CHATBOT_LOCAL_INTENT', 'True').lower() in ('true', '1', 'yes')
+CHATBOT_INTENT_THRESHOLD = float(_env('CHATBOT_INTENT_THRESHOLD', '0.9'))
+CHATBOT_INTENT_MODEL = BASE_DIR / 'var' / 'intent_model.npz'
+
+# New issues whose estimated text similarity (0-1) to an open issue in the same
+# category and building reaches this are offered to the reporter as duplicates.
+# Matches the LSH bands in issues.dedup: issues much less similar are rarely
+# bucket candidates in the first place
+ISSUE_DUPLICATE_THRESHOLD = float(_env('ISSUE_DUPLICATE_THRESHOLD', '0.5'))
 
 # File upload validation (5MB max)
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880
@@ -12,6 +12,7 @@ urlpatterns = [
     path('chatbot/', include('chatbot.urls')),
 ]
 
+# Media is not served from MEDIA_URL: issue photos go through issues:issue_photo,
+# which checks access first
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,17 +1,27 @@
 """AI/rule-based logic for CampusCare chatbot."""
 import re
+import asyncio
 import logging
+from functools import lru_cache
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from issues.models import Issue
+from .matcher import KeywordMatcher
+from .faq_index import get_faq_index
+from .backends import get_backend
+from .issue_context import get_recent_issues
+from .response_cache import get_cached_response, cache_response
+from . import intent_model
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
-# Intent keywords for rule-based matching
+# Intent keywords for rule-based matching, checked in order. Tracking comes
+# first: "status of my issue" mentions "issue" but asks about an existing one.
 INTENTS = {
+    'track_issue': ['status', 'track', 'update', 'my complaint', 'my issue', 'my issues', 'last complaint', 'progress'],
     'report_issue': ['report', 'submit', 'file', 'lodge', 'complaint', 'issue', 'problem', 'broken', 'not working'],
-    'track_issue': ['status', 'track', 'update', 'my complaint', 'my issue', 'last complaint', 'progress'],
     'faq': ['how', 'what', 'when', 'where', 'who', 'why', 'faq', 'help', 'guide'],
     'contact_admin': ['contact', 'admin', 'speak', 'talk', 'human', 'representative'],
     'troubleshooting': ['fix', 'troubleshoot', 'solve', 'myself', 'before reporting', 'steps'],
@@ -27,12 +37,56 @@ CATEGORY_KEYWORDS = {
 }
 
 
-def suggest_category(text):
+# Hardcoded FAQ fallbacks, used when no FAQ entry matches
+HARDCODED_FAQS = [
+    {'q': ['how to report', 'submit issue', 'report a problem'],
+     'a': 'To report an issue, go to Issues > Submit Issue and fill in the form with title, description, category, and location.'},
+    {'q': ['where to report', 'report location'],
+     'a': 'You can report issues from the Submit Issue page accessible from your dashboard or the navigation menu.'},
+    {'q': ['how long', 'resolution time', 'when will it be fixed'],
+     'a': 'Resolution time depends on priority. Critical issues are addressed first. You can track your issue status in the Issues section.'},
+    {'q': ['electrical', 'lights', 'power'],
+     'a': "For electrical issues like lights or power, select 'Electrical' as the category when reporting. Include building and room number."},
+    {'q': ['plumbing', 'leak', 'water'],
+     'a': "For plumbing issues, select 'Plumbing' as the category. If it's urgent (flooding), mark priority as High or Critical."},
+    {'q': ['wifi', 'internet', 'network'],
+     'a': "For WiFi or network issues, select 'Network' category. Try restarting your device before reporting."},
+]
+
+DEFAULT_FAQ_ANSWER = "I'm not sure about that. You can submit an issue from the Issues menu, or contact admin for help."
+
+STATIC_KEYWORDS = frozenset(
+    [kw for kws in INTENTS.values() for kw in kws]
+    + [kw for kws in CATEGORY_KEYWORDS.values() for kw in kws]
+    + [kw for item in HARDCODED_FAQS for kw in item['q']]
+)
+_STATIC_MATCHER = KeywordMatcher(STATIC_KEYWORDS)
+
+
+@lru_cache(maxsize=8)
+def _build_matcher(faq_keywords):
+    return KeywordMatcher(STATIC_KEYWORDS | faq_keywords)
+
+
+def get_keyword_matcher(faq_keywords=None):
+    """Matcher over intent, category, hardcoded and FAQ keywords."""
+    if faq_keywords is None:
+        faq_keywords = get_faq_index().keywords
+    return _build_matcher(faq_keywords)
+
+
+def find_keywords(text, faq_keywords=None):
+    """Every known keyword contained in ``text``, found in a single pass."""
+    return get_keyword_matcher(faq_keywords).find(text.lower())
+
+
+def suggest_category(text, hits=None):
     """Suggest issue category based on user text."""
-    text_lower = text.lower()
+    if hits is None:
+        hits = _STATIC_MATCHER.find(text.lower())
     scores = {}
     for cat, keywords in CATEGORY_KEYWORDS.items():
-        score = sum(1 for kw in keywords if kw in text_lower)
+        score = sum(1 for kw in keywords if kw in hits)
         if score > 0:
             scores[cat] = score
     if scores:
@@ -40,69 +94,104 @@ def suggest_category(text):
     return 'other'
 
 
-def detect_intent(text):
+def detect_intent(text, hits=None):
     """Detect user intent from message."""
-    text_lower = text.lower().strip()
+    if hits is None:
+        hits = _STATIC_MATCHER.find(text.lower().strip())
     for intent, keywords in INTENTS.items():
-        if any(kw in text_lower for kw in keywords):
+        if any(kw in hits for kw in keywords):
             return intent
     return 'faq'  # default
 
 
-def get_faq_response(text, user=None):
-    """Match against FAQ model or fallback to hardcoded FAQs."""
-    from .models import FAQ
-    text_lower = text.lower()
-    faqs = FAQ.objects.filter(is_active=True)
-    for faq in faqs:
-        kws = [k.strip().lower() for k in faq.keywords.split(',') if k.strip()]
-        if any(kw in text_lower for kw in kws):
-            return faq.answer
+def retrieve_faq_answer(text, index=None):
+    """Best-ranked FAQ answer for ``text`` if retrieval is confident enough."""
+    if not getattr(settings, 'CHATBOT_FAQ_RETRIEVAL', True):
+        return None
+    if index is None:
+        index = get_faq_index()
+    if not len(index):
+        return None
+    min_confidence = getattr(settings, 'CHATBOT_FAQ_MIN_CONFIDENCE', 0.2)
+    results = index.retriever.search(text, k=1, min_confidence=min_confidence)
+    if results:
+        return index.entries[results[0][0]][1]
+    return None
+
+
+def is_user_specific(text):
+    """True if the message asks about the user's own issues (any track_issue keyword)."""
+    hits = _STATIC_MATCHER.find(text.lower())
+    return any(kw in hits for kw in INTENTS['track_issue'])
+
+
+def get_faq_response(text, user=None, hits=None, index=None):
+    """Rank FAQs for the text, then fall back to keyword and hardcoded FAQs."""
+    if index is None:
+        index = get_faq_index()
+    answer = retrieve_faq_answer(text, index)
+    if answer:
+        return answer
+    if hits is None:
+        hits = find_keywords(text, index.keywords)
+    for kws, answer in index.entries:
+        if any(kw in hits for kw in kws):
+            return answer
     # Hardcoded fallbacks
-    hardcoded = [
-        {'q': ['how to report', 'submit issue', 'report a problem'],
-         'a': 'To report an issue, go to Issues > Submit Issue and fill in the form with title, description, category, and location.'},
-        {'q': ['where to report', 'report location'],
-         'a': 'You can report issues from the Submit Issue page accessible from your dashboard or the navigation menu.'},
-        {'q': ['how long', 'resolution time', 'when will it be fixed'],
-         'a': 'Resolution time depends on priority. Critical issues are addressed first. You can track your issue status in the Issues section.'},
-        {'q': ['electrical', 'lights', 'power'],
-         'a': "For electrical issues like lights or power, select 'Electrical' as the category when reporting. Include building and room number."},
-        {'q': ['plumbing', 'leak', 'water'],
-         'a': "For plumbing issues, select 'Plumbing' as the category. If it's urgent (flooding), mark priority as High or Critical."},
-        {'q': ['wifi', 'internet', 'network'],
-         'a': "For WiFi or network issues, select 'Network' category. Try restarting your device before reporting."},
-    ]
-    for item in hardcoded:
-        if any(k in text_lower for k in item['q']):
+    for item in HARDCODED_FAQS:
+        if any(k in hits for k in item['q']):
             return item['a']
-    return "I'm not sure about that. You can submit an issue from the Issues menu, or contact admin for help."
+    return DEFAULT_FAQ_ANSWER
 
 
 def get_user_last_issue(user):
-    """Get user's latest reported issue."""
-    if not user or not user.is_authenticated:
-        return None
-    return Issue.objects.filter(reported_by=user).order_by('-created_at').first()
+    """Summary of the user's latest reported issue, or None."""
+    issues = get_recent_issues(user, 1)
+    return issues[0] if issues else None
+
+
+_COUNT_WORDS = {'two': 2, 'three': 3, 'four': 4, 'five': 5, 'all': 0}
+_LAST_N_RE = re.compile(r'\b(?:last|latest|recent)\s+(\d+|two|three|four|five|all)\b')
+
+
+def requested_issue_count(text):
+    """How many issues a status question asks about ("my last 3 issues"), at least 1."""
+    match = _LAST_N_RE.search(text.lower())
+    if not match:
+        return 1
+    value = match.group(1)
+    count = int(value) if value.isdigit() else _COUNT_WORDS[value]
+    limit = int(getattr(settings, 'CHATBOT_ISSUE_CONTEXT_SIZE', 5))
+    return min(count, limit) if count > 0 else limit
+
 
+def generate_response(user, message, intent=None):
+    """Generate chatbot response based on message and user context.
 
-def generate_response(user, message):
-    """Generate chatbot response based on message and user context."""
+    ``intent`` overrides keyword intent detection (e.g. with the local classifier's label).
+    """
     message = message.strip()
     if not message:
         return "Please type a message."
 
-    intent = detect_intent(message)
+    index = get_faq_index()
+    hits = find_keywords(message, index.keywords)
+    if intent is None:
+        intent = detect_intent(message, hits)
 
     if intent == 'report_issue':
-        suggested = suggest_category(message)
+        suggested = suggest_category(message, hits)
         cat_display = dict(Issue.CATEGORY_CHOICES).get(suggested, suggested)
         return f"To report this issue, go to **Submit Issue** from the menu. Based on your description, I suggest category: **{cat_display}**. Fill in the form and upload a photo if possible."
 
     if intent == 'track_issue':
-        issue = get_user_last_issue(user)
-        if issue:
-            return f"Your latest issue: **{issue.title}** — Status: **{issue.get_status_display()}**. View full details in the Issues section."
+        issues = get_recent_issues(user, requested_issue_count(message))
+        if len(issues) > 1:
+            listed = '; '.join(f"**{i['title']}** — {i['status_display']}" for i in issues)
+            return f"Your latest {len(issues)} issues: {listed}. View full details in the Issues section."
+        if issues:
+            issue = issues[0]
+            return f"Your latest issue: **{issue['title']}** — Status: **{issue['status_display']}**. View full details in the Issues section."
         return "You haven't reported any issues yet. Go to Submit Issue to report one."
 
     if intent == 'contact_admin':
@@ -112,51 +201,104 @@ def generate_response(user, message):
         return "Before reporting: 1) Check if it's a simple fix (e.g., restart device for WiFi). 2) Note the exact location. 3) Take a photo if safe. If the problem persists, submit an issue with these details."
 
     # FAQ or default
-    return get_faq_response(message, user)
+    return get_faq_response(message, user, hits, index)
+
+
+def answer_locally(user, message):
+    """Rule-based reply if the local intent classifier is confident, else None.
+
+    None means the message should go to an LLM. Messages the classifier labels
+    ``other``, or that would only get the default FAQ answer, are escalated.
+    """
+    intent, confidence = intent_model.classify(message)
+    if intent is None:
+        return None
+    threshold = float(getattr(settings, 'CHATBOT_INTENT_THRESHOLD', 0.9))
+    if intent != intent_model.OTHER and confidence >= threshold:
+        response_text = generate_response(user, message, intent=intent)
+        if response_text != DEFAULT_FAQ_ANSWER:
+            intent_model.stats.incr('local')
+            return response_text
+    intent_model.stats.incr('escalated')
+    return None
 
 
 def get_gemini_response(message, user):
     """Use Google Gemini API for AI responses."""
-    if not getattr(settings, 'CHATBOT_USE_GEMINI', False):
-        return None
-    api_key = getattr(settings, 'GEMINI_API_KEY', '')
-    if not api_key:
-        return None
-    try:
-        import google.generativeai as genai
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        prompt = (
-            "You are CampusCare assistant for campus maintenance issues. Be concise. "
-            "Help users report issues, track status, answer FAQs. Suggest checking Issues section for status. "
-            "Guide to Submit Issue for new reports.\n\nUser: "
-        ) + message
-        response = model.generate_content(prompt)
-        return response.text.strip() if response and response.text else None
-    except Exception:
-        logger.exception("Gemini response generation failed")
-        return None
+    return get_backend('gemini').complete(message, user)
 
 
 def get_openai_response(message, user):
     """Optional: Use OpenAI API if configured."""
-    if not getattr(settings, 'CHATBOT_USE_OPENAI', False):
-        return None
-    api_key = getattr(settings, 'OPENAI_API_KEY', '')
-    if not api_key:
-        return None
+    return get_backend('openai').complete(message, user)
+
+
+# LLM backends in order of preference
+LLM_BACKENDS = ('gemini', 'openai')
+
+
+def get_llm_response(message, user):
+    """Cached LLM reply: try Gemini, then OpenAI. Returns (text, backend) or (None, None)."""
+    cached = get_cached_response(message)
+    if cached is not None:
+        return cached
+    for backend in LLM_BACKENDS:
+        response_text = get_backend(backend).complete(message, user)
+        if response_text is not None:
+            cache_response(message, response_text, backend)
+            return response_text, backend
+    return None, None
+
+
+async def get_llm_response_async(message, user):
+    """Hedged LLM reply: start backends in preference order, a hedge delay apart.
+
+    The first non-empty answer wins and the other calls are cancelled. If the
+    latency budget runs out first, returns (None, None) so the caller can use
+    the rule-based engine. Backend SDKs are blocking, so each call runs in a
+    worker thread; a cancelled call is abandoned and ends at its read deadline.
+    """
+    cached = get_cached_response(message)
+    if cached is not None:
+        return cached
+    waiting = [name for name in LLM_BACKENDS if get_backend(name).is_enabled()]
+    if not waiting:
+        return None, None
+
+    loop = asyncio.get_running_loop()
+    hedge_delay = float(getattr(settings, 'CHATBOT_HEDGE_DELAY', 0.5))
+    deadline = loop.time() + float(getattr(settings, 'CHATBOT_LATENCY_BUDGET', 8.0))
+    pending = {}
+
+    def launch():
+        name = waiting.pop(0)
+        call = sync_to_async(get_backend(name).complete, thread_sensitive=False)
+        pending[asyncio.ensure_future(call(message, user))] = name
+        return loop.time() + hedge_delay
+
+    next_hedge = launch()
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        system = "You are CampusCare assistant. Help users report campus maintenance issues, track status, and answer FAQs. Be concise."
-        resp = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": message}
-            ],
-            max_tokens=200
-        )
-        return resp.choices[0].message.content
-    except Exception:
-        return None
+        while pending or waiting:
+            if not pending:
+                # Everything in flight failed: don't wait for the hedge timer
+                next_hedge = launch()
+                continue
+            now = loop.time()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if waiting:
+                timeout = min(timeout, max(0.0, next_hedge - now))
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = pending.pop(task)
+                response_text = task.result()
+                if response_text is not None:
+                    cache_response(message, response_text, name)
+                    return response_text, name
+            if waiting and loop.time() >= next_hedge:
+                next_hedge = launch()
+    finally:
+        for task in pending:
+            task.cancel()
+    return None, None
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ChatbotConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'chatbot'
+    verbose_name = 'Chatbot'
+
+    def ready(self):
+        import chatbot.signals  # noqa: F401
@@ -0,0 +1,128 @@
+"""Retention for ChatMessage: move old rows into compressed, append-only archives.
+
+Archives are gzip JSON Lines under ``CHATBOT_ARCHIVE_DIR``, partitioned by
+month and by user shard::
+
+    2026-03/shard-07.jsonl.gz
+
+Each archiving pass appends a new gzip member, so files are never rewritten.
+Rows are written and fsynced before they are deleted from the table. A crash
+between those steps can only duplicate rows in the archive, and the reader
+drops duplicates by id.
+
+Only one run archives at a time: each holds an exclusive lock on
+``.archive.lock`` in the archive directory, and a run that finds it taken
+(cron overlapping a manual run) stops before reading or writing anything.
+"""
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from .models import ChatMessage
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+ARCHIVE_SHARDS = 16
+LOCK_NAME = '.archive.lock'
+
+
+class ArchiveBusy(RuntimeError):
+    """Another archiving run holds the archive lock."""
+
+
+def get_archive_dir():
+    return Path(getattr(settings, 'CHATBOT_ARCHIVE_DIR', settings.BASE_DIR / 'var' / 'chat_archive'))
+
+
+def archive_path(base, timestamp, user_id):
+    return Path(base) / timestamp.strftime('%Y-%m') / ('shard-%02d.jsonl.gz' % (user_id % ARCHIVE_SHARDS))
+
+
+def _append(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='ab') as gz:
+            for row in rows:
+                gz.write((json.dumps(row, default=str) + '\n').encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+@contextmanager
+def archive_lock(base):
+    """Hold the archive directory's lock; raises ``ArchiveBusy`` at once if another run has it."""
+    base = Path(base)
+    base.mkdir(parents=True, exist_ok=True)
+    with open(base / LOCK_NAME, 'a+b') as f:
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            raise ArchiveBusy('Another archive run is in progress in %s' % base) from None
+        # Released when the file is closed, also if this process dies
+        yield
+
+
+def archive_messages(before, batch_size=1000, base=None):
+    """Archive and delete messages older than ``before`` in batches. Returns the row count.
+
+    Walks the table in primary-key order, which follows insertion time, so
+    each batch is a short range scan without a timestamp index. Raises
+    ``ArchiveBusy`` if another run is archiving into ``base``.
+    """
+    base = base or get_archive_dir()
+    with archive_lock(base):
+        return _archive_batches(before, batch_size, base)
+
+
+def _archive_batches(before, batch_size, base):
+    total = 0
+    last_id = 0
+    while True:
+        rows = list(
+            ChatMessage.objects.filter(id__gt=last_id, timestamp__lt=before)
+            .order_by('id')
+            .values('id', 'user_id', 'message', 'response', 'timestamp')[:batch_size]
+        )
+        if not rows:
+            return total
+        partitions = {}
+        for row in rows:
+            partitions.setdefault(archive_path(base, row['timestamp'], row['user_id']), []).append(row)
+        for path, part in partitions.items():
+            _append(path, part)
+        ids = [row['id'] for row in rows]
+        ChatMessage.objects.filter(id__in=ids).delete()
+        last_id = ids[-1]
+        total += len(rows)
+
+
+def iter_user_archive(user_id, base=None):
+    """Yield a user's archived messages, oldest month first, as dicts."""
+    base = Path(base or get_archive_dir())
+    if not base.is_dir():
+        return
+    shard = 'shard-%02d.jsonl.gz' % (user_id % ARCHIVE_SHARDS)
+    for month in sorted(p for p in base.iterdir() if p.is_dir()):
+        path = month / shard
+        if not path.exists():
+            continue
+        seen = set()
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                if row['user_id'] != user_id or row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                row['timestamp'] = parse_datetime(row['timestamp'])
+                yield row
@@ -0,0 +1,282 @@
+"""LLM backend registry for the chatbot.
+
+Each backend builds its SDK client once per process and reuses it (and its
+keep-alive HTTP connections) for every message. Calls run with connect/read
+deadlines from settings and record latency counters.
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from .circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+GEMINI_PROMPT = (
+    "You are CampusCare assistant for campus maintenance issues. Be concise. "
+    "Help users report issues, track status, answer FAQs. Suggest checking Issues section for status. "
+    "Guide to Submit Issue for new reports.\n\nUser: "
+)
+OPENAI_SYSTEM_PROMPT = "You are CampusCare assistant. Help users report campus maintenance issues, track status, and answer FAQs. Be concise."
+
+
+class StreamInterrupted(Exception):
+    """A backend stream failed after some text was already yielded."""
+
+
+def _timeouts():
+    return (
+        float(getattr(settings, 'CHATBOT_LLM_CONNECT_TIMEOUT', 3.0)),
+        float(getattr(settings, 'CHATBOT_LLM_READ_TIMEOUT', 15.0)),
+    )
+
+
+class BackendStats:
+    """Thread-safe call, error and latency counters for one backend."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.errors = 0
+            self.total_ms = 0.0
+            self.max_ms = 0.0
+            self.last_ms = 0.0
+
+    def record(self, elapsed_ms, ok):
+        with self._lock:
+            self.calls += 1
+            if not ok:
+                self.errors += 1
+            self.total_ms += elapsed_ms
+            self.last_ms = elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'avg_ms': round(self.total_ms / self.calls, 1) if self.calls else 0.0,
+                'max_ms': round(self.max_ms, 1),
+                'last_ms': round(self.last_ms, 1),
+            }
+
+
+class LLMBackend:
+    """Base class: lazily built, process-wide client plus timed calls."""
+    name = ''
+
+    def __init__(self):
+        self.stats = BackendStats()
+        self.breaker = CircuitBreaker(self.name)
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_config = None
+
+    def is_enabled(self):
+        raise NotImplementedError
+
+    def get_config(self):
+        """Settings the client depends on; a change rebuilds the client."""
+        raise NotImplementedError
+
+    def build_client(self, config):
+        raise NotImplementedError
+
+    def call(self, client, message, user):
+        raise NotImplementedError
+
+    def open_stream(self, client, message, user):
+        raise NotImplementedError
+
+    def iter_text(self, stream):
+        raise NotImplementedError
+
+    def get_client(self):
+        config = self.get_config()
+        if self._client is None or self._client_config != config:
+            with self._lock:
+                if self._client is None or self._client_config != config:
+                    self._client = self.build_client(config)
+                    self._client_config = config
+        return self._client
+
+    def _record(self, start, ok, permit):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats.record(elapsed_ms, ok)
+        self.breaker.record(ok, elapsed_ms, permit)
+
+    def complete(self, message, user=None):
+        """Return the backend's reply, or None if disabled, circuit-open or the call failed."""
+        if not self.is_enabled():
+            return None
+        permit = self.breaker.allow()
+        if not permit:
+            return None
+        start = time.perf_counter()
+        ok = False
+        try:
+            text = self.call(self.get_client(), message, user)
+            ok = text is not None
+            return text
+        except Exception:
+            logger.exception("%s response generation failed", self.name)
+            return None
+        finally:
+            self._record(start, ok, permit)
+
+    def stream(self, message, user=None):
+        """Yield reply text chunks as the backend generates them.
+
+        Yields nothing if the backend is disabled, circuit-open or fails before
+        the first chunk. A failure after that raises ``StreamInterrupted``: the
+        text yielded so far is only part of a reply. Both count as errors.
+        Closing the generator (e.g. on client disconnect) closes the upstream
+        response.
+        """
+        if not self.is_enabled():
+            return
+        permit = self.breaker.allow()
+        if not permit:
+            return
+        start = time.perf_counter()
+        ok = False
+        yielded = False
+        upstream = None
+        try:
+            upstream = self.open_stream(self.get_client(), message, user)
+            for text in self.iter_text(upstream):
+                if text:
+                    yielded = True
+                    yield text
+            ok = yielded
+        except GeneratorExit:
+            # The client went away; not the backend's fault
+            ok = yielded
+            raise
+        except Exception as exc:
+            logger.exception("%s streaming failed", self.name)
+            if yielded:
+                raise StreamInterrupted(self.name) from exc
+        finally:
+            close = getattr(upstream, 'close', None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+            self._record(start, ok, permit)
+
+
+class GeminiBackend(LLMBackend):
+    name = 'gemini'
+
+    def is_enabled(self):
+        return bool(getattr(settings, 'CHATBOT_USE_GEMINI', False) and getattr(settings, 'GEMINI_API_KEY', ''))
+
+    def get_config(self):
+        return (
+            settings.GEMINI_API_KEY,
+            getattr(settings, 'GEMINI_API_ENDPOINT', ''),
+            getattr(settings, 'GEMINI_MODEL', 'gemini-1.5-flash'),
+            _timeouts(),
+        )
+
+    def build_client(self, config):
+        import google.generativeai as genai
+        from google.generativeai import client as genai_client
+        from requests.adapters import HTTPAdapter
+        api_key, endpoint, model, (connect, read) = config
+        client_options = {'api_endpoint': endpoint} if endpoint else None
+        # REST transport keeps a pooled requests session for the process.
+        genai.configure(api_key=api_key, transport='rest', client_options=client_options)
+
+        class TimeoutAdapter(HTTPAdapter):
+            # The SDK only takes a single deadline per request, which also caps
+            # a whole stream; requests applies (connect, read) per socket operation
+            def send(self, request, **kwargs):
+                kwargs['timeout'] = (connect, read)
+                return super().send(request, **kwargs)
+
+        session = genai_client.get_default_generative_client()._transport._session
+        adapter = TimeoutAdapter()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return genai.GenerativeModel(model)
+
+    def call(self, client, message, user):
+        response = client.generate_content(GEMINI_PROMPT + message)
+        return response.text.strip() if response and response.text else None
+
+    def open_stream(self, client, message, user):
+        return client.generate_content(GEMINI_PROMPT + message, stream=True)
+
+    def iter_text(self, stream):
+        for chunk in stream:
+            yield chunk.text
+
+
+class OpenAIBackend(LLMBackend):
+    name = 'openai'
+
+    def is_enabled(self):
+        return bool(getattr(settings, 'CHATBOT_USE_OPENAI', False) and getattr(settings, 'OPENAI_API_KEY', ''))
+
+    def get_config(self):
+        return (
+            settings.OPENAI_API_KEY,
+            getattr(settings, 'OPENAI_BASE_URL', ''),
+            getattr(settings, 'OPENAI_MODEL', 'gpt-3.5-turbo'),
+            _timeouts(),
+        )
+
+    def build_client(self, config):
+        import openai
+        api_key, base_url, _, (connect, read) = config
+        return openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url or None,
+            timeout=openai.Timeout(read, connect=connect),
+            max_retries=0,
+        )
+
+    def _create(self, client, message, **kwargs):
+        return client.chat.completions.create(
+            model=self._client_config[2],
+            messages=[
+                {"role": "system", "content": OPENAI_SYSTEM_PROMPT},
+                {"role": "user", "content": message}
+            ],
+            max_tokens=200,
+            **kwargs
+        )
+
+    def call(self, client, message, user):
+        return self._create(client, message).choices[0].message.content
+
+    def open_stream(self, client, message, user):
+        return self._create(client, message, stream=True)
+
+    def iter_text(self, stream):
+        for event in stream:
+            if event.choices:
+                yield event.choices[0].delta.content
+
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend(),
+    OpenAIBackend.name: OpenAIBackend(),
+}
+
+
+def get_backend(name):
+    return BACKENDS[name]
+
+
+def backend_stats():
+    """Latency counters for every registered backend."""
+    return {name: backend.stats.snapshot() for name, backend in BACKENDS.items()}
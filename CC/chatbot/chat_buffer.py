@@ -0,0 +1,346 @@
+"""Optional write-behind persistence for ChatMessage rows.
+
+With ``CHATBOT_WRITE_BEHIND`` off (the default) ``save_chat_message`` is a plain
+``ChatMessage.objects.create``. With it on, rows are queued in memory and a
+background thread writes them with ``bulk_create`` once ``BATCH`` rows are
+waiting or ``FLUSH_INTERVAL`` seconds have passed, and again at exit.
+
+Durability is at-least-once: every queued row is first appended (and
+fsynced) to a journal file, which is truncated only after its rows are
+committed. Each process journals to ``<pid>-<uuid>.jsonl``, so a later process
+that happens to get the same PID never writes into an old journal. Journals
+left behind by a crashed process are claimed by an atomic rename and replayed
+by the next process that starts the buffer (or by ``flush_chat_journal``), so
+a row can be written twice but is never lost to a worker crash.
+
+A row the database rejects on its own (say its user was deleted meanwhile)
+is moved to ``dead_letter/<pid>-<uuid>.jsonl`` under the journal directory
+instead of blocking the queue. When the database is down, rows stay queued
+up to ``CHATBOT_WRITE_BEHIND_MAX_QUEUE``; beyond that messages are written
+directly. Queued rows of other workers are read from their journals, so chat
+history shows them whichever worker serves it (workers must share the
+journal directory, i.e. run on one host).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# Errors caused by the row itself: retrying the same row can never succeed
+_ROW_ERRORS = (IntegrityError, DataError)
+DEAD_LETTER_DIR = 'dead_letter'
+
+
+def get_journal_dir():
+    return Path(getattr(settings, 'CHATBOT_WRITE_BEHIND_JOURNAL_DIR', settings.BASE_DIR / 'var' / 'chat_journal'))
+
+
+def _row_to_json(obj):
+    return json.dumps({
+        'user_id': obj.user_id, 'message': obj.message,
+        'response': obj.response, 'timestamp': obj.timestamp.isoformat(),
+    })
+
+
+def _row_from_json(line):
+    data = json.loads(line)
+    data['timestamp'] = parse_datetime(data['timestamp'])
+    return ChatMessage(**data)
+
+
+def _insert(rows):
+    with transaction.atomic():
+        ChatMessage.objects.bulk_create(rows, batch_size=500)
+
+
+def _write_rows(rows, dead_letter):
+    """Insert ``rows`` in order; returns ``(rows dealt with from the front, rows dead-lettered)``.
+
+    When the batch is rejected, rows are retried one per transaction (foreign
+    keys are only checked at commit) and rows failing on their own are
+    appended to the ``dead_letter`` file. Any other error stops at the row it
+    hit: the rest are left for the next attempt.
+    """
+    try:
+        _insert(rows)
+        return len(rows), 0
+    except _ROW_ERRORS:
+        pass
+    done, rejected = 0, []
+    try:
+        for obj in rows:
+            try:
+                _insert([obj])
+            except _ROW_ERRORS:
+                rejected.append(obj)
+            done += 1
+    except Exception:
+        logger.exception("Chat write-behind stopped after %d of %d rows", done, len(rows))
+    if rejected:
+        dead_letter.parent.mkdir(parents=True, exist_ok=True)
+        with open(dead_letter, 'a') as f:
+            for obj in rejected:
+                f.write(_row_to_json(obj) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        logger.error("%d chat rows rejected by the database were moved to %s", len(rejected), dead_letter)
+    return done, len(rejected)
+
+
+_process_id = None
+
+
+def process_id():
+    """``<pid>-<uuid>`` naming this process's journal; never reused by another process."""
+    global _process_id
+    if _process_id is None or not _process_id.startswith('%d-' % os.getpid()):
+        # Recomputed after a fork so children don't share their parent's journal
+        _process_id = '%d-%s' % (os.getpid(), uuid.uuid4().hex)
+    return _process_id
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_alive(owner):
+    """Whether the process named by a ``<pid>[-<uuid>]`` journal owner may still be running."""
+    try:
+        pid = int(owner.split('-', 1)[0])
+    except ValueError:
+        return True
+    # A reused PID only delays the replay until that process exits
+    return owner == process_id() or _pid_alive(pid)
+
+
+def _orphans(base, include_live):
+    """Journals (``*.jsonl``) and interrupted replays (``*.replay``) no running process owns."""
+    for path in base.glob('*.jsonl'):
+        owner = path.stem
+        if owner != process_id() and (include_live or not _owner_alive(owner)):
+            yield path, owner
+    for path in base.glob('*.replay'):
+        # <journal owner>.<claiming process>.replay, left by a replay that crashed
+        owner, _, claimer = path.stem.partition('.')
+        if claimer and not _owner_alive(claimer):
+            yield path, owner
+
+
+def replay_journals(directory=None, include_live=False):
+    """Write rows from journals of dead processes (or all, with ``include_live``). Returns the row count."""
+    base = Path(directory or get_journal_dir())
+    if not base.is_dir():
+        return 0
+    total = 0
+    for path, owner in _orphans(base, include_live):
+        claimed = base / ('%s.%s.replay' % (owner, process_id()))
+        try:
+            # rename is atomic: only one process claims each orphaned journal
+            os.rename(path, claimed)
+        except OSError:
+            continue
+        with open(claimed) as f:
+            rows = [_row_from_json(line) for line in f if line.strip()]
+        done, rejected = _write_rows(rows, base / DEAD_LETTER_DIR / ('%s.jsonl' % owner)) if rows else (0, 0)
+        total += done - rejected
+        if done < len(rows):
+            # Database unavailable: keep the unwritten rest for the next replay
+            with open(claimed, 'w') as f:
+                f.writelines(_row_to_json(obj) + '\n' for obj in rows[done:])
+            os.rename(claimed, base / ('%s.jsonl' % owner))
+            break
+        claimed.unlink()
+    return total
+
+
+def _journaled_rows(base, user_id):
+    """Rows for ``user_id`` still queued by other processes, read from their journals."""
+    rows = []
+    for path in base.glob('*.jsonl'):
+        if path.stem == process_id():
+            continue
+        try:
+            lines = path.read_text().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                if json.loads(line)['user_id'] == user_id:
+                    rows.append(_row_from_json(line))
+            except (ValueError, KeyError, TypeError):
+                continue  # a line still being written
+    return rows
+
+
+class WriteBehindBuffer:
+
+    def __init__(self, batch_size, flush_interval, journal_dir, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.journal_dir = Path(journal_dir)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._journal = None
+        self.stats = {'enqueued': 0, 'flushed': 0, 'batches': 0, 'failures': 0, 'dead_lettered': 0,
+                      'overflowed': 0, 'last_flush_ms': 0.0}
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._journal_path = self.journal_dir / ('%s.jsonl' % process_id())
+        self._dead_letter_path = self.journal_dir / DEAD_LETTER_DIR / ('%s.jsonl' % process_id())
+        try:
+            replay_journals(self.journal_dir)
+        except Exception:
+            logger.exception("Replaying chat journals failed")
+        self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, obj):
+        """Queue ``obj``; False when the queue is full and the caller must write it itself."""
+        with self._lock:
+            if len(self._pending) >= self.max_queue:
+                self.stats['overflowed'] += 1
+                return False
+            if self._journal is None:
+                self._journal = open(self._journal_path, 'a')
+            self._journal.write(_row_to_json(obj) + '\n')
+            self._sync_journal()
+            self._pending.append(obj)
+            self.stats['enqueued'] += 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        return True
+
+    def _sync_journal(self):
+        # flush() only reaches the OS; fsync() makes the row survive a machine crash too
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def pending_for_user(self, user_id):
+        with self._lock:
+            return [obj for obj in self._pending if obj.user_id == user_id]
+
+    def flush(self):
+        """Write every queued row; rows the database can't take right now stay queued.
+
+        Returns the number of rows taken off the queue (written or dead-lettered).
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+            start = time.perf_counter()
+            try:
+                done, rejected = _write_rows(batch, self._dead_letter_path)
+            except Exception:
+                done = 0
+                logger.exception("Chat write-behind flush failed; %d rows kept", len(batch))
+            if not done:
+                self.stats['failures'] += 1
+                return 0
+            with self._lock:
+                del self._pending[:done]
+                # Rewrite the journal with whatever arrived during the flush
+                if self._journal is not None:
+                    self._journal.seek(0)
+                    self._journal.truncate()
+                    for obj in self._pending:
+                        self._journal.write(_row_to_json(obj) + '\n')
+                    self._sync_journal()
+                self.stats['flushed'] += done - rejected
+                self.stats['dead_lettered'] += rejected
+                self.stats['batches'] += 1
+                self.stats['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            return done
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+        with self._lock:
+            if self._journal is not None and not self._pending:
+                self._journal.close()
+                self._journal = None
+                self._journal_path.unlink(missing_ok=True)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, queued=len(self._pending))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """The process-wide buffer, or None when write-behind is disabled."""
+    global _buffer
+    if not getattr(settings, 'CHATBOT_WRITE_BEHIND', False):
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer(
+                    int(getattr(settings, 'CHATBOT_WRITE_BEHIND_BATCH', 50)),
+                    float(getattr(settings, 'CHATBOT_WRITE_BEHIND_INTERVAL', 1.0)),
+                    get_journal_dir(),
+                    int(getattr(settings, 'CHATBOT_WRITE_BEHIND_MAX_QUEUE', 10000)),
+                )
+    return _buffer
+
+
+def save_chat_message(user, message, response):
+    """Persist a chat exchange, directly or through the write-behind buffer."""
+    buffer = get_buffer()
+    if buffer is None:
+        return ChatMessage.objects.create(user=user, message=message, response=response)
+    obj = ChatMessage(user=user, message=message, response=response, timestamp=timezone.now())
+    if not buffer.add(obj):
+        # Queue full (database down for a while): don't grow memory any further
+        obj.save()
+    return obj
+
+
+def pending_messages(user_id):
+    """Rows for ``user_id`` queued but not yet written by any worker (read-your-writes).
+
+    A row may also already be in the table when a flush has just committed;
+    callers drop those copies.
+    """
+    buffer = get_buffer()
+    if buffer is None:
+        return []
+    return buffer.pending_for_user(user_id) + _journaled_rows(buffer.journal_dir, user_id)
+
+
+def buffer_stats():
+    buffer = _buffer
+    return buffer.snapshot() if buffer is not None else None
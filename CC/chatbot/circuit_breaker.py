@@ -0,0 +1,144 @@
+"""Per-backend circuit breakers shared across workers through the Django cache.
+
+A breaker is ``closed`` while a backend is healthy. When the share of failed
+or slow calls in the current window crosses the threshold it trips ``open``
+and calls are skipped without touching the network. After the cooldown one
+worker gets to send a probe (``half_open``); success closes the breaker,
+failure reopens it.
+
+Every update is a single atomic cache operation: calls, failures and slow
+calls are ``cache.incr`` counters per window, the open marker and the probe
+are taken with ``cache.add``, so concurrent workers never overwrite each
+other. Only the worker holding the probe token decides how ``half_open``
+ends.
+"""
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+TRANSITIONS = ('closed->open', 'open->half_open', 'half_open->closed', 'half_open->open')
+
+# Holds the time the breaker opened; absent while closed
+OPENED_KEY = 'chatbot:breaker:%s:opened'
+PROBE_KEY = 'chatbot:breaker:%s:probe'
+# Bumped on every close/reset so counts from before the trip start over
+GENERATION_KEY = 'chatbot:breaker:%s:generation'
+COUNTER_KEY = 'chatbot:breaker:%s:%d:%d:%s'
+TRANSITION_KEY = 'chatbot:breaker:%s:transitions:%s'
+
+
+def _setting(name, default):
+    return float(getattr(settings, name, default))
+
+
+def _incr(key, timeout=None):
+    cache.add(key, 0, timeout=timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired or evicted between add() and incr()
+        cache.add(key, 1, timeout=timeout)
+        return 1
+
+
+class CircuitBreaker:
+
+    def __init__(self, name):
+        self.name = name
+
+    def _window_keys(self):
+        generation = cache.get(GENERATION_KEY % self.name) or 0
+        window = int(time.time() // _setting('CHATBOT_BREAKER_WINDOW', 60))
+        return {kind: COUNTER_KEY % (self.name, generation, window, kind) for kind in ('calls', 'failures', 'slow')}
+
+    def _counts(self, keys):
+        values = cache.get_many(list(keys.values()))
+        return {kind: values.get(key, 0) for kind, key in keys.items()}
+
+    def _transition(self, name):
+        _incr(TRANSITION_KEY % (self.name, name))
+
+    def _close(self):
+        _incr(GENERATION_KEY % self.name)
+        cache.delete(OPENED_KEY % self.name)
+
+    def allow(self):
+        """Whether a call may go out now. Open breakers let one probe through after the cooldown.
+
+        Returns a permit to hand back to ``record``: False when refused,
+        True for an ordinary call, the probe token for the probe call.
+        """
+        opened_at = cache.get(OPENED_KEY % self.name)
+        if opened_at is None:
+            return True
+        if time.time() - opened_at < _setting('CHATBOT_BREAKER_COOLDOWN', 30):
+            return False
+        # Cooldown over: only the worker that wins the probe lock calls out
+        token = uuid.uuid4().hex
+        probe_timeout = _setting('CHATBOT_LLM_CONNECT_TIMEOUT', 3) + _setting('CHATBOT_LLM_READ_TIMEOUT', 15)
+        if not cache.add(PROBE_KEY % self.name, token, timeout=probe_timeout):
+            return False
+        self._transition('open->half_open')
+        return token
+
+    def record(self, ok, elapsed_ms, permit=True):
+        """Feed the outcome of a call made with ``permit`` into the breaker."""
+        slow = elapsed_ms > _setting('CHATBOT_BREAKER_SLOW_MS', 5000)
+        if isinstance(permit, str):
+            # A probe that outlived its lock lost the right to decide
+            if cache.get(PROBE_KEY % self.name) == permit:
+                if ok and not slow:
+                    self._close()
+                    self._transition('half_open->closed')
+                else:
+                    cache.set(OPENED_KEY % self.name, time.time(), timeout=None)
+                    self._transition('half_open->open')
+                cache.delete(PROBE_KEY % self.name)
+            return
+        if cache.get(OPENED_KEY % self.name) is not None:
+            return
+        window = _setting('CHATBOT_BREAKER_WINDOW', 60)
+        keys = self._window_keys()
+        _incr(keys['calls'], timeout=2 * window)
+        if not ok:
+            _incr(keys['failures'], timeout=2 * window)
+        elif slow:
+            _incr(keys['slow'], timeout=2 * window)
+        counts = self._counts(keys)
+        calls = counts['calls']
+        if (calls >= _setting('CHATBOT_BREAKER_MIN_CALLS', 5)
+                and (counts['failures'] + counts['slow']) / calls >= _setting('CHATBOT_BREAKER_ERROR_RATE', 0.5)):
+            # add() so the trip is counted once however many workers see it
+            if cache.add(OPENED_KEY % self.name, time.time(), timeout=None):
+                self._transition('closed->open')
+
+    def reset(self):
+        self._close()
+        cache.delete(PROBE_KEY % self.name)
+        cache.delete_many([TRANSITION_KEY % (self.name, t) for t in TRANSITIONS])
+
+    def snapshot(self):
+        opened_at = cache.get(OPENED_KEY % self.name)
+        retry_in = 0
+        if opened_at is None:
+            state = CLOSED
+        elif cache.get(PROBE_KEY % self.name) is not None:
+            state = HALF_OPEN
+        else:
+            state = OPEN
+            retry_in = max(0, int(opened_at + _setting('CHATBOT_BREAKER_COOLDOWN', 30) - time.time()))
+        counts = self._counts(self._window_keys())
+        transitions = cache.get_many([TRANSITION_KEY % (self.name, t) for t in TRANSITIONS])
+        return {
+            'state': state,
+            'calls': counts['calls'],
+            'failures': counts['failures'],
+            'slow': counts['slow'],
+            'retry_in': retry_in,
+            'transitions': {t: transitions[TRANSITION_KEY % (self.name, t)]
+                            for t in TRANSITIONS if TRANSITION_KEY % (self.name, t) in transitions},
+        }
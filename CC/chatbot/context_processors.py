@@ -5,4 +5,5 @@ def chatbot_context(request):
     """Add chatbot visibility to all templates."""
     return {
         'chatbot_enabled': getattr(settings, 'CHATBOT_ENABLED', True),
+        'chatbot_streaming': getattr(settings, 'CHATBOT_STREAMING', True),
     }
@@ -0,0 +1,137 @@
+"""Local stand-in for the Gemini and OpenAI HTTP APIs, used by ``bench_chatbot``.
+
+Answers Gemini REST ``...:generateContent`` and OpenAI ``/chat/completions``
+calls (non-streaming) after a configurable latency, failing a configurable
+share of them with HTTP 500. Gemini ``...:streamGenerateContent`` sends the
+reply word by word, ``chunk_delay_ms`` apart. Point ``GEMINI_API_ENDPOINT`` at
+``url`` and ``OPENAI_BASE_URL`` at ``url + '/v1'``.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.fake.connection_opened()
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (e.g. its read timeout fired) before the reply
+            self.close_connection = True
+
+    def _send_chunks(self, chunks, delay):
+        """A streamed JSON array, one chunked-encoding piece per element."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        pieces = ['[' + ',\n'.join(json.dumps(c) for c in chunks[:1])]
+        pieces += [',\n' + json.dumps(c) for c in chunks[1:]]
+        pieces.append(']')
+        try:
+            for i, piece in enumerate(pieces):
+                if i:
+                    time.sleep(delay)
+                data = piece.encode()
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def do_POST(self):
+        fake = self.server.fake
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = self.path.split('?', 1)[0]
+        fail = fake.next_call()
+        if fail:
+            self._send_json(500, {'error': {'code': 500, 'message': 'fake backend error', 'status': 'INTERNAL'}})
+        elif path.endswith(':streamGenerateContent'):
+            words = fake.reply.split(' ')
+            self._send_chunks([{
+                'candidates': [{'content': {'role': 'model', 'parts': [{'text': word + ' '}]}, 'index': 0}],
+            } for word in words], fake.chunk_delay_ms / 1000)
+        elif path.endswith(':generateContent'):
+            self._send_json(200, {'candidates': [{
+                'content': {'role': 'model', 'parts': [{'text': fake.reply}]},
+                'finishReason': 'STOP', 'index': 0,
+            }]})
+        elif path.endswith('/chat/completions'):
+            self._send_json(200, {
+                'id': 'fake', 'object': 'chat.completion', 'created': int(time.time()), 'model': 'fake',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': fake.reply}}],
+            })
+        else:
+            self._send_json(404, {'error': {'code': 404, 'message': 'unknown path %s' % path}})
+
+
+class FakeLLMServer:
+
+    def __init__(self, latency_ms=300, jitter_ms=0, error_rate=0.0, reply='This is a fake assistant reply.', seed=None,
+                 chunk_delay_ms=0):
+        self.latency_ms = latency_ms
+        self.chunk_delay_ms = chunk_delay_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.reply = reply
+        self.calls = 0
+        self.errors = 0
+        self.connections = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+
+    def next_call(self):
+        """Sleep for one call's latency; returns True if this call should fail."""
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.error_rate
+            self.errors += fail
+        time.sleep(delay)
+        return fail
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        threading.Thread(target=self._server.serve_forever, name='fake-llm', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
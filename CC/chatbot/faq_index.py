@@ -0,0 +1,84 @@
+"""In-process FAQ index shared by chatbot requests.
+
+Each worker keeps the parsed active FAQs in memory and rebuilds them lazily.
+The version is read from the FAQ table itself (row count and newest
+``updated_at``), so a change made by any process, including ``import_faqs``
+run from the shell, reaches every worker within
+``CHATBOT_FAQ_INDEX_RECHECK`` seconds. FAQ saves and deletes also drop the
+saving worker's copy at once (see ``chatbot.signals``).
+"""
+import threading
+import time
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+_lock = threading.Lock()
+_index = None
+
+
+def parse_keywords(raw):
+    """Split a comma-separated FAQ keywords string into lowercased keywords."""
+    return tuple(k.strip().lower() for k in raw.split(',') if k.strip())
+
+
+class FAQIndex:
+    """Snapshot of the active FAQs with their keywords pre-parsed."""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.checked_at = time.monotonic()
+        # (question, answer, keywords) rows in FAQ ordering
+        self.documents = tuple(rows)
+        # (keywords, answer) pairs in FAQ ordering
+        self.entries = tuple((parse_keywords(keywords), answer) for _, answer, keywords in rows)
+        self.keywords = frozenset(kw for kws, _ in self.entries for kw in kws)
+        self._retriever = None
+
+    @property
+    def retriever(self):
+        """BM25 index over these FAQs, memory-mapped from disk when up to date."""
+        if self._retriever is None:
+            from .retrieval import load_or_build
+            self._retriever = load_or_build(self.documents)
+        return self._retriever
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _current_version():
+    """``(count, newest updated_at)`` over all FAQs; any insert, edit or delete changes it."""
+    from .models import FAQ
+    version = FAQ.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+    return version['count'], version['latest']
+
+
+def get_faq_index():
+    """Return this worker's FAQ index, rebuilding it if the version moved."""
+    global _index
+    index = _index
+    recheck = float(getattr(settings, 'CHATBOT_FAQ_INDEX_RECHECK', 5))
+    if index is not None and time.monotonic() - index.checked_at < recheck:
+        return index
+    version = _current_version()
+    if index is not None and index.version == version:
+        index.checked_at = time.monotonic()
+        return index
+    with _lock:
+        if _index is None or _index.version != version:
+            from .models import FAQ
+            rows = FAQ.objects.filter(is_active=True).values_list('question', 'answer', 'keywords')
+            _index = FAQIndex(version, list(rows))
+        return _index
+
+
+def invalidate_faq_index():
+    """Drop this worker's FAQ index once the current transaction commits.
+
+    Other workers notice the new version on their next recheck.
+    """
+    def drop():
+        global _index
+        _index = None
+    transaction.on_commit(drop)
@@ -0,0 +1,142 @@
+"""Bulk FAQ import and export as CSV or JSON Lines.
+
+Rows are streamed, so help desk exports with thousands of entries never sit in
+memory at once. Imports upsert on ``FAQ.question`` in chunks, one transaction
+per chunk; questions that only differ in case or whitespace count as the same
+FAQ and update the existing row instead of adding a near-copy.
+"""
+import csv
+import json
+from django.db import transaction
+from .faq_index import invalidate_faq_index
+from .models import FAQ
+
+FAQ_FIELDS = ('question', 'answer', 'keywords', 'category', 'is_active')
+FORMATS = ('csv', 'jsonl')
+_FALSE_VALUES = frozenset(['0', 'false', 'no', 'n', 'off'])
+
+
+def normalize_question(text):
+    """Strip and collapse whitespace; this is the form stored in the database."""
+    return ' '.join(str(text).split())
+
+
+def question_key(text):
+    """Key two questions share when they only differ in case or whitespace."""
+    return normalize_question(text).casefold()
+
+
+def guess_format(path):
+    """Return ``'csv'`` or ``'jsonl'`` from a file name, or None."""
+    lower = path.lower()
+    if lower.endswith('.csv'):
+        return 'csv'
+    if lower.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if value is None or str(value).strip() == '':
+        return True
+    return str(value).strip().lower() not in _FALSE_VALUES
+
+
+def read_rows(stream, fmt):
+    """Yield raw FAQ dicts from a CSV (with header) or JSON Lines stream."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def write_rows(stream, fmt, rows):
+    """Write FAQ dicts with ``FAQ_FIELDS`` keys; return how many were written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FAQ_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def export_rows(chunk_size=2000):
+    """Stream every FAQ (active or not) as a dict in primary key order."""
+    rows = FAQ.objects.order_by('id').values_list(*FAQ_FIELDS).iterator(chunk_size=chunk_size)
+    for values in rows:
+        yield dict(zip(FAQ_FIELDS, values))
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.duplicates = 0
+        self.skipped = 0
+
+
+def _clean(raw):
+    question = normalize_question(raw.get('question') or '')
+    answer = (raw.get('answer') or '').strip()
+    if not question or not answer:
+        return None
+    return FAQ(
+        question=question[:500],
+        answer=answer,
+        keywords=(raw.get('keywords') or '').strip()[:500],
+        category=(raw.get('category') or '').strip()[:50],
+        is_active=_parse_bool(raw.get('is_active')),
+    )
+
+
+def _upsert(chunk):
+    with transaction.atomic():
+        FAQ.objects.bulk_create(
+            chunk,
+            update_conflicts=True,
+            unique_fields=['question'],
+            update_fields=['answer', 'keywords', 'category', 'is_active', 'updated_at'],
+        )
+
+
+def import_rows(rows, chunk_size=1000):
+    """Upsert raw FAQ dicts in chunks and return an ``ImportResult``.
+
+    Rows without a question or answer are skipped. Within one chunk the last
+    row for a question wins; later chunks overwrite earlier ones the same way.
+    """
+    result = ImportResult()
+    # Map keys to the stored spelling so a re-cased question hits the same row
+    existing = {question_key(q): q for q in FAQ.objects.values_list('question', flat=True).iterator()}
+    chunk = {}
+    for raw in rows:
+        faq = _clean(raw)
+        if faq is None:
+            result.skipped += 1
+            continue
+        key = question_key(faq.question)
+        faq.question = existing.setdefault(key, faq.question)
+        if key in chunk:
+            result.duplicates += 1
+        chunk[key] = faq
+        if len(chunk) >= chunk_size:
+            _upsert(list(chunk.values()))
+            result.imported += len(chunk)
+            chunk = {}
+    if chunk:
+        _upsert(list(chunk.values()))
+        result.imported += len(chunk)
+    if result.imported:
+        # bulk_create sends no post_save, so the signal handler never fires
+        invalidate_faq_index()
+    return result
@@ -0,0 +1,66 @@
+"""Per-user cache of a student's most recent issues for "track my issue" answers.
+
+Each user's entry holds summaries of at most ``CHATBOT_ISSUE_CONTEXT_SIZE``
+latest issues. It is filled the first time the chatbot needs it. After that,
+commits that touch one of the user's issues or their history refresh it (see
+``chatbot.signals``). Users who never ask the bot are never cached, and each
+entry has a TTL, so memory stays bounded.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from issues.models import Issue, IssueHistory
+
+CACHE_KEY = 'chatbot:user_issues:%s'
+
+
+def _size():
+    return int(getattr(settings, 'CHATBOT_ISSUE_CONTEXT_SIZE', 5))
+
+
+def _ttl():
+    return int(getattr(settings, 'CHATBOT_ISSUE_CONTEXT_TTL', 600))
+
+
+def load_recent_issues(user_id):
+    """Summaries of the user's latest issues, newest first (two queries)."""
+    status_display = dict(Issue.STATUS_CHOICES)
+    issues = list(
+        Issue.objects.filter(reported_by_id=user_id)
+        .order_by('-created_at', '-id')
+        .values('id', 'title', 'status', 'created_at', 'updated_at')[:_size()]
+    )
+    last_notes = {}
+    if issues:
+        history = (IssueHistory.objects.filter(issue_id__in=[i['id'] for i in issues])
+                   .exclude(notes='').order_by('-created_at').values_list('issue_id', 'notes'))
+        for issue_id, notes in history:
+            last_notes.setdefault(issue_id, notes)
+    for issue in issues:
+        issue['status_display'] = status_display.get(issue['status'], issue['status'])
+        issue['last_note'] = last_notes.get(issue['id'], '')
+    return issues
+
+
+def get_recent_issues(user, count=1):
+    """Up to ``count`` latest issue summaries for ``user``, from cache when possible."""
+    if not user or not user.is_authenticated:
+        return []
+    key = CACHE_KEY % user.pk
+    issues = cache.get(key)
+    if issues is None:
+        issues = load_recent_issues(user.pk)
+        cache.set(key, issues, _ttl())
+    return issues[:count]
+
+
+def refresh_recent_issues(user_id):
+    """Reload a user's entry if they have one (nothing to do for users who never asked)."""
+    key = CACHE_KEY % user_id
+    if cache.get(key) is not None:
+        cache.set(key, load_recent_issues(user_id), _ttl())
+
+
+def issue_changed(user_id):
+    """Refresh the reporter's entry once the current transaction commits."""
+    transaction.on_commit(lambda: refresh_recent_issues(user_id))
@@ -0,0 +1,28 @@
+"""Move old chat messages into compressed monthly archives."""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chatbot.archive import ArchiveBusy, archive_messages
+
+
+class Command(BaseCommand):
+    help = 'Archive chat messages older than the retention period and delete them from the table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'CHATBOT_RETENTION_DAYS', 90),
+                            help='Keep messages newer than this many days')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows archived and deleted per batch')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        start = time.perf_counter()
+        try:
+            count = archive_messages(cutoff, batch_size=options['batch_size'])
+        except ArchiveBusy as exc:
+            # Overlapping runs (cron and a manual one) are expected; not an error
+            self.stdout.write('%s; nothing archived.' % exc)
+            return
+        self.stdout.write('Archived %d chat messages older than %s in %.1fs' % (
+            count, cutoff.date(), time.perf_counter() - start))
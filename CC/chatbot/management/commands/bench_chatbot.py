@@ -0,0 +1,311 @@
+"""Load-test the chatbot end to end against local fake LLM backends.
+
+Drives ``chat_send`` (through the test client, so middleware, auth and rate
+limiting are included) and ``generate_response`` with a synthetic corpus of
+student messages. Reports latency percentiles, throughput, DB queries per
+request and a per-phase time breakdown, and writes the results as JSON so
+runs can be compared with ``--compare``.
+
+Runs never touch live state: requests go to a throwaway copy of the database
+(schema plus the current FAQs) and a private in-memory cache, journals and
+the FAQ index go to a temporary directory, and the backends get circuit
+breakers of their own.
+"""
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, close_old_connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from chatbot import ai_logic, views
+from chatbot.backends import BACKENDS, LLMBackend
+from chatbot.circuit_breaker import CircuitBreaker
+from chatbot.chat_buffer import get_buffer
+from chatbot.fake_llm import FakeLLMServer
+from chatbot.faq_io import FAQ_FIELDS
+from chatbot.models import FAQ
+
+User = get_user_model()
+
+PHASES = ('intent', 'faq', 'backend', 'persistence')
+
+THINGS = ['projector', 'wifi', 'AC', 'toilet', 'light', 'whiteboard', 'water cooler', 'door lock', 'fan', 'router']
+PLACES = ['library', 'block A', 'hostel 3', 'the canteen', 'main building', 'lab 2', 'the gym']
+PROBLEMS = ['is not working', 'is broken', 'keeps flickering', 'is leaking', 'is really slow', 'stopped working again']
+TEMPLATES = [
+    (6, 'The {thing} in {place} room {room} {problem}'),
+    (3, '{thing} {problem} since yesterday, can someone fix it?'),
+    (3, 'How do I report a {thing} problem?'),
+    (3, 'What is the status of my issue?'),
+    (2, 'any update on my complaint about the {thing}'),
+    (2, 'How long does it take to fix {thing} issues?'),
+    (1, 'Can I talk to an admin please'),
+    (1, 'how to fix the {thing} myself before reporting'),
+    (1, 'hello'),
+    (1, 'thanks!'),
+]
+
+
+def build_corpus(size, rng, faqs=()):
+    """Synthetic student messages, plus real FAQ questions if any are loaded."""
+    faq_questions = [faq.question for faq in faqs][:200]
+    weights = [w for w, _ in TEMPLATES]
+    corpus = []
+    for _ in range(size):
+        if faq_questions and rng.random() < 0.15:
+            corpus.append(rng.choice(faq_questions))
+            continue
+        template = rng.choices(TEMPLATES, weights)[0][1]
+        corpus.append(template.format(
+            thing=rng.choice(THINGS), place=rng.choice(PLACES),
+            room=rng.randint(100, 420), problem=rng.choice(PROBLEMS),
+        ))
+    return corpus
+
+
+@contextmanager
+def isolated_environment(faqs):
+    """Run the body against a scratch database, cache and data directory."""
+    workdir = tempfile.mkdtemp(prefix='bench-chatbot-')
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if connection.vendor == 'sqlite':
+        # A file, not the shared in-memory default, so client threads can write concurrently
+        test_settings['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                'LOCATION': 'bench-chatbot'}},
+            CHATBOT_WRITE_BEHIND_JOURNAL_DIR=Path(workdir) / 'chat_journal',
+            CHATBOT_FAQ_INDEX_DIR=Path(workdir) / 'faq_index',
+        ):
+            FAQ.objects.bulk_create(faqs)
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_backends():
+    """Fresh backend objects whose stats and breakers belong to this run only."""
+    backends = {}
+    for name, backend in BACKENDS.items():
+        backends[name] = type(backend)()
+        backends[name].breaker = CircuitBreaker('bench-%s' % name)
+    return backends
+
+
+class PhaseTimer:
+    """Per-thread time spent in each chatbot phase, collected by patching the phase functions."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def begin(self):
+        self._local.totals = dict.fromkeys(PHASES, 0.0)
+
+    def end(self):
+        return self._local.totals
+
+    def wrap(self, phase, func):
+        timer = self
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                totals = getattr(timer._local, 'totals', None)
+                if totals is not None:
+                    totals[phase] += (time.perf_counter() - start) * 1000
+        return timed
+
+    def patches(self):
+        return [
+            mock.patch.object(ai_logic, 'find_keywords', self.wrap('intent', ai_logic.find_keywords)),
+            mock.patch.object(ai_logic, 'detect_intent', self.wrap('intent', ai_logic.detect_intent)),
+            mock.patch.object(ai_logic, 'get_faq_response', self.wrap('faq', ai_logic.get_faq_response)),
+            mock.patch.object(LLMBackend, 'complete', self.wrap('backend', LLMBackend.complete)),
+            mock.patch.object(views, 'save_chat_message', self.wrap('persistence', views.save_chat_message)),
+        ]
+
+
+def summarize(samples, wall_seconds):
+    latencies = np.array([s['ms'] for s in samples])
+    queries = np.array([s['queries'] for s in samples])
+    phases = {p: round(float(np.mean([s['phases'][p] for s in samples])), 2) for p in PHASES}
+    phases['other'] = round(max(0.0, float(latencies.mean()) - sum(phases.values())), 2)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for s in samples if not s['ok']),
+        'rps': round(len(samples) / wall_seconds, 1),
+        'latency_ms': {
+            'p50': round(float(p50), 2), 'p95': round(float(p95), 2), 'p99': round(float(p99), 2),
+            'mean': round(float(latencies.mean()), 2), 'max': round(float(latencies.max()), 2),
+        },
+        'queries_per_request': {'mean': round(float(queries.mean()), 2), 'max': int(queries.max())},
+        'phases_ms': phases,
+        'backends': dict(Counter(s['backend'] for s in samples)),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chatbot latency and throughput against local fake LLM backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Messages sent per target')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent client threads')
+        parser.add_argument('--target', choices=['send', 'generate', 'both'], default='both')
+        parser.add_argument('--llm', choices=['gemini', 'openai', 'both', 'none'], default='both',
+                            help='Which fake LLM backends are enabled')
+        parser.add_argument('--latency', type=float, default=300, help='Fake LLM latency in ms')
+        parser.add_argument('--jitter', type=float, default=100, help='Fake LLM latency jitter in ms (+/-)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of fake LLM calls that fail')
+        parser.add_argument('--no-response-cache', action='store_true', help='Disable the LLM response cache')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Results file (default var/bench/chatbot-<time>.json)')
+        parser.add_argument('--compare', help='Earlier results file to compare against')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        faqs = [FAQ(**dict(zip(FAQ_FIELDS, row))) for row in FAQ.objects.order_by('id').values_list(*FAQ_FIELDS)]
+        corpus = build_corpus(options['requests'], rng, faqs)
+        targets = ['send', 'generate'] if options['target'] == 'both' else [options['target']]
+        timer = PhaseTimer()
+        fake = FakeLLMServer(options['latency'], options['jitter'], options['error_rate'], seed=options['seed'])
+        results = {}
+        with fake, isolated_environment(faqs), mock.patch.dict(BACKENDS, bench_backends()):
+            user = User.objects.create_user(username='bench-%s' % uuid.uuid4().hex[:8],
+                                            password=uuid.uuid4().hex, role='student')
+            overrides = {
+                'CHATBOT_USE_GEMINI': options['llm'] in ('gemini', 'both'),
+                'GEMINI_API_KEY': 'bench', 'GEMINI_API_ENDPOINT': fake.url,
+                'CHATBOT_USE_OPENAI': options['llm'] in ('openai', 'both'),
+                'OPENAI_API_KEY': 'bench', 'OPENAI_BASE_URL': fake.url + '/v1',
+                'CHATBOT_RATE_LIMIT': '1000000/s',
+                'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS) + ['testserver'],
+            }
+            if options['no_response_cache']:
+                overrides['CHATBOT_RESPONSE_CACHE'] = False
+            with override_settings(**overrides):
+                patches = timer.patches()
+                for patch in patches:
+                    patch.start()
+                try:
+                    for target in targets:
+                        results[target] = self._run(target, corpus, user, timer, options['concurrency'])
+                finally:
+                    for patch in patches:
+                        patch.stop()
+                    buffer = get_buffer()
+                    if buffer is not None:
+                        buffer.flush()
+            breakers = {name: b.breaker.snapshot()['state'] for name, b in BACKENDS.items()}
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'options': {k: options[k] for k in ('requests', 'concurrency', 'llm', 'latency', 'jitter',
+                                                'error_rate', 'no_response_cache', 'seed')},
+            'fake_llm': {'calls': fake.calls, 'errors': fake.errors},
+            'breakers': breakers,
+            'results': results,
+        }
+        for target, result in results.items():
+            self._print(target, result)
+        self.stdout.write('Fake LLM: %d calls, %d errors; breakers: %s' % (
+            fake.calls, fake.errors, ', '.join('%s=%s' % kv for kv in breakers.items())))
+
+        output = Path(options['output'] or settings.BASE_DIR / 'var' / 'bench' / (
+            'chatbot-%s.json' % timezone.now().strftime('%Y%m%d-%H%M%S')))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write('Results written to %s' % output)
+
+        if options['compare']:
+            self._compare(report, options['compare'])
+
+    def _run(self, target, corpus, user, timer, concurrency):
+        local = threading.local()
+
+        def one(message):
+            if target == 'send' and not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(user)
+            timer.begin()
+            backend, ok = 'rule_based', True
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                if target == 'send':
+                    response = local.client.post('/chatbot/send/', {'message': message})
+                    ok = response.status_code == 200
+                    backend = response.json().get('backend_used') if ok else 'error'
+                else:
+                    ai_logic.generate_response(user, message)
+                elapsed = (time.perf_counter() - start) * 1000
+            return {'ms': elapsed, 'queries': len(queries), 'phases': timer.end(), 'ok': ok, 'backend': backend}
+
+        def worker(messages):
+            try:
+                return [one(m) for m in messages]
+            finally:
+                close_old_connections()
+
+        # Warm up clients, indexes and imports so they don't skew the first samples
+        for message in corpus[:min(5, len(corpus))]:
+            one(message)
+        chunks = [corpus[i::concurrency] for i in range(concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = [s for chunk in pool.map(worker, chunks) for s in chunk]
+        if not samples:
+            raise CommandError('No requests to run')
+        return summarize(samples, time.perf_counter() - start)
+
+    def _print(self, target, result):
+        lat = result['latency_ms']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            '%s: %d requests, %d errors, %.1f req/s' % (target, result['requests'], result['errors'], result['rps'])))
+        self.stdout.write('  latency ms   p50 %.1f  p95 %.1f  p99 %.1f  max %.1f' % (
+            lat['p50'], lat['p95'], lat['p99'], lat['max']))
+        self.stdout.write('  queries/req  mean %.2f  max %d' % (
+            result['queries_per_request']['mean'], result['queries_per_request']['max']))
+        self.stdout.write('  phases ms    ' + '  '.join('%s %.2f' % kv for kv in result['phases_ms'].items()))
+        self.stdout.write('  answered by  ' + ', '.join('%s=%d' % kv for kv in sorted(result['backends'].items())))
+
+    def _compare(self, report, path):
+        try:
+            baseline = json.loads(Path(path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError('Cannot read %s: %s' % (path, exc))
+        self.stdout.write(self.style.MIGRATE_HEADING('Compared with %s' % path))
+        for target, result in report['results'].items():
+            old = baseline.get('results', {}).get(target)
+            if old is None:
+                continue
+            rows = [('p50', old['latency_ms']['p50'], result['latency_ms']['p50']),
+                    ('p95', old['latency_ms']['p95'], result['latency_ms']['p95']),
+                    ('p99', old['latency_ms']['p99'], result['latency_ms']['p99']),
+                    ('req/s', old['rps'], result['rps']),
+                    ('queries', old['queries_per_request']['mean'], result['queries_per_request']['mean'])]
+            for name, before, after in rows:
+                change = (after - before) / before * 100 if before else 0.0
+                self.stdout.write('  %-8s %-6s %10.2f -> %10.2f  (%+.1f%%)' % (target, name, before, after, change))
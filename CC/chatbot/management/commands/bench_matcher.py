@@ -0,0 +1,53 @@
+"""Micro-benchmark the chatbot keyword matcher against naive substring scans."""
+import random
+import string
+import time
+from django.core.management.base import BaseCommand
+from chatbot.ai_logic import STATIC_KEYWORDS
+from chatbot.matcher import KeywordMatcher
+
+
+SAMPLE_MESSAGES = [
+    'The wifi in the library is not working since this morning',
+    'How do I report a broken projector in room 204?',
+    'What is the status of my last complaint about the leaking pipe?',
+    'Lights keep flickering in the east wing corridor',
+    'Can I talk to an admin about the dirty washrooms?',
+]
+
+
+def _synthetic_keywords(count, rng):
+    words = set()
+    while len(words) < count:
+        length = rng.randint(4, 12)
+        words.add(''.join(rng.choice(string.ascii_lowercase) for _ in range(length)))
+    return list(words)
+
+
+def _time(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for msg in SAMPLE_MESSAGES:
+            fn(msg)
+    return (time.perf_counter() - start) / (repeat * len(SAMPLE_MESSAGES)) * 1e6
+
+
+class Command(BaseCommand):
+    help = 'Benchmark keyword matching as the FAQ keyword count grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000,5000', help='Comma-separated FAQ keyword counts')
+        parser.add_argument('--repeat', type=int, default=200, help='Iterations over the sample messages')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        sizes = [int(s) for s in options['sizes'].split(',') if s.strip()]
+        self.stdout.write('%10s %12s %14s %14s' % ('keywords', 'build (ms)', 'matcher (us)', 'naive (us)'))
+        for size in sizes:
+            keywords = list(STATIC_KEYWORDS) + _synthetic_keywords(size, rng)
+            start = time.perf_counter()
+            matcher = KeywordMatcher(keywords)
+            build_ms = (time.perf_counter() - start) * 1000
+            matcher_us = _time(lambda m: matcher.find(m.lower()), options['repeat'])
+            naive_us = _time(lambda m: {kw for kw in keywords if kw in m.lower()}, options['repeat'])
+            self.stdout.write('%10d %12.1f %14.1f %14.1f' % (len(keywords), build_ms, matcher_us, naive_us))
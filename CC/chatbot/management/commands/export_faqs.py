@@ -0,0 +1,27 @@
+"""Bulk-export FAQs to CSV or JSON Lines."""
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.faq_io import FORMATS, export_rows, guess_format, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream all FAQs to a CSV or JSON Lines file that import_faqs can read back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file ('-' for stdout)")
+        parser.add_argument('--format', choices=FORMATS, help='Output format (default: from the file extension)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if fmt is None:
+            raise CommandError('Cannot tell the format of %s; pass --format' % path)
+        start = time.perf_counter()
+        if path == '-':
+            count = write_rows(sys.stdout, fmt, export_rows())
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                count = write_rows(f, fmt, export_rows())
+        elapsed = time.perf_counter() - start
+        self.stderr.write('Exported %d FAQs in %.1fs, %.0f rows/s' % (count, elapsed, count / max(elapsed, 1e-9)))
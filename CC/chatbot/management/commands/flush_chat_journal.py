@@ -0,0 +1,15 @@
+"""Write chat rows left in write-behind journals by stopped workers."""
+from django.core.management.base import BaseCommand
+from chatbot.chat_buffer import replay_journals
+
+
+class Command(BaseCommand):
+    help = 'Replay ChatMessage write-behind journals left by crashed or stopped workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Also replay journals of running processes (only when all workers are stopped)')
+
+    def handle(self, *args, **options):
+        count = replay_journals(include_live=options['all'])
+        self.stdout.write('Replayed %d chat messages' % count)
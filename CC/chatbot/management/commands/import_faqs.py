@@ -0,0 +1,30 @@
+"""Bulk-import FAQs from CSV or JSON Lines."""
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.faq_io import FORMATS, guess_format, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Upsert FAQs from a CSV or JSON Lines file, matching on the normalized question'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON Lines file ('-' for stdin)")
+        parser.add_argument('--format', choices=FORMATS, help='Input format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows upserted per transaction')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if fmt is None:
+            raise CommandError('Cannot tell the format of %s; pass --format' % path)
+        start = time.perf_counter()
+        if path == '-':
+            result = import_rows(read_rows(sys.stdin, fmt), chunk_size=options['chunk_size'])
+        else:
+            with open(path, newline='', encoding='utf-8') as f:
+                result = import_rows(read_rows(f, fmt), chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write('Imported %d FAQs (%d duplicates merged, %d skipped) in %.1fs, %.0f rows/s' % (
+            result.imported, result.duplicates, result.skipped, elapsed,
+            (result.imported + result.duplicates + result.skipped) / max(elapsed, 1e-9)))
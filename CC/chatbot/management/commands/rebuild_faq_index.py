@@ -0,0 +1,14 @@
+"""Rebuild the memory-mapped FAQ retrieval index."""
+from django.core.management.base import BaseCommand
+from chatbot.models import FAQ
+from chatbot.retrieval import BM25Index, rows_signature
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the BM25 FAQ retrieval index on disk'
+
+    def handle(self, *args, **options):
+        rows = list(FAQ.objects.filter(is_active=True).values_list('question', 'answer', 'keywords'))
+        index = BM25Index.build(rows, rows_signature(rows))
+        path = index.save()
+        self.stdout.write('Indexed %d FAQs (%d terms) into %s' % (index.num_docs, len(index.vocab), path))
@@ -0,0 +1,79 @@
+"""Train the local intent classifier from chat history and the intent keywords."""
+import random
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.ai_logic import (
+    INTENTS, CATEGORY_KEYWORDS, HARDCODED_FAQS, DEFAULT_FAQ_ANSWER,
+    find_keywords, detect_intent, get_faq_response,
+)
+from chatbot.faq_index import get_faq_index
+from chatbot.intent_model import IntentClassifier, OTHER, get_model_path
+from chatbot.models import ChatMessage
+
+# Messages the rule engine can't answer, so the model learns what to escalate
+OTHER_SEEDS = [
+    'hello', 'hi there', 'thanks', 'thank you so much', 'ok', 'good morning',
+    'tell me a joke', 'who are you', 'what is the weather today', 'what time does the canteen close',
+    'can you write my assignment', 'translate this to hindi', 'what is the exam schedule',
+]
+
+
+def rule_label(text, index):
+    """The rule engine's intent, or ``other`` if it would only give the default answer."""
+    hits = find_keywords(text, index.keywords)
+    intent = detect_intent(text, hits)
+    if intent == 'faq' and get_faq_response(text, hits=hits, index=index) == DEFAULT_FAQ_ANSWER:
+        return OTHER
+    return intent
+
+
+class Command(BaseCommand):
+    help = 'Train the local intent classifier on chat history labelled by the rule engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50000, help='Most recent chat messages to use')
+        parser.add_argument('--holdout', type=float, default=0.2, help='Share of examples kept for evaluation')
+        parser.add_argument('--epochs', type=int, default=300, help='Gradient descent iterations')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        index = get_faq_index()
+        texts = list(OTHER_SEEDS)
+        texts += [kw for kws in INTENTS.values() for kw in kws]
+        texts += [kw for kws in CATEGORY_KEYWORDS.values() for kw in kws]
+        texts += [q for item in HARDCODED_FAQS for q in item['q']]
+        texts += [question for question, _, _ in index.documents]
+        history = ChatMessage.objects.order_by('-id').values_list('message', flat=True)[:options['limit']]
+        texts += list(history)
+        texts = list(dict.fromkeys(t.strip() for t in texts if t.strip()))
+        labels = [rule_label(t, index) for t in texts]
+        if len(set(labels)) < 2:
+            raise CommandError('Need examples of at least two intents to train')
+
+        examples = list(zip(texts, labels))
+        random.Random(options['seed']).shuffle(examples)
+        split = int(len(examples) * options['holdout'])
+        test, train = examples[:split], examples[split:]
+
+        threshold = float(getattr(settings, 'CHATBOT_INTENT_THRESHOLD', 0.9))
+        if test:
+            model = IntentClassifier.train([t for t, _ in train], [l for _, l in train], epochs=options['epochs'])
+            predictions = [model.predict(t) for t, _ in test]
+            correct = sum(p == l for (p, _), (_, l) in zip(predictions, test))
+            local = [(p, l) for (p, c), (_, l) in zip(predictions, test) if p != OTHER and c >= threshold]
+            self.stdout.write('Holdout: %d examples, accuracy %.3f' % (len(test), correct / len(test)))
+            self.stdout.write('At threshold %.2f: %.1f%% answered locally, %.3f accurate' % (
+                threshold, 100 * len(local) / len(test),
+                sum(p == l for p, l in local) / len(local) if local else 0.0))
+
+        # The saved model is trained on every example
+        model = IntentClassifier.train(texts, labels, epochs=options['epochs'])
+        path = get_model_path()
+        model.save(path)
+        counts = Counter(labels)
+        self.stdout.write('Labels: ' + ', '.join('%s=%d' % kv for kv in sorted(counts.items())))
+        self.stdout.write(self.style.SUCCESS('Trained on %d examples in %.1fs, saved to %s' % (
+            len(texts), time.perf_counter() - start, path)))
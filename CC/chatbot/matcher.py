@@ -0,0 +1,63 @@
+"""Multi-pattern keyword matching for the chatbot (Aho-Corasick automaton)."""
+from collections import deque
+
+
+class KeywordMatcher:
+    """Find every keyword occurring as a substring of a text in one pass.
+
+    Matching is plain substring containment, the same as ``kw in text``, so
+    overlapping keywords and keywords nested inside others are all reported.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = frozenset(k for k in keywords if k)
+        # Node 0 is the root; each node has a goto table, a failure link and
+        # the keywords that end at it (including those reached via failure).
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for kw in self.keywords:
+            self._add(kw)
+        self._build_links()
+
+    def _add(self, keyword):
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] = self._out[node] + (keyword,)
+
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text):
+        """Return the set of keywords found in ``text`` (already lowercased)."""
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                hits.update(out[node])
+        return hits
+
+    def __len__(self):
+        return len(self.keywords)
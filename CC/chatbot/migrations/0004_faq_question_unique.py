@@ -0,0 +1,44 @@
+# Generated by Django 4.2
+
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def question_key(text):
+    # Frozen copy of chatbot.faq_io.question_key as of this migration
+    return ' '.join(str(text).split()).casefold()
+
+
+def check_duplicate_questions(apps, schema_editor):
+    """Refuse to continue while FAQs share a question.
+
+    Uses the importer's key, so questions that only differ in case or
+    whitespace conflict too: ``import_faqs`` would treat them as one FAQ.
+    Nothing is deleted; merge or reword the listed rows and migrate again.
+    """
+    FAQ = apps.get_model('chatbot', 'FAQ')
+    groups = defaultdict(list)
+    for pk, question in FAQ.objects.order_by('id').values_list('id', 'question'):
+        groups[question_key(question)].append((pk, question))
+    conflicts = [rows for rows in groups.values() if len(rows) > 1]
+    if conflicts:
+        lines = ['  ' + ', '.join('#%d %r' % row for row in rows) for rows in conflicts]
+        raise RuntimeError(
+            '%d FAQ questions are duplicated (ignoring case and whitespace); merge them before '
+            'migrating:\n%s' % (len(conflicts), '\n'.join(lines)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_chatmessage_user_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_questions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='faq',
+            name='question',
+            field=models.CharField(max_length=500, unique=True),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class ChatMessage(models.Model):
@@ -7,20 +8,33 @@ class ChatMessage(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_messages')
     message = models.TextField()
     response = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set on creation (not auto_now_add) so write-behind rows keep the time they were sent
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', '-timestamp', '-id'], name='chatmsg_user_ts_idx'),
+        ]
 
 
 class FAQ(models.Model):
     """FAQ entries for chatbot responses."""
-    question = models.CharField(max_length=500)
+    question = models.CharField(max_length=500, unique=True)
     answer = models.TextField()
     keywords = models.CharField(max_length=500, help_text='Comma-separated keywords for matching')
     category = models.CharField(max_length=50, blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # With the row count, the newest value is the FAQ index version (see chatbot.faq_index)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['question']
+
+
+class RateLimitBucket(models.Model):
+    """GCRA state for one rate limit key (see chatbot.ratelimit.DatabaseStore)."""
+    key = models.CharField(max_length=200, primary_key=True)
+    # Theoretical arrival time of the key's next request, as a Unix timestamp
+    tat = models.FloatField(db_index=True)
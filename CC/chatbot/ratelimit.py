@@ -0,0 +1,223 @@
+"""GCRA rate limiting with pluggable stores, plus a view decorator.
+
+GCRA (the generic cell rate algorithm) is a token bucket expressed as a single
+number per key: the theoretical arrival time (TAT) of the next request. Each
+key costs O(1) memory and expires once its bucket would be full again, so idle
+keys are evicted without a sweep over history.
+
+Stores (``RATELIMIT_STORE``):
+
+- ``'database'`` (default): one ``RateLimitBucket`` row per key, advanced by a
+  single conditional ``UPDATE``, so the check is atomic across all workers
+  and hosts that share the database.
+- ``'redis'``: a Redis-compatible server (``RATELIMIT_REDIS_URL``) updated with
+  a Lua script; atomic like the database store, without the write to the
+  main database. Needs the ``redis`` package.
+- ``'local'``: in-process dict. Limits are per worker process, so only for
+  single-process development servers and tests.
+"""
+import asyncio
+import random
+import threading
+import time
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.http import JsonResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Uses the Redis server clock so workers on different hosts agree on "now".
+GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+local new_tat = math.max(tat, now) + interval
+if new_tat - now > period then
+    return tostring(tat - period + interval - now)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+
+def parse_rate(rate):
+    """``'10/m'`` -> ``(10, 60)``; also accepts ``'5/10s'``."""
+    count, _, period = rate.partition('/')
+    unit = period[-1]
+    multiplier = int(period[:-1] or 1)
+    return int(count), PERIODS[unit] * multiplier
+
+
+class LocalMemoryStore:
+    """Per-process GCRA state; expired keys are swept as the table grows."""
+
+    def __init__(self):
+        self._tat = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 1024
+
+    def hit(self, key, interval, period, now):
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            new_tat = tat + interval
+            if new_tat - now > period:
+                return tat - period + interval - now
+            self._tat[key] = new_tat
+            if len(self._tat) >= self._next_sweep:
+                self._sweep(now)
+            return 0.0
+
+    def _sweep(self, now):
+        self._tat = {k: t for k, t in self._tat.items() if t > now}
+        self._next_sweep = max(1024, len(self._tat) * 2)
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._tat.clear()
+            else:
+                self._tat.pop(key, None)
+
+    def __len__(self):
+        return len(self._tat)
+
+
+class DatabaseStore:
+    """Shared GCRA state in the ``RateLimitBucket`` table.
+
+    The bucket only advances if the request fits (``tat <= now + period -
+    interval``), checked and written by one ``UPDATE``; a key's first request
+    inserts its row. Expired rows are deleted now and then by a random hit.
+    """
+    SWEEP_CHANCE = 0.001
+
+    def hit(self, key, interval, period, now):
+        from .models import RateLimitBucket
+        buckets = RateLimitBucket.objects.filter(key=key)
+        for _ in range(2):
+            if buckets.filter(tat__lte=now + period - interval).update(tat=Greatest(F('tat'), now) + interval):
+                break
+            tat = buckets.values_list('tat', flat=True).first()
+            if tat is not None:
+                return tat - period + interval - now
+            try:
+                with transaction.atomic():
+                    RateLimitBucket.objects.create(key=key, tat=now + interval)
+                break
+            except IntegrityError:
+                # Another worker created the row first; go through the UPDATE again
+                continue
+        if random.random() < self.SWEEP_CHANCE:
+            RateLimitBucket.objects.filter(tat__lt=now).delete()
+        return 0.0
+
+    def reset(self, key=None):
+        from .models import RateLimitBucket
+        buckets = RateLimitBucket.objects.all()
+        if key is not None:
+            buckets = buckets.filter(key=key)
+        buckets.delete()
+
+
+class RedisStore:
+    """Shared GCRA state in Redis, updated atomically by a Lua script."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RATELIMIT_STORE='redis' requires the redis package")
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(GCRA_LUA)
+
+    def hit(self, key, interval, period, now):
+        return float(self._script(keys=['ratelimit:' + key], args=[interval, period]))
+
+    def reset(self, key=None):
+        if key is not None:
+            self._client.delete('ratelimit:' + key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                kind = getattr(settings, 'RATELIMIT_STORE', 'database')
+                if kind == 'database':
+                    _store = DatabaseStore()
+                elif kind == 'redis':
+                    _store = RedisStore(settings.RATELIMIT_REDIS_URL)
+                elif kind == 'local':
+                    _store = LocalMemoryStore()
+                else:
+                    raise ImproperlyConfigured('Unknown RATELIMIT_STORE %r' % kind)
+    return _store
+
+
+def hit(key, rate):
+    """Count one request for ``key``. Returns 0 if allowed, else seconds until it would be."""
+    limit, period = parse_rate(rate)
+    return get_store().hit(key, period / limit, period, time.time())
+
+
+def user_or_ip(request):
+    """Default key: the user id when logged in, otherwise the client address."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return 'user:%s' % user.pk
+    return 'ip:%s' % request.META.get('REMOTE_ADDR', '')
+
+
+def rate_limit(rate, scope=None, key=user_or_ip, message='Rate limit exceeded. Please wait.'):
+    """Reject requests over ``rate`` (e.g. ``'10/m'``) per key with a JSON 429.
+
+    ``rate`` may be a setting name, resolved at request time. Works on sync and
+    async views; for async views the key function and the store lookup run in
+    a thread because they may touch the session and the database.
+    """
+    def get_rate():
+        return getattr(settings, rate) if rate.isupper() else rate
+
+    def limited(scope_name, ident):
+        if ident is None:
+            return None
+        retry_after = hit('%s:%s' % (scope_name, ident), get_rate())
+        if retry_after <= 0:
+            return None
+        response = JsonResponse({'error': message}, status=429)
+        response['Retry-After'] = str(int(retry_after) + 1)
+        return response
+
+    def decorator(view_func):
+        scope_name = scope or view_func.__name__
+
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async(request, *args, **kwargs):
+                ident = await sync_to_async(key)(request)
+                response = await sync_to_async(limited)(scope_name, ident)
+                if response is not None:
+                    return response
+                return await view_func(request, *args, **kwargs)
+            return _wrapped_async
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            response = limited(scope_name, key(request))
+            if response is not None:
+                return response
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,163 @@
+"""Cache of LLM replies keyed on a normalized message.
+
+Two stores are available through ``CHATBOT_RESPONSE_CACHE``: ``'local'`` (a
+bounded in-process LRU with TTL) and ``'django'`` (the default Django cache,
+shared by workers). Any other value disables caching.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+
+CACHE_KEY_PREFIX = 'chatbot:reply:'
+# Filler words that never change the meaning of a support question. Negations
+# and question words are deliberately kept ("how" vs "where" to report).
+CACHE_STOP_WORDS = frozenset([
+    'a', 'an', 'the', 'please', 'pls', 'plz', 'kindly', 'hi', 'hello', 'hey', 'thanks', 'thank',
+    'um', 'uh', 'just',
+])
+_PUNCT_RE = re.compile(r'[^\w\s]+')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_message(text, drop_stop_words=None):
+    """Lowercase, strip punctuation and collapse whitespace (optionally drop filler words)."""
+    if drop_stop_words is None:
+        drop_stop_words = getattr(settings, 'CHATBOT_RESPONSE_CACHE_DROP_STOP_WORDS', True)
+    words = _SPACE_RE.split(_PUNCT_RE.sub(' ', text.lower()).strip())
+    if drop_stop_words:
+        words = [w for w in words if w not in CACHE_STOP_WORDS]
+    return ' '.join(w for w in words if w)
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.bypassed = 0
+            self.stores = 0
+            self.evictions = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class LocalStore:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries, stats):
+        self.max_entries = max_entries
+        self.stats = stats
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.incr('evictions')
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCacheStore:
+    """Entries in the Django cache; its backend handles eviction."""
+
+    def get(self, key):
+        return cache.get(CACHE_KEY_PREFIX + key)
+
+    def set(self, key, value, ttl):
+        cache.set(CACHE_KEY_PREFIX + key, value, timeout=ttl)
+
+
+stats = CacheStats()
+_local_store = LocalStore(int(getattr(settings, 'CHATBOT_RESPONSE_CACHE_MAX_ENTRIES', 1000)), stats)
+_django_store = DjangoCacheStore()
+
+
+def _get_store():
+    mode = getattr(settings, 'CHATBOT_RESPONSE_CACHE', 'local')
+    if mode == 'local':
+        return _local_store
+    if mode == 'django':
+        return _django_store
+    return None
+
+
+def _cache_key(message):
+    normalized = normalize_message(message)
+    if not normalized:
+        return None
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def is_cacheable(message):
+    """User-specific questions (issue tracking) must never be served from cache."""
+    from .ai_logic import is_user_specific
+    return not is_user_specific(message)
+
+
+def get_cached_response(message):
+    """Return ``(response_text, backend_used)`` for a cached reply, or None."""
+    store = _get_store()
+    if store is None:
+        return None
+    key = _cache_key(message)
+    if key is None or not is_cacheable(message):
+        stats.incr('bypassed')
+        return None
+    value = store.get(key)
+    stats.incr('hits' if value is not None else 'misses')
+    return tuple(value) if value is not None else None
+
+
+def cache_response(message, response_text, backend_used):
+    """Store an LLM reply for later identical (normalized) messages."""
+    store = _get_store()
+    if store is None or not response_text:
+        return
+    key = _cache_key(message)
+    if key is None or not is_cacheable(message):
+        return
+    store.set(key, (response_text, backend_used), int(getattr(settings, 'CHATBOT_RESPONSE_CACHE_TTL', 3600)))
+    stats.incr('stores')
@@ -0,0 +1,177 @@
+"""BM25 retrieval over FAQ entries.
+
+The index is a sparse document-term weight matrix stored term-major (CSC):
+``indptr[t]:indptr[t + 1]`` slices ``docs``/``weights`` for term ``t``. A query
+is scored against every FAQ in one batched gather + ``bincount``, which is the
+sparse matrix-vector product ``W @ q``. Built indexes are saved as ``.npy``
+files and memory-mapped by every worker that loads them.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Keywords are repeated so an explicit keyword counts more than a passing
+# mention in the answer text.
+KEYWORD_WEIGHT = 2
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'the', 'is', 'are', 'was', 'be', 'to', 'of', 'in', 'on', 'at', 'for', 'and', 'or',
+    'i', 'my', 'me', 'it', 'its', 'do', 'does', 'can', 'you', 'your', 'we', 'our', 'this', 'that',
+    'with', 'if', 'from', 'by', 'as', 'there', 'any', 'please', 'what', 'who', 'how', 'where', 'when',
+    'why', 'which', 'should', 'will', 'would', 'could', 'am', 'not',
+])
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens with stop-words removed."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def rows_signature(rows):
+    """Stable hash of the FAQ rows an index was built from."""
+    return hashlib.sha256(json.dumps(rows, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_index_dir():
+    return Path(getattr(settings, 'CHATBOT_FAQ_INDEX_DIR', settings.BASE_DIR / 'var' / 'faq_index'))
+
+
+class BM25Index:
+    """Okapi BM25 scores of a query against every FAQ document."""
+
+    def __init__(self, vocab, indptr, docs, weights, idf, num_docs, signature=''):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.docs = docs
+        self.weights = weights
+        self.idf = idf
+        self.num_docs = num_docs
+        self.signature = signature
+        self._max_idf = float(np.log1p((num_docs + 0.5) / 0.5)) if num_docs else 0.0
+
+    @classmethod
+    def build(cls, documents, signature=''):
+        """Build from ``(question, answer, keywords)`` triples."""
+        vocab = {}
+        postings = {}
+        lengths = []
+        for doc_id, (question, answer, keywords) in enumerate(documents):
+            tokens = tokenize(question) + tokenize(answer) + tokenize(keywords.replace(',', ' ')) * KEYWORD_WEIGHT
+            lengths.append(len(tokens))
+            counts = {}
+            for tok in tokens:
+                counts[tok] = counts.get(tok, 0) + 1
+            for tok, tf in counts.items():
+                col = vocab.setdefault(tok, len(vocab))
+                postings.setdefault(col, []).append((doc_id, tf))
+
+        num_docs = len(documents)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        avg_len = float(lengths.mean()) if num_docs else 0.0
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        idf = np.zeros(len(vocab), dtype=np.float32)
+        doc_parts, tf_parts = [], []
+        for col in range(len(vocab)):
+            plist = postings[col]
+            indptr[col + 1] = indptr[col] + len(plist)
+            idf[col] = np.log1p((num_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            doc_parts.append([d for d, _ in plist])
+            tf_parts.append([tf for _, tf in plist])
+        docs = np.asarray([d for part in doc_parts for d in part], dtype=np.int32)
+        tf = np.asarray([t for part in tf_parts for t in part], dtype=np.float32)
+        if len(docs):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[docs] / avg_len)
+            term_idf = np.repeat(idf, np.diff(indptr))
+            weights = (term_idf * tf * (BM25_K1 + 1) / (tf + norm)).astype(np.float32)
+        else:
+            weights = np.zeros(0, dtype=np.float32)
+        return cls(vocab, indptr, docs, weights, idf, num_docs, signature)
+
+    def scores(self, query):
+        """BM25 score of ``query`` against every document, plus its confidence ceiling."""
+        tokens = tokenize(query)
+        cols = [self.vocab[t] for t in tokens if t in self.vocab]
+        # Best attainable score: every query term matched with a saturated tf.
+        ceiling = sum(float(self.idf[c]) for c in cols) + self._max_idf * (len(tokens) - len(cols))
+        ceiling *= BM25_K1 + 1
+        if not cols:
+            return np.zeros(self.num_docs, dtype=np.float32), ceiling
+        slices = [np.arange(self.indptr[c], self.indptr[c + 1]) for c in cols]
+        pos = np.concatenate(slices)
+        scores = np.bincount(self.docs[pos], weights=self.weights[pos], minlength=self.num_docs)
+        return scores, ceiling
+
+    def search(self, query, k=3, min_confidence=0.0):
+        """Top-``k`` ``(doc_id, score, confidence)`` with confidence >= ``min_confidence``."""
+        scores, ceiling = self.scores(query)
+        if not self.num_docs or ceiling <= 0:
+            return []
+        k = min(k, self.num_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        results = []
+        for doc_id in top:
+            score = float(scores[doc_id])
+            confidence = score / ceiling
+            if score > 0 and confidence >= min_confidence:
+                results.append((int(doc_id), score, confidence))
+        return results
+
+    def save(self, directory=None):
+        """Write the index to a fresh build directory and point ``CURRENT`` at it."""
+        base = Path(directory or get_index_dir())
+        build_id = uuid.uuid4().hex
+        target = base / build_id
+        target.mkdir(parents=True, exist_ok=True)
+        for name in ('indptr', 'docs', 'weights', 'idf'):
+            np.save(target / f'{name}.npy', np.asarray(getattr(self, name)))
+        with open(target / 'meta.json', 'w') as f:
+            json.dump({'vocab': self.vocab, 'num_docs': self.num_docs, 'signature': self.signature}, f)
+        tmp = base / f'CURRENT.{build_id}'
+        tmp.write_text(build_id)
+        os.replace(tmp, base / 'CURRENT')
+        for old in base.iterdir():
+            if old.is_dir() and old.name != build_id:
+                shutil.rmtree(old, ignore_errors=True)
+        return target
+
+    @classmethod
+    def load(cls, directory=None):
+        """Memory-map the current saved index, or return None if there is none."""
+        base = Path(directory or get_index_dir())
+        try:
+            target = base / (base / 'CURRENT').read_text().strip()
+            with open(target / 'meta.json') as f:
+                meta = json.load(f)
+            arrays = {name: np.load(target / f'{name}.npy', mmap_mode='r')
+                      for name in ('indptr', 'docs', 'weights', 'idf')}
+        except (OSError, ValueError):
+            return None
+        return cls(meta['vocab'], num_docs=meta['num_docs'], signature=meta['signature'], **arrays)
+
+
+def load_or_build(documents, save=True):
+    """Reuse the saved index if it matches ``documents``, else build (and save) one."""
+    signature = rows_signature(documents)
+    index = BM25Index.load()
+    if index is not None and index.signature == signature:
+        return index
+    index = BM25Index.build(documents, signature)
+    if save:
+        try:
+            index.save()
+        except OSError:
+            logger.warning("Could not save FAQ retrieval index", exc_info=True)
+    return index
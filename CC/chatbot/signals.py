@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from issues.models import Issue, IssueHistory
+from .models import FAQ
+from .faq_index import invalidate_faq_index
+from .issue_context import issue_changed
+
+
+@receiver(post_save, sender=FAQ)
+@receiver(post_delete, sender=FAQ)
+def faq_changed(sender, instance, **kwargs):
+    """Rebuild this worker's FAQ index right away; others catch up on their next version check."""
+    invalidate_faq_index()
+
+
+@receiver(post_save, sender=Issue)
+@receiver(post_delete, sender=Issue)
+def issue_saved(sender, instance, **kwargs):
+    """Keep the reporter's cached "latest issues" summary current."""
+    issue_changed(instance.reported_by_id)
+
+
+@receiver(post_save, sender=IssueHistory)
+def issue_history_saved(sender, instance, **kwargs):
+    issue_changed(instance.issue.reported_by_id)
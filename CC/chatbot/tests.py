@@ -0,0 +1,615 @@
+import json
+import importlib
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import io
+import time
+import warnings
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.urls import reverse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from accounts.models import User
+from . import views
+from . import archive, chat_buffer, faq_index, response_cache
+from .backends import GeminiBackend, LLMBackend, OpenAIBackend
+from .circuit_breaker import CircuitBreaker
+from .fake_llm import FakeLLMServer
+from .faq_io import import_rows
+from .models import FAQ, ChatMessage, RateLimitBucket
+from .ratelimit import DatabaseStore, rate_limit
+from .response_cache import CacheStats, LocalStore, cache_response, get_cached_response
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'chatbot-tests'}}
+
+
+class ScriptedBackend(LLMBackend):
+    """Streams ``chunks``, then raises ``error`` if given."""
+    name = 'scripted'
+
+    def __init__(self, chunks, error=None):
+        super().__init__()
+        self.chunks = chunks
+        self.error = error
+
+    def is_enabled(self):
+        return True
+
+    def get_config(self):
+        return ()
+
+    def build_client(self, config):
+        return object()
+
+    def open_stream(self, client, message, user):
+        return iter(self.chunks)
+
+    def iter_text(self, stream):
+        yield from stream
+        if self.error is not None:
+            raise self.error
+
+
+def parse_events(stream):
+    events = []
+    for raw in stream:
+        event, data = raw.strip().split('\n')
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+@override_settings(CACHES=LOCMEM, CHATBOT_RESPONSE_CACHE='django', CHATBOT_WRITE_BEHIND=False)
+class StreamReplyTests(TestCase):
+    message = 'what is the meaning of the hallway hum'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', 'student@example.com', 'pw')
+
+    def setUp(self):
+        cache.clear()
+
+    def run_reply(self, *backends):
+        by_name = {'b%d' % i: b for i, b in enumerate(backends)}
+        with mock.patch.object(views, 'answer_locally', return_value=None), \
+                mock.patch.object(views, 'LLM_BACKENDS', tuple(by_name)), \
+                mock.patch.object(views, 'get_backend', by_name.__getitem__), \
+                mock.patch.object(views, 'generate_response', return_value='Rule-based reply'):
+            return parse_events(views._stream_reply(self.user, self.message))
+
+    def test_complete_stream_is_cached_and_saved(self):
+        backend = ScriptedBackend(['Hello', ' there'])
+        events = self.run_reply(backend)
+        self.assertEqual([e for e, _ in events], ['token', 'token', 'done'])
+        self.assertEqual(events[-1][1]['backend_used'], 'b0')
+        self.assertEqual(get_cached_response(self.message), ('Hello there', 'b0'))
+        self.assertEqual(ChatMessage.objects.get().response, 'Hello there')
+        self.assertEqual(backend.stats.snapshot()['errors'], 0)
+
+    def test_failure_mid_stream_is_an_error_and_never_stored(self):
+        backend = ScriptedBackend(['Partial'], error=ConnectionError('reset'))
+        with self.assertLogs('chatbot.backends', 'ERROR'):
+            events = self.run_reply(backend)
+        self.assertEqual([e for e, _ in events], ['token', 'error', 'message', 'done'])
+        self.assertEqual(events[-1][1]['backend_used'], 'rule_based')
+        self.assertIsNone(get_cached_response(self.message))
+        self.assertEqual(ChatMessage.objects.get().response, 'Rule-based reply')
+        self.assertEqual(backend.stats.snapshot()['errors'], 1)
+
+    def test_asgi_sends_each_event_as_it_is_produced(self):
+        produced = []
+
+        class Recording(ScriptedBackend):
+            def iter_text(self, stream):
+                for chunk in stream:
+                    produced.append(chunk)
+                    yield chunk
+
+        request = AsyncRequestFactory().post('/chatbot/stream/', {'message': self.message})
+        request.user = self.user
+        backend = Recording(['Hello', ' there'])
+
+        async def first_event(response):
+            content = response.streaming_content
+            event = await content.__anext__()
+            seen = list(produced)
+            await content.aclose()
+            return event, seen
+
+        with mock.patch.object(views, 'answer_locally', return_value=None), \
+                mock.patch.object(views, 'LLM_BACKENDS', ('b0',)), \
+                mock.patch.object(views, 'get_backend', {'b0': backend}.__getitem__):
+            response = views.chat_stream(request)
+            self.assertTrue(response.is_async)
+            event, seen = async_to_sync(first_event)(response)
+        self.assertEqual(parse_events([event.decode()]), [('token', {'text': 'Hello'})])
+        # Only the first chunk had been pulled from the backend when it was sent
+        self.assertEqual(seen, ['Hello'])
+        # Closing early saves nothing and counts the backend call as finished
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertEqual(backend.stats.snapshot()['calls'], 1)
+
+    def test_failure_mid_stream_falls_back_to_next_backend(self):
+        flaky = ScriptedBackend(['Parti'], error=TimeoutError('read'))
+        with self.assertLogs('chatbot.backends', 'ERROR'):
+            events = self.run_reply(flaky, ScriptedBackend(['Full reply']))
+        self.assertEqual([e for e, _ in events], ['token', 'error', 'token', 'done'])
+        self.assertEqual(events[-1][1]['backend_used'], 'b1')
+        self.assertEqual(ChatMessage.objects.get().response, 'Full reply')
+
+
+def stalled_port(test):
+    """Port of a listener whose accept queue is full: it drops new SYNs, so connect() hangs."""
+    listener = socket.socket()
+    test.addCleanup(listener.close)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(0)
+    port = listener.getsockname()[1]
+    for _ in range(3):
+        filler = socket.socket()
+        test.addCleanup(filler.close)
+        filler.setblocking(False)
+        filler.connect_ex(('127.0.0.1', port))
+    return port
+
+
+@override_settings(CACHES=LOCMEM, CHATBOT_USE_OPENAI=True, OPENAI_API_KEY='test-key',
+                   CHATBOT_LLM_CONNECT_TIMEOUT=0.3, CHATBOT_LLM_READ_TIMEOUT=0.5)
+class BackendClientTests(TestCase):
+    """OpenAI backend against the local fake API (no network)."""
+
+    def setUp(self):
+        cache.clear()
+        self.backend = OpenAIBackend()
+
+    def test_client_and_connection_are_reused(self):
+        with FakeLLMServer(latency_ms=0, reply='pong') as fake, \
+                self.settings(OPENAI_BASE_URL=fake.url + '/v1'):
+            client = self.backend.get_client()
+            replies = [self.backend.complete('ping') for _ in range(3)]
+            self.assertIs(self.backend.get_client(), client)
+        self.assertEqual(replies, ['pong'] * 3)
+        self.assertEqual(fake.calls, 3)
+        self.assertEqual(fake.connections, 1)
+
+    def test_read_timeout(self):
+        with FakeLLMServer(latency_ms=1500) as fake, \
+                self.settings(OPENAI_BASE_URL=fake.url + '/v1'):
+            start = time.perf_counter()
+            with self.assertLogs('chatbot.backends', 'ERROR') as logs:
+                self.assertIsNone(self.backend.complete('ping'))
+            elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 1.2)
+        self.assertIn('ReadTimeout', '\n'.join(logs.output))
+        self.assertEqual(self.backend.stats.snapshot()['errors'], 1)
+
+    def test_connect_timeout(self):
+        port = stalled_port(self)
+        with self.settings(OPENAI_BASE_URL='http://127.0.0.1:%d/v1' % port, CHATBOT_LLM_READ_TIMEOUT=10):
+            start = time.perf_counter()
+            with self.assertLogs('chatbot.backends', 'ERROR') as logs:
+                self.assertIsNone(self.backend.complete('ping'))
+            elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 2)
+        self.assertIn('ConnectTimeout', '\n'.join(logs.output))
+
+
+
+@override_settings(CACHES=LOCMEM, CHATBOT_USE_GEMINI=True, GEMINI_API_KEY='test', CHATBOT_LLM_CONNECT_TIMEOUT=0.5,
+                   CHATBOT_LLM_READ_TIMEOUT=1)
+class GeminiClientTests(TestCase):
+    """Gemini backend (REST transport) against the local fake API."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with warnings.catch_warnings():
+            # The SDK warns about its own deprecation on import
+            warnings.simplefilter('ignore', FutureWarning)
+            import google.generativeai  # noqa: F401
+
+    def setUp(self):
+        cache.clear()
+        self.backend = GeminiBackend()
+
+    def test_read_timeout(self):
+        with FakeLLMServer(latency_ms=1500) as fake, self.settings(GEMINI_API_ENDPOINT=fake.url):
+            start = time.perf_counter()
+            with self.assertLogs('chatbot.backends', 'ERROR') as logs:
+                self.assertIsNone(self.backend.complete('ping'))
+            elapsed = time.perf_counter() - start
+        # The read timeout alone, not connect + read
+        self.assertLess(elapsed, 1.4)
+        self.assertIn('ReadTimeout', '\n'.join(logs.output))
+
+    def test_connect_timeout(self):
+        port = stalled_port(self)
+        with self.settings(GEMINI_API_ENDPOINT='http://127.0.0.1:%d' % port, CHATBOT_LLM_READ_TIMEOUT=10):
+            start = time.perf_counter()
+            with self.assertLogs('chatbot.backends', 'ERROR') as logs:
+                self.assertIsNone(self.backend.complete('ping'))
+            elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 2)
+        self.assertIn('ConnectTimeout', '\n'.join(logs.output))
+
+    def test_long_stream_is_not_cut_off(self):
+        # 2s in total, longer than connect + read, but no gap reaches the read timeout
+        with FakeLLMServer(latency_ms=0, reply='one two three four five six', chunk_delay_ms=400) as fake, \
+                self.settings(GEMINI_API_ENDPOINT=fake.url):
+            chunks = list(self.backend.stream('ping'))
+        self.assertEqual(''.join(chunks), 'one two three four five six ')
+        self.assertEqual(self.backend.stats.snapshot()['errors'], 0)
+
+
+class FAQIndexVersionTests(TestCase):
+    """Changes made by another process (no signals here) reach the index via the DB version."""
+
+    def setUp(self):
+        faq_index._index = None
+        self.addCleanup(setattr, faq_index, '_index', None)
+        FAQ.objects.create(question='Where is the library?', answer='Block A', keywords='library')
+
+    def answers(self):
+        return [answer for _, answer, _ in faq_index.get_faq_index().documents]
+
+    @override_settings(CHATBOT_FAQ_INDEX_RECHECK=0)
+    def test_edit_and_delete_without_signals_are_seen(self):
+        self.assertEqual(self.answers(), ['Block A'])
+        FAQ.objects.update(answer='Block B', updated_at=timezone.now())
+        self.assertEqual(self.answers(), ['Block B'])
+        FAQ.objects.all().delete()
+        self.assertEqual(self.answers(), [])
+
+    @override_settings(CHATBOT_FAQ_INDEX_RECHECK=0)
+    def test_bulk_import_moves_the_version(self):
+        before = faq_index.get_faq_index().version
+        import_rows([{'question': 'where is the LIBRARY?', 'answer': 'Block C'}])
+        self.assertNotEqual(faq_index.get_faq_index().version, before)
+        self.assertEqual(self.answers(), ['Block C'])
+
+    @override_settings(CHATBOT_FAQ_INDEX_RECHECK=60)
+    def test_version_is_not_read_again_before_recheck(self):
+        faq_index.get_faq_index()
+        with self.assertNumQueries(0):
+            faq_index.get_faq_index()
+
+
+@override_settings(CACHES=LOCMEM, CHATBOT_BREAKER_WINDOW=60, CHATBOT_BREAKER_MIN_CALLS=4,
+                   CHATBOT_BREAKER_ERROR_RATE=0.5, CHATBOT_BREAKER_SLOW_MS=5000, CHATBOT_BREAKER_COOLDOWN=30)
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker('test')
+
+    def run_threads(self, target, count=8):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_records_are_all_counted(self):
+        self.run_threads(lambda: [self.breaker.record(True, 10) for _ in range(50)])
+        self.assertEqual(self.breaker.snapshot()['calls'], 400)
+
+    def test_trips_once_under_concurrency(self):
+        self.run_threads(lambda: [self.breaker.record(False, 10) for _ in range(10)])
+        snapshot = self.breaker.snapshot()
+        self.assertEqual(snapshot['state'], 'open')
+        self.assertEqual(snapshot['transitions'], {'closed->open': 1})
+        self.assertFalse(self.breaker.allow())
+
+    def trip(self):
+        for _ in range(4):
+            self.breaker.record(False, 10)
+        # Skip the cooldown
+        with mock.patch('chatbot.circuit_breaker.time.time', return_value=time.time() + 31):
+            permits = []
+            self.run_threads(lambda: permits.append(self.breaker.allow()))
+        return permits
+
+    def test_one_probe_closes_the_breaker(self):
+        permits = self.trip()
+        probes = [p for p in permits if p]
+        self.assertEqual(len(probes), 1)
+        self.assertEqual(self.breaker.snapshot()['state'], 'half_open')
+        # Ordinary calls and stale tokens don't decide the half-open state
+        self.breaker.record(True, 10)
+        self.breaker.record(True, 10, 'not-the-probe')
+        self.assertEqual(self.breaker.snapshot()['state'], 'half_open')
+        self.breaker.record(True, 10, probes[0])
+        snapshot = self.breaker.snapshot()
+        self.assertEqual(snapshot['state'], 'closed')
+        # Failures from before the trip no longer count
+        self.assertEqual(snapshot['calls'], 0)
+        self.assertIs(self.breaker.allow(), True)
+
+    def test_failed_probe_reopens(self):
+        probe = [p for p in self.trip() if p][0]
+        self.breaker.record(False, 10, probe)
+        snapshot = self.breaker.snapshot()
+        self.assertEqual(snapshot['state'], 'open')
+        self.assertEqual(snapshot['transitions'], {'closed->open': 1, 'open->half_open': 1, 'half_open->open': 1})
+        self.assertFalse(self.breaker.allow())
+
+
+class DatabaseRateLimitTests(TestCase):
+    def test_limit_is_shared_between_store_instances(self):
+        now = 1000.0
+        # 3/m: one request every 20 s, bursts of up to 3
+        first, second = DatabaseStore(), DatabaseStore()
+        self.assertEqual([first.hit('k', 20, 60, now), second.hit('k', 20, 60, now), first.hit('k', 20, 60, now)],
+                         [0, 0, 0])
+        self.assertAlmostEqual(second.hit('k', 20, 60, now), 20)
+        self.assertEqual(RateLimitBucket.objects.get().tat, now + 60)
+        self.assertEqual(first.hit('k', 20, 60, now + 20), 0)
+        self.assertEqual(first.hit('other', 20, 60, now), 0)
+
+    @override_settings(RATELIMIT_STORE='database')
+    def test_async_view_is_limited(self):
+        @rate_limit('2/m', scope='test', key=lambda request: 'fixed')
+        async def view(request):
+            return HttpResponse('ok')
+
+        request = RequestFactory().post('/')
+        with mock.patch('chatbot.ratelimit._store', DatabaseStore()):
+            statuses = [async_to_sync(view)(request).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class ChatJournalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', 'student@example.com', 'pw')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def dead_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        return process.pid
+
+    def write_journal(self, name, *messages):
+        with open(os.path.join(self.dir, name), 'w') as f:
+            for message in messages:
+                f.write(chat_buffer._row_to_json(
+                    ChatMessage(user=self.user, message=message, response='r', timestamp=timezone.now())) + '\n')
+
+    def test_orphans_are_claimed_and_replayed(self):
+        dead = self.dead_pid()
+        self.write_journal('%d-aaaa.jsonl' % dead, 'one', 'two')
+        # A replay that crashed after claiming a journal
+        self.write_journal('%d-bbbb.%d-cccc.replay' % (dead, dead), 'three')
+        # Same PID as this process but another process's journal: still owned by a live PID
+        self.write_journal('%d-dddd.jsonl' % os.getpid(), 'live')
+        self.assertEqual(chat_buffer.replay_journals(self.dir), 3)
+        self.assertEqual(sorted(ChatMessage.objects.values_list('message', flat=True)), ['one', 'three', 'two'])
+        self.assertEqual(os.listdir(self.dir), ['%d-dddd.jsonl' % os.getpid()])
+
+    def test_journal_is_per_process_and_fsynced(self):
+        self.write_journal('%d.jsonl' % os.getpid(), 'from an earlier process with this PID')
+        buffer = chat_buffer.WriteBehindBuffer(100, 60, self.dir)
+        self.addCleanup(buffer.close)
+        self.assertRegex(buffer._journal_path.name, r'^%d-[0-9a-f]{32}\.jsonl$' % os.getpid())
+        with mock.patch('chatbot.chat_buffer.os.fsync') as fsync:
+            buffer.add(ChatMessage(user=self.user, message='hi', response='r', timestamp=timezone.now()))
+        fsync.assert_called_once_with(buffer._journal.fileno())
+        with open(os.path.join(self.dir, '%d.jsonl' % os.getpid())) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer._journal_path.read_text(), '')
+
+
+@override_settings(CACHES=LOCMEM, CHATBOT_RESPONSE_CACHE='local', CHATBOT_RESPONSE_CACHE_TTL=60)
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        self.store = LocalStore(2, CacheStats())
+        patcher = mock.patch.object(response_cache, '_local_store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        response_cache.stats.reset()
+        cache.clear()
+
+    def test_normalized_duplicates_hit(self):
+        for mode in ('local', 'django'):
+            with self.subTest(mode=mode), self.settings(CHATBOT_RESPONSE_CACHE=mode):
+                cache_response('Hi, WiFi not working!', 'Restart the router.', 'gemini')
+                self.assertEqual(get_cached_response('wifi not working'), ('Restart the router.', 'gemini'))
+                self.assertEqual(get_cached_response('  WIFI   not working?? '), ('Restart the router.', 'gemini'))
+                self.assertIsNone(get_cached_response('wifi working'))
+
+    def test_track_issue_messages_bypass_the_cache(self):
+        cache_response('what is the status of my issue', 'Your issue is pending.', 'gemini')
+        self.assertEqual(len(self.store), 0)
+        self.assertIsNone(get_cached_response('what is the status of my issue'))
+        self.assertEqual(response_cache.stats.snapshot()['bypassed'], 1)
+
+    def test_disabled_cache_stores_nothing(self):
+        with self.settings(CHATBOT_RESPONSE_CACHE='off'):
+            cache_response('wifi not working', 'Restart the router.', 'gemini')
+            self.assertIsNone(get_cached_response('wifi not working'))
+        self.assertEqual(len(self.store), 0)
+
+    def test_local_store_evicts_least_recently_used(self):
+        cache_response('where is the library', 'Block A', 'gemini')
+        cache_response('where is the canteen', 'Block B', 'gemini')
+        # Reading the library entry makes the canteen the least recently used
+        self.assertIsNotNone(get_cached_response('where is the library'))
+        cache_response('where is the gym', 'Block C', 'gemini')
+        self.assertIsNone(get_cached_response('where is the canteen'))
+        self.assertEqual(get_cached_response('where is the library'), ('Block A', 'gemini'))
+        self.assertEqual(get_cached_response('where is the gym'), ('Block C', 'gemini'))
+        self.assertEqual(self.store.stats.snapshot()['evictions'], 1)
+
+    def test_local_store_entries_expire(self):
+        with mock.patch('chatbot.response_cache.time.monotonic', return_value=1000.0):
+            cache_response('where is the library', 'Block A', 'gemini')
+        with mock.patch('chatbot.response_cache.time.monotonic', return_value=1059.0):
+            self.assertEqual(get_cached_response('where is the library'), ('Block A', 'gemini'))
+        with mock.patch('chatbot.response_cache.time.monotonic', return_value=1061.0):
+            self.assertIsNone(get_cached_response('where is the library'))
+        self.assertEqual(len(self.store), 0)
+
+
+@override_settings(CHATBOT_WRITE_BEHIND=False)
+class ChatHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', 'student@example.com', 'pw')
+        for i in range(3):
+            ChatMessage.objects.create(user=cls.user, message='m%d' % i, response='r')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def history(self, **params):
+        return self.client.get(reverse('chatbot:chat_history'), params)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.history()['ETag']
+        response = self.client.get(reverse('chatbot:chat_history'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_message_changes_etag(self):
+        etag = self.history()['ETag']
+        ChatMessage.objects.create(user=self.user, message='m3', response='r')
+        response = self.client.get(reverse('chatbot:chat_history'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_since_returns_only_newer_messages(self):
+        since = self.history().json()['since']
+        self.assertEqual(self.history(since=since).json()['messages'], [])
+        ChatMessage.objects.create(user=self.user, message='m3', response='r')
+        data = self.history(since=since).json()
+        self.assertEqual([m['message'] for m in data['messages']], ['m3'])
+        self.assertNotEqual(data['since'], since)
+
+    def test_bad_cursor_is_rejected(self):
+        for params in ({'since': 'not-a-cursor'}, {'before': 'bm90IGEgZGF0ZXwx'}):
+            with self.subTest(**params):
+                response = self.history(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+
+class WriteBehindFailureTests(TransactionTestCase):
+    # Foreign keys are checked at commit, which TestCase never reaches
+
+    def setUp(self):
+        self.user = User.objects.create_user('student', 'student@example.com', 'pw')
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def row(self, message, user_id=None):
+        return ChatMessage(user_id=user_id or self.user.pk, message=message, response='r', timestamp=timezone.now())
+
+    def test_rejected_row_is_dead_lettered_and_the_rest_saved(self):
+        buffer = chat_buffer.WriteBehindBuffer(100, 60, self.dir)
+        self.addCleanup(buffer.close)
+        buffer.add(self.row('one'))
+        buffer.add(self.row('orphan', user_id=self.user.pk + 1000))
+        buffer.add(self.row('two'))
+        with self.assertLogs('chatbot.chat_buffer', 'ERROR'):
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(sorted(ChatMessage.objects.values_list('message', flat=True)), ['one', 'two'])
+        dead = [json.loads(line)['message'] for line in buffer._dead_letter_path.read_text().splitlines()]
+        self.assertEqual(dead, ['orphan'])
+        snapshot = buffer.snapshot()
+        self.assertEqual((snapshot['queued'], snapshot['flushed'], snapshot['dead_lettered']), (0, 2, 1))
+        self.assertEqual(buffer._journal_path.read_text(), '')
+
+    def test_full_queue_writes_directly(self):
+        buffer = chat_buffer.WriteBehindBuffer(100, 60, self.dir, max_queue=1)
+        self.addCleanup(buffer.close)
+        with override_settings(CHATBOT_WRITE_BEHIND=True), mock.patch.object(chat_buffer, '_buffer', buffer):
+            chat_buffer.save_chat_message(self.user, 'queued', 'r')
+            direct = chat_buffer.save_chat_message(self.user, 'direct', 'r')
+        self.assertIsNotNone(direct.pk)
+        self.assertEqual(list(ChatMessage.objects.values_list('message', flat=True)), ['direct'])
+        self.assertEqual(buffer.snapshot()['overflowed'], 1)
+
+
+class WriteBehindHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', 'student@example.com', 'pw')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def test_history_includes_rows_queued_by_other_workers(self):
+        saved = ChatMessage.objects.create(user=self.user, message='saved', response='r')
+        # Another live worker's journal: one row it already committed, one still queued
+        with open(os.path.join(self.dir, '%d-otherworker.jsonl' % os.getpid()), 'w') as f:
+            f.write(chat_buffer._row_to_json(saved) + '\n')
+            f.write(chat_buffer._row_to_json(ChatMessage(
+                user=self.user, message='queued elsewhere', response='r', timestamp=timezone.now())) + '\n')
+            f.write('{"user_id": %d, "mess' % self.user.pk)
+        buffer = chat_buffer.WriteBehindBuffer(100, 60, self.dir)
+        self.addCleanup(buffer.close)
+        self.client.force_login(self.user)
+        with override_settings(CHATBOT_WRITE_BEHIND=True), mock.patch.object(chat_buffer, '_buffer', buffer):
+            data = self.client.get(reverse('chatbot:chat_history')).json()
+        self.assertEqual([m['message'] for m in data['messages']], ['saved', 'queued elsewhere'])
+
+
+class ArchiveLockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', 'student@example.com', 'pw')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        ChatMessage.objects.create(user=self.user, message='old', response='r')
+        ChatMessage.objects.update(timestamp=timezone.now() - timedelta(days=400))
+
+    def run_command(self):
+        out = io.StringIO()
+        with self.settings(CHATBOT_ARCHIVE_DIR=self.dir):
+            call_command('archive_chat_messages', stdout=out)
+        return out.getvalue()
+
+    def test_overlapping_run_exits_without_writing(self):
+        with archive.archive_lock(self.dir):
+            output = self.run_command()
+            self.assertIn('nothing archived', output)
+            self.assertEqual(os.listdir(self.dir), [archive.LOCK_NAME])
+            self.assertEqual(ChatMessage.objects.count(), 1)
+        self.assertIn('Archived 1 chat messages', self.run_command())
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertEqual([row['message'] for row in archive.iter_user_archive(self.user.pk, self.dir)], ['old'])
+
+
+class FAQUniqueMigrationTests(TestCase):
+    migration = importlib.import_module('chatbot.migrations.0004_faq_question_unique')
+
+    def test_conflicts_are_listed_not_deleted(self):
+        first = FAQ.objects.create(question='Where is the library?', answer='A')
+        second = FAQ.objects.create(question='where is the  LIBRARY?', answer='B')
+        FAQ.objects.create(question='How do I report an issue?', answer='C')
+        with self.assertRaisesMessage(RuntimeError, '#%d' % second.pk) as raised:
+            self.migration.check_duplicate_questions(apps, None)
+        self.assertIn('#%d' % first.pk, str(raised.exception))
+        self.assertEqual(FAQ.objects.count(), 3)
+
+    def test_distinct_questions_pass(self):
+        FAQ.objects.create(question='Where is the library?', answer='A')
+        FAQ.objects.create(question='Where is the canteen?', answer='B')
+        self.migration.check_duplicate_questions(apps, None)
@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'chatbot'
 
 urlpatterns = [
-    path('send/', views.chat_send, name='chat_send'),
+    path('send/', views.chat_send_async if settings.CHATBOT_ASYNC else views.chat_send, name='chat_send'),
+    path('send/async/', views.chat_send_async, name='chat_send_async'),
+    path('stream/', views.chat_stream, name='chat_stream'),
     path('history/', views.chat_history, name='chat_history'),
+    path('history/archive/', views.chat_archive, name='chat_archive'),
+    path('status/', views.backend_status, name='backend_status'),
     path('enabled/', views.chatbot_enabled, name='chatbot_enabled'),
 ]
@@ -1,37 +1,133 @@
-from django.shortcuts import render
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST, require_GET
+from django.views.decorators.http import require_POST, require_GET, condition
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponseNotAllowed, StreamingHttpResponse
 from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from asgiref.sync import sync_to_async
 from .models import ChatMessage, FAQ
-from .ai_logic import generate_response, get_gemini_response, get_openai_response
-import time
+from .ai_logic import generate_response, answer_locally, get_llm_response, get_llm_response_async, LLM_BACKENDS
+from .backends import get_backend, BACKENDS, StreamInterrupted
+from . import response_cache, intent_model
+from .response_cache import get_cached_response, cache_response
+from .ratelimit import rate_limit
+from .chat_buffer import save_chat_message, pending_messages, buffer_stats
+from .archive import iter_user_archive
+from accounts.decorators import admin_required
+from contextlib import closing
+import base64
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Simple rate limit: max 10 messages per minute per user
-RATE_LIMIT = {}
-RATE_LIMIT_WINDOW = 60
-RATE_LIMIT_MAX = 10
 
+@login_required
+@require_POST
+@rate_limit('CHATBOT_RATE_LIMIT', scope='chat')
+def chat_send(request):
+    """Handle chatbot message and return response."""
+    if not getattr(settings, 'CHATBOT_ENABLED', True):
+        return JsonResponse({'error': 'Chatbot is disabled'}, status=403)
+
+    message = request.POST.get('message', '').strip()
+    if not message:
+        return JsonResponse({'error': 'Empty message'}, status=400)
+
+    # Answer confidently classified messages locally; otherwise try Gemini,
+    # then OpenAI (both cached), then rule-based
+    response_text = answer_locally(request.user, message)
+    backend_used = "local"
+    if response_text is None:
+        response_text, backend_used = get_llm_response(message, request.user)
+    if response_text is None:
+        backend_used = "rule_based"
+        response_text = generate_response(request.user, message)
+
+    # Store in DB (possibly write-behind)
+    obj = save_chat_message(request.user, message, response_text)
+
+    return JsonResponse({
+        'response': response_text,
+        'backend_used': backend_used,
+        'timestamp': obj.timestamp.isoformat()
+    })
+
+
+def _sse(event, data):
+    return 'event: %s\ndata: %s\n\n' % (event, json.dumps(data))
+
+
+def _stream_reply(user, message):
+    """SSE events for one reply: ``token`` chunks or a single ``message``, then ``done``.
+
+    If a backend fails part-way, an ``error`` event tells the widget to drop
+    the tokens shown so far and the next backend (or the rule-based reply)
+    answers instead; the partial text is never cached or saved.
+    """
+    local = answer_locally(user, message)
+    cached = get_cached_response(message) if local is None else (local, 'local')
+    if cached is not None:
+        response_text, backend_used = cached
+        yield _sse('message', {'text': response_text})
+    else:
+        response_text, backend_used = '', None
+        for name in LLM_BACKENDS:
+            parts = []
+            try:
+                # closing() makes a client disconnect close the upstream stream too
+                with closing(get_backend(name).stream(message, user)) as chunks:
+                    for chunk in chunks:
+                        parts.append(chunk)
+                        yield _sse('token', {'text': chunk})
+            except StreamInterrupted:
+                yield _sse('error', {'error': 'The reply was interrupted.', 'backend': name})
+                continue
+            if parts:
+                response_text, backend_used = ''.join(parts), name
+                cache_response(message, response_text, name)
+                break
+        if not response_text:
+            backend_used = "rule_based"
+            response_text = generate_response(user, message)
+            yield _sse('message', {'text': response_text})
 
-def _check_rate_limit(user_id):
-    now = time.time()
-    if user_id not in RATE_LIMIT:
-        RATE_LIMIT[user_id] = []
-    RATE_LIMIT[user_id] = [t for t in RATE_LIMIT[user_id] if now - t < RATE_LIMIT_WINDOW]
-    if len(RATE_LIMIT[user_id]) >= RATE_LIMIT_MAX:
-        return False
-    RATE_LIMIT[user_id].append(now)
-    return True
+    # Only reached if the client stayed connected for the whole reply
+    obj = save_chat_message(user, message, response_text)
+    yield _sse('done', {'backend_used': backend_used, 'timestamp': obj.timestamp.isoformat()})
+
+
+async def _aiter_events(events):
+    """Drive a sync event generator from the ASGI event loop one event at a time.
+
+    Django 4.2 reads a sync iterator to the end before sending anything under
+    ASGI; pulling each event through ``sync_to_async`` (in the request's own
+    thread, so ORM calls stay valid) sends it as soon as it exists. Closing
+    this generator closes the sync one and so the upstream backend stream.
+    """
+    done = object()
+    step = sync_to_async(next)
+    try:
+        while True:
+            event = await step(events, done)
+            if event is done:
+                break
+            yield event
+    finally:
+        await sync_to_async(events.close)()
 
 
 @login_required
 @require_POST
-def chat_send(request):
-    """Handle chatbot message and return response."""
+@rate_limit('CHATBOT_RATE_LIMIT', scope='chat')
+def chat_stream(request):
+    """Stream the chatbot reply to the widget as Server-Sent Events."""
     if not getattr(settings, 'CHATBOT_ENABLED', True):
         return JsonResponse({'error': 'Chatbot is disabled'}, status=403)
 
@@ -39,27 +135,49 @@ def chat_send(request):
     if not message:
         return JsonResponse({'error': 'Empty message'}, status=400)
 
-    if not _check_rate_limit(request.user.id):
-        return JsonResponse({'error': 'Rate limit exceeded. Please wait.'}, status=429)
+    events = _stream_reply(request.user, message)
+    if isinstance(request, ASGIRequest):
+        events = _aiter_events(events)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the event stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _get_authenticated_user(request):
+    user = request.user
+    return user if user.is_authenticated else None
+
 
-    # Try Gemini first, then OpenAI, then rule-based
-    backend_used = "rule_based"
-    response_text = get_gemini_response(message, request.user)
-    if response_text is not None:
-        backend_used = "gemini"
+@rate_limit('CHATBOT_RATE_LIMIT', scope='chat')
+async def chat_send_async(request):
+    """Async chat_send for ASGI: hedged backend calls within a latency budget.
+
+    Same JSON contract as chat_send. Login and method checks are done inline
+    because the sync-only view decorators can't wrap a coroutine on Django 4.2.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    user = await sync_to_async(_get_authenticated_user)(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if not getattr(settings, 'CHATBOT_ENABLED', True):
+        return JsonResponse({'error': 'Chatbot is disabled'}, status=403)
+
+    message = request.POST.get('message', '').strip()
+    if not message:
+        return JsonResponse({'error': 'Empty message'}, status=400)
+
+    response_text = await sync_to_async(answer_locally)(user, message)
+    backend_used = "local"
     if response_text is None:
-        response_text = get_openai_response(message, request.user)
-        if response_text is not None:
-            backend_used = "openai"
+        response_text, backend_used = await get_llm_response_async(message, user)
     if response_text is None:
-        response_text = generate_response(request.user, message)
+        backend_used = "rule_based"
+        response_text = await sync_to_async(generate_response)(user, message)
 
-    # Store in DB
-    obj = ChatMessage.objects.create(
-        user=request.user,
-        message=message,
-        response=response_text
-    )
+    obj = await sync_to_async(save_chat_message)(user, message, response_text)
 
     return JsonResponse({
         'response': response_text,
@@ -68,15 +186,122 @@ def chat_send(request):
     })
 
 
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+# Rows still in the write-behind buffer have no id yet; they sort after saved
+# rows with the same timestamp so a flushed copy is never sent twice.
+_UNSAVED_ID = 2 ** 63 - 1
+
+
+def _row_key(m):
+    return (m.timestamp, m.pk or _UNSAVED_ID)
+
+
+def _unsaved(pending, saved):
+    """Queued rows not among ``saved``: a flush may have just committed them."""
+    keys = {(m.timestamp, m.message) for m in saved}
+    return [m for m in pending if (m.timestamp, m.message) not in keys]
+
+
+def _encode_cursor(m):
+    ts, pk = _row_key(m)
+    return base64.urlsafe_b64encode(('%s|%d' % (ts.isoformat(), pk)).encode()).decode()
+
+
+def _decode_cursor(value):
+    ts, _, pk = base64.urlsafe_b64decode(value.encode()).decode().partition('|')
+    timestamp = parse_datetime(ts)
+    if timestamp is None:
+        raise ValueError(value)
+    return timestamp, int(pk)
+
+
+def _history_etag(request):
+    """Cheap validator: newest stored row, queued rows and the query string."""
+    latest = ChatMessage.objects.filter(user=request.user).order_by('-timestamp', '-id').values_list('id', 'timestamp').first()
+    pending = len(pending_messages(request.user.id))
+    raw = '%s:%s:%s:%s' % (request.user.id, latest, pending, request.GET.urlencode())
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
 @login_required
 @require_GET
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_history_etag)
 def chat_history(request):
-    """Get user's chat history."""
-    messages = ChatMessage.objects.filter(user=request.user).order_by('-timestamp')[:20]
-    data = [{'message': m.message, 'response': m.response, 'timestamp': m.timestamp.isoformat()} for m in reversed(list(messages))]
-    return JsonResponse({'messages': data})
+    """Get user's chat history, newest page first, with keyset cursors.
+
+    ``?before=<cursor>`` pages back to older messages; ``?since=<cursor>``
+    returns only messages newer than the cursor. Responses carry
+    ``before`` (cursor for the next older page, or null) and ``since``
+    (cursor to poll for new messages).
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+        before = _decode_cursor(request.GET['before']) if request.GET.get('before') else None
+        since = _decode_cursor(request.GET['since']) if request.GET.get('since') else None
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    qs = ChatMessage.objects.filter(user=request.user)
+    pending = [] if before else pending_messages(request.user.id)
+    if since:
+        ts, pk = since
+        rows = list(qs.filter(Q(timestamp__gt=ts) | Q(timestamp=ts, id__gt=pk)).order_by('timestamp', 'id')[:limit + 1])
+        rows += [m for m in _unsaved(pending, rows) if _row_key(m) > since]
+        rows = sorted(rows, key=_row_key)
+        has_older = False
+        rows = rows[:limit]
+    else:
+        if before:
+            ts, pk = before
+            qs = qs.filter(Q(timestamp__lt=ts) | Q(timestamp=ts, id__lt=pk))
+        rows = list(qs.order_by('-timestamp', '-id')[:limit + 1])
+        # Include messages still queued by the write-behind buffer
+        rows = sorted(rows + _unsaved(pending, rows), key=_row_key, reverse=True)
+        has_older = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+
+    data = [{'message': m.message, 'response': m.response, 'timestamp': m.timestamp.isoformat()} for m in rows]
+    return JsonResponse({
+        'messages': data,
+        'before': _encode_cursor(rows[0]) if has_older else None,
+        'since': _encode_cursor(rows[-1]) if rows else request.GET.get('since'),
+    })
+
+
+@login_required
+@require_GET
+def chat_archive(request):
+    """Stream the user's archived (retention-expired) chat history as JSON Lines."""
+    rows = iter_user_archive(request.user.id)
+    lines = (json.dumps({
+        'message': row['message'], 'response': row['response'], 'timestamp': row['timestamp'].isoformat(),
+    }) + '\n' for row in rows)
+    return StreamingHttpResponse(lines, content_type='application/x-ndjson')
 
 
 def chatbot_enabled(request):
     """Check if chatbot is enabled."""
     return JsonResponse({'enabled': getattr(settings, 'CHATBOT_ENABLED', True)})
+
+
+@admin_required
+def backend_status(request):
+    """Admin page with circuit breaker state and latency counters per backend."""
+    if request.method == 'POST' and request.POST.get('reset') in BACKENDS:
+        BACKENDS[request.POST['reset']].breaker.reset()
+        return redirect('chatbot:backend_status')
+    backends = [{
+        'name': name,
+        'enabled': backend.is_enabled(),
+        'breaker': backend.breaker.snapshot(),
+        'stats': backend.stats.snapshot(),
+    } for name, backend in BACKENDS.items()]
+    return render(request, 'chatbot/status.html', {
+        'backends': backends,
+        'cache_stats': response_cache.stats.snapshot(),
+        'write_behind': buffer_stats(),
+        'routing': intent_model.stats.snapshot(),
+        'intent_model': intent_model.get_classifier() is not None,
+    })
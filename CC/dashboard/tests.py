@@ -0,0 +1,70 @@
+import re
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from accounts.models import User
+from chatbot.models import ChatMessage
+from issues.models import Issue
+from .models import Notification
+
+# "SCAN <table>" with no "USING ... INDEX" reads every row of the table
+_FULL_SCAN_RE = re.compile(r'^SCAN (TABLE )?\w+( AS \w+)?$', re.MULTILINE)
+
+
+class QueryPlanTests(TestCase):
+    """Every query behind the dashboards, issue list and chat history uses an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', role='admin')
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', role='maintenance')
+        cls.student = User.objects.create_user('student', 'student@example.com', 'pw', role='student')
+        Issue.objects.bulk_create([
+            Issue(title='Issue %d' % i, description='Description', category='other', priority='low',
+                  reported_by=cls.student, assigned_to=cls.staff if i % 2 else None)
+            for i in range(30)
+        ])
+        Notification.objects.bulk_create([
+            Notification(user=cls.student, title='Note %d' % i, message='Message') for i in range(20)
+        ])
+        ChatMessage.objects.bulk_create([
+            ChatMessage(user=cls.student, message='Q%d' % i, response='A%d' % i) for i in range(30)
+        ])
+
+    def assert_indexed(self, user, url, data=None):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, data)
+        self.assertLess(response.status_code, 400, url)
+        with connection.cursor() as cursor:
+            for query in captured.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'django_session' in sql:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+                self.assertIsNone(_FULL_SCAN_RE.search(plan), '%s\n%s\n%s' % (url, sql, plan))
+        return response
+
+    def test_dashboards_and_notifications(self):
+        self.assert_indexed(self.student, reverse('dashboard:student_dashboard'))
+        self.assert_indexed(self.staff, reverse('dashboard:maintenance_dashboard'))
+        self.assert_indexed(self.admin, reverse('dashboard:admin_dashboard'))
+        for field, value in (('category', 'other'), ('priority', 'low'), ('status', 'pending')):
+            self.assert_indexed(self.admin, reverse('dashboard:admin_dashboard'), {field: value})
+        self.assert_indexed(self.student, reverse('dashboard:notifications_api'))
+
+    def test_issue_list_filters(self):
+        url = reverse('issues:issue_list')
+        for user in (self.admin, self.staff, self.student):
+            first = self.assert_indexed(user, url)
+            self.assert_indexed(user, url, {'before': first.context['older_cursor']})
+            for field, value in (('category', 'other'), ('priority', 'low'), ('status', 'pending')):
+                self.assert_indexed(user, url, {field: value})
+
+    def test_chat_history(self):
+        url = reverse('chatbot:chat_history')
+        first = self.assert_indexed(self.student, url).json()
+        self.assert_indexed(self.student, url, {'before': first['before']})
+        self.assert_indexed(self.student, url, {'since': first['since']})
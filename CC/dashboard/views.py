@@ -9,6 +9,7 @@ from datetime import timedelta
 import csv
 import json
 from .models import Notification
+from issues import dedup
 from issues.models import Issue
 from accounts.decorators import student_required, admin_required, maintenance_required
 
@@ -101,12 +102,17 @@ def analytics(request):
     staff_perf = Issue.objects.filter(assigned_to__isnull=False, status='resolved').values(
         'assigned_to__username', 'assigned_to__first_name', 'assigned_to__last_name'
     ).annotate(resolved=Count('id')).order_by('-resolved')[:10]
+    # Near-duplicate detection: linked duplicates overall, lookups in this worker
+    linked_duplicates = Issue.objects.filter(duplicate_of__isnull=False).count()
     return render(request, 'dashboard/analytics.html', {
         'category_data': json.dumps(list(category_data)),
         'monthly_data': json.dumps(monthly),
         'avg_resolution_hours': round(avg_resolution_hours, 2),
         'resolution_rate': round(resolution_rate, 1),
         'staff_perf': staff_perf,
+        'linked_duplicates': linked_duplicates,
+        'duplicate_rate': round(linked_duplicates / total * 100, 1) if total > 0 else 0,
+        'duplicate_stats': dedup.stats.snapshot(),
     })
 
 
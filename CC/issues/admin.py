@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Issue, IssueHistory
+from .models import Issue, IssueHistory, OutboxEmail
 
 
 class IssueHistoryInline(admin.TabularInline):
@@ -20,3 +20,11 @@ class IssueAdmin(admin.ModelAdmin):
 @admin.register(IssueHistory)
 class IssueHistoryAdmin(admin.ModelAdmin):
     list_display = ['issue', 'old_status', 'new_status', 'changed_by', 'created_at']
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject', 'to']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
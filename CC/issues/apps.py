@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class IssuesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'issues'
+    verbose_name = 'Issues'
+
+    def ready(self):
+        from .signals import ensure_fts_triggers
+        post_migrate.connect(ensure_fts_triggers, sender=self)
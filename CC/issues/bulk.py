@@ -0,0 +1,120 @@
+"""Bulk assignment and status changes for admins.
+
+Each operation loads the selected issues with their reporter and assignee in
+one query, then writes issues, history rows, notifications and outbox emails
+with one ``bulk_update``/``bulk_create`` each, all in one transaction. Each
+recipient gets one digest email listing every change that concerns them
+instead of one email per issue. The number of queries does not depend on how
+many issues are selected.
+"""
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from chatbot.issue_context import issue_changed
+from dashboard.models import Notification
+from .models import Issue, IssueHistory, OutboxEmail
+
+# Upper bound for one bulk request; larger selections are rejected, not cut short
+MAX_BULK_ISSUES = 2000
+
+
+class BulkLimitExceeded(ValueError):
+    """The selection has more than ``MAX_BULK_ISSUES`` issues; nothing was changed."""
+
+    def __init__(self, count):
+        super().__init__('%d issues selected; at most %d can be changed at once' % (count, MAX_BULK_ISSUES))
+        self.count = count
+        self.limit = MAX_BULK_ISSUES
+
+
+def _load(issues):
+    rows = list(issues.select_related('reported_by', 'assigned_to').order_by('id')[:MAX_BULK_ISSUES + 1])
+    if len(rows) > MAX_BULK_ISSUES:
+        raise BulkLimitExceeded(issues.count())
+    return rows
+
+
+def _digest_emails(lines_by_email, subject, footer=''):
+    """One outbox email per address; ``subject`` gets the number of lines."""
+    return [
+        OutboxEmail(
+            subject=(subject % len(lines))[:255],
+            body='\n'.join(lines) + ('\n\n' + footer if footer else ''),
+            from_email=settings.DEFAULT_FROM_EMAIL, to=email,
+        )
+        for email, lines in lines_by_email.items() if email
+    ]
+
+
+def _finish(changed, notifications, emails):
+    Notification.objects.bulk_create(notifications)
+    OutboxEmail.objects.bulk_create(emails)
+    # bulk_update sends no post_save, so refresh the chatbot's cached summaries here
+    for user_id in {issue.reported_by_id for issue in changed}:
+        issue_changed(user_id)
+
+
+@transaction.atomic
+def bulk_assign(issues, assignee):
+    """Assign every issue in ``issues`` to ``assignee`` (None to unassign). Returns the changed count.
+
+    Raises ``BulkLimitExceeded`` for more than ``MAX_BULK_ISSUES`` issues.
+    """
+    now = timezone.now()
+    changed = [i for i in _load(issues) if i.assigned_to_id != (assignee.pk if assignee else None)]
+    notifications = []
+    reporter_lines = defaultdict(list)
+    assignee_lines = []
+    for issue in changed:
+        issue.assigned_to = assignee
+        issue.updated_at = now
+        link = f'/issues/{issue.id}/'
+        notifications.append(Notification(
+            user=issue.reported_by, title='Issue Assigned', message=f'Issue "{issue.title}" has been assigned.', link=link))
+        reporter_lines[issue.reported_by.email].append(f'- "{issue.title}" has been assigned to maintenance staff.')
+        if assignee:
+            notifications.append(Notification(
+                user=assignee, title='New Assignment', message=f'You have been assigned: {issue.title}', link=link))
+            assignee_lines.append(f'- {issue.title}')
+    Issue.objects.bulk_update(changed, ['assigned_to', 'updated_at'])
+    emails = _digest_emails(reporter_lines, '[CampusCare] %d of your issues were assigned')
+    if assignee and assignee_lines:
+        emails += _digest_emails({assignee.email: assignee_lines},
+                                 '[CampusCare] %d new assignments')
+    _finish(changed, notifications, emails)
+    return len(changed)
+
+
+@transaction.atomic
+def bulk_set_status(issues, status, actor, notes=''):
+    """Move every issue in ``issues`` to ``status``, recording history. Returns the changed count.
+
+    Raises ``BulkLimitExceeded`` for more than ``MAX_BULK_ISSUES`` issues.
+    """
+    now = timezone.now()
+    status_display = dict(Issue.STATUS_CHOICES)
+    changed = [i for i in _load(issues) if i.status != status]
+    history = []
+    notifications = []
+    reporter_lines = defaultdict(list)
+    for issue in changed:
+        old_status = issue.status
+        issue.status = status
+        issue.updated_at = now
+        if status == 'resolved':
+            issue.resolved_at = now
+            issue.resolution_notes = notes or issue.resolution_notes
+        history.append(IssueHistory(
+            issue=issue, old_status=old_status, new_status=status, changed_by=actor, notes=notes))
+        notifications.append(Notification(
+            user=issue.reported_by, title='Status Update',
+            message=f'Issue "{issue.title}" is now {status}.', link=f'/issues/{issue.id}/'))
+        reporter_lines[issue.reported_by.email].append(
+            f'- "{issue.title}": {status_display.get(old_status, old_status)} -> {status_display[status]}')
+    Issue.objects.bulk_update(changed, ['status', 'updated_at', 'resolved_at', 'resolution_notes'])
+    IssueHistory.objects.bulk_create(history)
+    footer = f'Resolution notes: {notes}' if notes and status == 'resolved' else ''
+    emails = _digest_emails(reporter_lines, '[CampusCare] Status update for %d of your issues', footer)
+    _finish(changed, notifications, emails)
+    return len(changed)
@@ -0,0 +1,228 @@
+"""Near-duplicate detection for newly submitted issues.
+
+Each issue's title and description are reduced to character 4-gram shingles
+and a ``NUM_PERM``-value MinHash signature, stored on ``Issue.minhash``. The
+signature is cut into ``BANDS`` bands of ``ROWS`` values; each band hashes,
+together with the issue's category and normalized building, to one
+``IssueLSHBucket`` key. A new issue is only compared with open issues that
+share at least one bucket, which are already in the same category and
+building, so a lookup reads a handful of indexed bucket rows instead of every
+issue. Candidates whose estimated Jaccard similarity reaches
+``ISSUE_DUPLICATE_THRESHOLD`` are offered to the reporter for linking.
+
+Bands of four rows make two issues bucket candidates with probability
+``1 - (1 - s**4) ** 16`` for similarity ``s``: about 12% at 0.3, 64% at 0.5
+and 99% at 0.7. Narrower bands match almost any two issues sharing common
+wording ("not working", "hostel"), which makes the lookup linear again.
+
+Photos are matched the same way. The 64-bit dHash of each photo is split
+into ``len(PHOTO_BLOCK_BITS)`` blocks stored as ``PhotoHashBlock`` keys; two
+hashes within ``PHOTO_MAX_DISTANCE`` bits must agree exactly on at least one
+block (pigeonhole), so a similar-photo search is a few indexed lookups
+followed by a Hamming check on the candidates.
+"""
+import hashlib
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from django.conf import settings
+from .models import Issue, IssueLSHBucket, PhotoHashBlock
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+OPEN_STATUSES = ('pending', 'in_progress')
+MAX_SUGGESTIONS = 5
+
+# Six blocks: any two hashes at most five bits apart share one block exactly
+PHOTO_BLOCK_BITS = (11, 11, 11, 11, 10, 10)
+PHOTO_MAX_DISTANCE = len(PHOTO_BLOCK_BITS) - 1
+
+_PRIME = np.uint64((1 << 31) - 1)
+# Fixed seed: signatures must stay comparable across processes and restarts
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+_SPACE_RE = re.compile(r'\s+')
+_PUNCT_RE = re.compile(r'[^\w\s]+')
+
+
+def shingles(text):
+    """Set of character shingles of the lowercased, punctuation-free text."""
+    text = _SPACE_RE.sub(' ', _PUNCT_RE.sub(' ', text.lower())).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def issue_text(issue):
+    return '%s %s' % (issue.title, issue.description)
+
+
+def minhash(text):
+    """MinHash signature of ``text`` as a ``uint32`` array of length ``NUM_PERM``."""
+    grams = shingles(text)
+    if not grams:
+        return np.full(NUM_PERM, 0xFFFFFFFF, dtype=np.uint32)
+    hashes = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+    hashes %= _PRIME
+    # (a * x + b) mod p for every permutation and shingle; a, x < 2**31 keeps it in uint64
+    permuted = (np.outer(_A, hashes) + _B[:, None]) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def bucket_scope(issue):
+    """Category and normalized building of an issue, hashed into its band keys."""
+    building = _SPACE_RE.sub(' ', issue.location_building or '').strip().lower()
+    return ('%s\0%s\0' % (issue.category, building)).encode()
+
+
+def band_keys(signature, scope=b''):
+    """One signed 64-bit bucket key per band."""
+    keys = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS:(band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(bytes([band]) + scope + chunk, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+def load_signature(raw):
+    return np.frombuffer(bytes(raw), dtype=np.uint32)
+
+
+def photo_block_keys(value):
+    """One integer key per dHash block: block index in the high bits, block value below."""
+    value &= (1 << 64) - 1
+    keys = []
+    shift = 64
+    for block, bits in enumerate(PHOTO_BLOCK_BITS):
+        shift -= bits
+        keys.append((block << 16) | ((value >> shift) & ((1 << bits) - 1)))
+    return keys
+
+
+def hamming(a, b):
+    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
+
+
+class DuplicateStats:
+    """Lookups run by this worker, how many found a likely duplicate, and their latency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checks = 0
+            self.flagged = 0
+            self.total_ms = 0.0
+            self.max_ms = 0.0
+
+    def record(self, elapsed_ms, flagged):
+        with self._lock:
+            self.checks += 1
+            self.flagged += int(flagged)
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checks': self.checks,
+                'flagged': self.flagged,
+                'flag_rate': round(self.flagged / self.checks, 3) if self.checks else 0.0,
+                'avg_ms': round(self.total_ms / self.checks, 2) if self.checks else 0.0,
+                'max_ms': round(self.max_ms, 2),
+            }
+
+
+stats = DuplicateStats()
+
+
+def index_issue(issue):
+    """Store the issue's signature and replace its LSH bucket rows."""
+    signature = minhash(issue_text(issue))
+    issue.minhash = signature.tobytes()
+    Issue.objects.filter(pk=issue.pk).update(minhash=issue.minhash)
+    IssueLSHBucket.objects.filter(issue_id=issue.pk).delete()
+    IssueLSHBucket.objects.bulk_create([
+        IssueLSHBucket(issue_id=issue.pk, key=k) for k in band_keys(signature, bucket_scope(issue))])
+    if issue.image_dhash is not None:
+        index_photo(issue.pk, issue.image_dhash)
+    return signature
+
+
+def index_photo(issue_id, value):
+    """Replace the issue's dHash block rows."""
+    PhotoHashBlock.objects.filter(issue_id=issue_id).delete()
+    if value is not None:
+        PhotoHashBlock.objects.bulk_create([PhotoHashBlock(issue_id=issue_id, key=k) for k in photo_block_keys(value)])
+
+
+def find_similar_photos(value, queryset=None, exclude_id=None):
+    """``(issue_id, distance)`` pairs for photos within ``PHOTO_MAX_DISTANCE`` bits of ``value``.
+
+    ``queryset`` optionally narrows the issues considered (e.g. open ones).
+    """
+    blocks = PhotoHashBlock.objects.filter(key__in=photo_block_keys(value))
+    if queryset is not None:
+        blocks = blocks.filter(issue__in=queryset.values('id'))
+    if exclude_id is not None:
+        blocks = blocks.exclude(issue_id=exclude_id)
+    candidate_ids = set(blocks.values_list('issue_id', flat=True))
+    if not candidate_ids:
+        return []
+    hashes = Issue.objects.filter(id__in=candidate_ids, image_dhash__isnull=False).values_list('id', 'image_dhash')
+    matches = [(pk, hamming(value, other)) for pk, other in hashes]
+    return sorted((m for m in matches if m[1] <= PHOTO_MAX_DISTANCE), key=lambda m: (m[1], m[0]))
+
+
+def lsh_candidates(issue, signature):
+    """Ids of open issues sharing a bucket with ``signature`` in the issue's category and building."""
+    return set(
+        IssueLSHBucket.objects.filter(
+            key__in=band_keys(signature, bucket_scope(issue)), issue__status__in=OPEN_STATUSES,
+        ).exclude(issue_id=issue.pk).values_list('issue_id', flat=True)
+    )
+
+
+def find_duplicates(issue, signature=None):
+    """Open issues that likely report the same problem as ``issue``.
+
+    Text matches come from the same category and building; photo matches from
+    the same category anywhere, scored ``1 - distance / 64``. Returns up to
+    ``MAX_SUGGESTIONS`` ``(issue, similarity)`` pairs, most similar first.
+    """
+    start = time.perf_counter()
+    if signature is None:
+        signature = minhash(issue_text(issue))
+    threshold = getattr(settings, 'ISSUE_DUPLICATE_THRESHOLD', 0.5)
+    candidate_ids = lsh_candidates(issue, signature)
+    photo_scores = {}
+    if issue.image_dhash is not None:
+        open_issues = Issue.objects.filter(status__in=OPEN_STATUSES, category=issue.category)
+        for pk, distance in find_similar_photos(issue.image_dhash, open_issues, exclude_id=issue.pk):
+            photo_scores[pk] = 1 - distance / 64
+    matches = []
+    if candidate_ids or photo_scores:
+        candidates = Issue.objects.filter(id__in=candidate_ids | set(photo_scores)).only(
+            'id', 'title', 'status', 'location_building', 'location_room', 'created_at', 'minhash')
+        for candidate in candidates:
+            score = photo_scores.get(candidate.pk, 0.0)
+            if candidate.pk in candidate_ids and candidate.minhash is not None:
+                score = max(score, similarity(signature, load_signature(candidate.minhash)))
+            if score >= threshold:
+                matches.append((candidate, score))
+        matches.sort(key=lambda m: (-m[1], -m[0].pk))
+    stats.record((time.perf_counter() - start) * 1000, bool(matches))
+    return matches[:MAX_SUGGESTIONS]
@@ -58,3 +58,27 @@ class IssueStatusForm(forms.ModelForm):
             'status': forms.Select(attrs={'class': 'form-select'}),
             'resolution_notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Add resolution notes when resolving'}),
         }
+
+
+class IssueBulkForm(forms.Form):
+    """Admin bulk action over selected issues (or every issue matching the list filters)."""
+    ACTION_CHOICES = [('assign', 'Assign to'), ('status', 'Set status')]
+
+    action = forms.ChoiceField(choices=ACTION_CHOICES, widget=forms.Select(attrs={'class': 'form-select form-select-sm'}))
+    assigned_to = forms.ModelChoiceField(queryset=None, required=False, empty_label='Unassigned',
+                                         widget=forms.Select(attrs={'class': 'form-select form-select-sm'}))
+    status = forms.ChoiceField(choices=Issue.STATUS_CHOICES, required=False,
+                               widget=forms.Select(attrs={'class': 'form-select form-select-sm'}))
+    resolution_notes = forms.CharField(required=False, widget=forms.TextInput(
+        attrs={'class': 'form-control form-control-sm', 'placeholder': 'Resolution notes (optional)'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        from accounts.models import User
+        self.fields['assigned_to'].queryset = User.objects.filter(role='maintenance').order_by('username')
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('action') == 'status' and not cleaned.get('status'):
+            raise forms.ValidationError('Choose a status.')
+        return cleaned
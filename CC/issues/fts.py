@@ -0,0 +1,80 @@
+"""Schema of the SQLite FTS5 issue search index.
+
+``issues_issue_fts`` is an external-content FTS5 table over ``issues_issue``
+that three triggers keep in step. SQLite drops a table's triggers whenever
+Django's schema editor rebuilds it (most ``AddField``/``AlterField`` on
+``Issue``), so every migration that does that must call ``install_triggers``
+afterwards (see migration 0008). The ``post_migrate`` handler in
+``issues.signals`` reinstalls them and rebuilds the index if one forgot.
+"""
+
+FTS_TABLE = 'issues_issue_fts'
+FTS_COLUMNS = ('title', 'description', 'location_building', 'location_room', 'resolution_notes')
+TRIGGERS = ('issues_issue_fts_ai', 'issues_issue_fts_ad', 'issues_issue_fts_au')
+
+_COLUMNS = ', '.join(FTS_COLUMNS)
+_NEW = ', '.join('new.%s' % c for c in FTS_COLUMNS)
+_OLD = ', '.join('old.%s' % c for c in FTS_COLUMNS)
+
+CREATE_TABLE_SQL = (
+    # External-content table: the text lives only in issues_issue
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {t} USING fts5({c}, content='issues_issue', content_rowid='id', "
+    "tokenize='porter unicode61')".format(t=FTS_TABLE, c=_COLUMNS)
+)
+CREATE_TRIGGERS_SQL = [
+    "CREATE TRIGGER IF NOT EXISTS issues_issue_fts_ai AFTER INSERT ON issues_issue BEGIN "
+    "INSERT INTO {t}(rowid, {c}) VALUES (new.id, {new}); END".format(t=FTS_TABLE, c=_COLUMNS, new=_NEW),
+    "CREATE TRIGGER IF NOT EXISTS issues_issue_fts_ad AFTER DELETE ON issues_issue BEGIN "
+    "INSERT INTO {t}({t}, rowid, {c}) VALUES ('delete', old.id, {old}); END".format(t=FTS_TABLE, c=_COLUMNS, old=_OLD),
+    # Status and assignment changes don't touch indexed text, so they skip the re-index
+    "CREATE TRIGGER IF NOT EXISTS issues_issue_fts_au AFTER UPDATE OF {c} ON issues_issue BEGIN "
+    "INSERT INTO {t}({t}, rowid, {c}) VALUES ('delete', old.id, {old}); "
+    "INSERT INTO {t}(rowid, {c}) VALUES (new.id, {new}); END".format(t=FTS_TABLE, c=_COLUMNS, old=_OLD, new=_NEW),
+]
+REBUILD_SQL = "INSERT INTO {t}({t}) VALUES ('rebuild')".format(t=FTS_TABLE)
+DROP_SQL = ['DROP TRIGGER IF EXISTS %s' % name for name in reversed(TRIGGERS)] + [
+    'DROP TABLE IF EXISTS %s' % FTS_TABLE,
+]
+
+
+def missing_triggers(connection):
+    """Names of sync triggers that don't exist (empty off SQLite)."""
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'issues_issue'")
+        present = {row[0] for row in cursor.fetchall()}
+    return [name for name in TRIGGERS if name not in present]
+
+
+def install_triggers(connection, rebuild=True):
+    """Create the FTS table and any missing triggers, then re-index every issue.
+
+    Rows written while the triggers were missing are only picked up by the
+    rebuild, so leave ``rebuild`` on unless the index is known to be current.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+        for sql in CREATE_TRIGGERS_SQL:
+            cursor.execute(sql)
+        if rebuild:
+            cursor.execute(REBUILD_SQL)
+
+
+def drop_fts(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+def migration_install(apps, schema_editor):
+    """``RunPython`` forward step for migrations that rebuild ``issues_issue``."""
+    install_triggers(schema_editor.connection)
+
+
+def migration_drop(apps, schema_editor):
+    drop_fts(schema_editor.connection)
@@ -0,0 +1,206 @@
+"""Background processing of uploaded issue photos.
+
+After an issue with a photo commits, ``schedule_processing`` hands it to a
+single background thread. The worker re-encodes the original as a JPEG
+without EXIF (after applying the EXIF orientation), then writes WebP and JPEG
+thumbnails at each ``THUMBNAIL_WIDTHS`` width. File names carry a hash of the
+original bytes, so re-processing the same photo writes the same files and
+URLs can be cached forever. Results are recorded in ``Issue.image_variants``.
+
+Every photo is also fingerprinted with a SHA-256 of the bytes as uploaded
+and a 64-bit dHash. A byte-identical upload reuses the stored files of the
+earlier issue, and the dHash feeds the similar-photo index in ``issues.dedup``.
+Photos processed before fingerprinting no longer have their upload, so their
+SHA-256 is taken from the re-encoded file instead (see ``fingerprint_issue``).
+Photos missed by a stopped worker, and photos uploaded before this existed,
+are handled by ``process_issue_images``.
+"""
+import hashlib
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+from .dedup import index_photo
+from .models import Issue
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTHS = (320, 800)
+# Longest side of the re-encoded original
+MAX_ORIGINAL_SIZE = 2048
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+IMAGE_DIR = 'issue_images'
+VARIANT_DIR = 'issue_images/variants'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _encode(image, fmt):
+    buf = io.BytesIO()
+    if fmt == 'jpeg':
+        if image.mode == 'RGBA':
+            # JPEG has no alpha; flatten onto white rather than black
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        image.convert('RGB').save(buf, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buf, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return buf.getvalue()
+
+
+def _store(name, data):
+    # Same content hash -> same bytes, so an existing file can be kept
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+    return name
+
+
+def dhash(image):
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail."""
+    small = image.convert('L').resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col + 1] > pixels[row * 9 + col])
+    return value
+
+
+def fingerprint(fileobj):
+    """``(sha256 hex, dhash)`` of an image file object; the file is rewound afterwards."""
+    fileobj.seek(0)
+    sha = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(1 << 16), b''):
+        sha.update(chunk)
+    fileobj.seek(0)
+    with Image.open(fileobj) as src:
+        # JPEGs decode at 1/8 scale or less; the hash only needs 9x8 pixels
+        src.draft('L', (64, 64))
+        value = dhash(ImageOps.exif_transpose(src))
+    fileobj.seek(0)
+    return sha.hexdigest(), value
+
+
+def original_name(sha):
+    """Storage name of the re-encoded photo for an upload with this SHA-256."""
+    return posixpath.join(IMAGE_DIR, '%s.jpg' % sha[:20])
+
+
+def fingerprint_upload(issue):
+    """Fingerprint a new issue's photo and reuse the stored copy of an identical one.
+
+    When another issue already has a processed photo with the same bytes, the
+    issue points at those files instead of storing the upload again.
+    """
+    sha, value = fingerprint(issue.image.file)
+    issue.image_sha256 = sha
+    issue.image_dhash = to_signed(value)
+    issues = Issue.objects.exclude(image_variants={}).only('id', 'image', 'image_variants')
+    existing = issues.filter(image_sha256=sha).first()
+    if existing is None and default_storage.exists(original_name(sha)):
+        # Backfilled issues carry the hash of the re-encoded file, but the
+        # file is still named after the upload's hash
+        existing = issues.filter(image=original_name(sha)).first()
+    if existing is not None and default_storage.exists(existing.image.name):
+        issue.image = existing.image.name
+        issue.image_variants = existing.image_variants
+
+
+def to_signed(value):
+    """Store an unsigned 64-bit hash in a signed BIGINT column."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def build_variants(data):
+    """Re-encode raw image bytes; return ``(stored_name, variants)`` after storing the files."""
+    digest = hashlib.sha256(data).hexdigest()
+    with Image.open(io.BytesIO(data)) as src:
+        src.seek(0)  # first frame of animated GIF/WebP
+        image = ImageOps.exif_transpose(src)
+        # Converting copies pixels only, dropping EXIF (camera, GPS) and comments
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    original = image.copy()
+    original.thumbnail((MAX_ORIGINAL_SIZE, MAX_ORIGINAL_SIZE), Image.LANCZOS)
+    stored_name = _store(original_name(digest), _encode(original, 'jpeg'))
+    variants = {'width': original.width, 'height': original.height, 'sizes': {}}
+    for width in THUMBNAIL_WIDTHS:
+        thumb = image.copy()
+        if thumb.width > width:
+            thumb.thumbnail((width, width * thumb.height // thumb.width or 1), Image.LANCZOS)
+        variants['sizes'][str(width)] = {
+            fmt: _store(posixpath.join(VARIANT_DIR, '%s-%d.%s' % (digest[:20], width, ext)), _encode(thumb, fmt))
+            for fmt, ext in (('webp', 'webp'), ('jpeg', 'jpg'))
+        }
+    return stored_name, variants
+
+
+def process_issue_image(issue_id):
+    """Re-encode one issue's photo and record its variants. Returns True when done."""
+    issue = Issue.objects.filter(pk=issue_id).only('id', 'image', 'image_variants', 'image_sha256').first()
+    if issue is None or not issue.image:
+        return False
+    old_name = issue.image.name
+    with issue.image.open('rb') as f:
+        data = f.read()
+    fields = {}
+    if not issue.image_sha256:
+        sha, value = fingerprint(io.BytesIO(data))
+        fields = {'image_sha256': sha, 'image_dhash': to_signed(value)}
+    stored_name, variants = build_variants(data)
+    # Only write if the photo wasn't replaced meanwhile
+    updated = Issue.objects.filter(pk=issue_id, image=old_name).update(
+        image=stored_name, image_variants=variants, **fields)
+    if fields and updated:
+        index_photo(issue_id, fields['image_dhash'])
+    shared = Issue.objects.filter(image=old_name).exists()
+    if updated and old_name != stored_name and not shared:
+        # The upload still has its EXIF data; the stripped copy replaces it
+        default_storage.delete(old_name)
+    return bool(updated)
+
+
+def fingerprint_issue(issue_id):
+    """Fingerprint an already processed photo (issues from before fingerprinting).
+
+    The upload was deleted when the photo was re-encoded, so the SHA-256 is
+    that of the re-encoded file and won't equal the hash a new upload of the
+    same photo gets. ``fingerprint_upload`` still finds these by file name.
+    """
+    issue = Issue.objects.filter(pk=issue_id).only('id', 'image').first()
+    if issue is None or not issue.image:
+        return False
+    with issue.image.open('rb') as f:
+        sha, value = fingerprint(f)
+    Issue.objects.filter(pk=issue_id).update(image_sha256=sha, image_dhash=to_signed(value))
+    index_photo(issue_id, to_signed(value))
+    return True
+
+
+def _run(issue_id):
+    close_old_connections()
+    try:
+        process_issue_image(issue_id)
+    except Exception:
+        logger.exception('Processing the photo of issue %s failed', issue_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_processing(issue):
+    """Process the issue's photo in the background once the current transaction commits."""
+    global _executor
+    if not issue.image or issue.image_variants:
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='issue-images')
+    issue_id = issue.pk
+    transaction.on_commit(lambda: _executor.submit(_run, issue_id))
@@ -0,0 +1,32 @@
+"""Compute MinHash signatures and LSH buckets for existing issues."""
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from issues.dedup import index_issue
+from issues.models import Issue
+
+
+class Command(BaseCommand):
+    help = 'Index issues for near-duplicate detection (only unindexed ones unless --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-index issues that already have a signature')
+        parser.add_argument('--batch-size', type=int, default=500, help='Issues indexed per transaction')
+
+    def handle(self, *args, **options):
+        issues = Issue.objects.only('id', 'title', 'description', 'category', 'location_building', 'image_dhash').order_by('id')
+        if not options['all']:
+            issues = issues.filter(minhash__isnull=True)
+        start = time.perf_counter()
+        count = 0
+        last_id = 0
+        while True:
+            batch = list(issues.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                for issue in batch:
+                    index_issue(issue)
+            count += len(batch)
+            last_id = batch[-1].pk
+        self.stdout.write('Indexed %d issues in %.1fs' % (count, time.perf_counter() - start))
@@ -0,0 +1,76 @@
+"""Report duplicate and reused issue photos and the storage they cost."""
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from issues.dedup import find_similar_photos
+from issues.models import Issue
+
+
+def _size(name):
+    try:
+        return default_storage.size(name)
+    except (OSError, NotImplementedError):
+        return 0
+
+
+def _files(name, variants):
+    """Every stored file of one photo: the image and its thumbnails."""
+    names = [name]
+    for formats in (variants or {}).get('sizes', {}).values():
+        names.extend(formats.values())
+    return names
+
+
+class Command(BaseCommand):
+    help = 'Show identical and visually similar issue photos, bytes saved by sharing and bytes still reclaimable'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--merge', action='store_true',
+                            help='Point issues with identical photos at one stored copy and delete the others')
+        parser.add_argument('--limit', type=int, default=20, help='Similar photo pairs to list')
+
+    def handle(self, *args, **options):
+        groups = (Issue.objects.exclude(image_sha256='').values('image_sha256')
+                  .annotate(issues=Count('id')).filter(issues__gt=1))
+        shared_bytes = reclaimable = reclaimed = identical_issues = 0
+        for group in groups.iterator():
+            rows = list(Issue.objects.filter(image_sha256=group['image_sha256'])
+                        .order_by('id').values_list('id', 'image', 'image_variants'))
+            identical_issues += len(rows)
+            by_name = {}
+            for pk, name, variants in rows:
+                by_name.setdefault(name, (variants, []))[1].append(pk)
+            keep_name, (keep_variants, _) = next(iter(by_name.items()))
+            for name, (variants, pks) in by_name.items():
+                size = sum(_size(n) for n in _files(name, variants))
+                # Every issue after the first sharing a file is a copy not stored
+                shared_bytes += size * (len(pks) - 1)
+                if name == keep_name:
+                    continue
+                reclaimable += size
+                if options['merge'] and keep_variants:
+                    Issue.objects.filter(id__in=pks).update(image=keep_name, image_variants=keep_variants)
+                    for stored in set(_files(name, variants)) - set(_files(keep_name, keep_variants)):
+                        default_storage.delete(stored)
+                    reclaimed += size
+
+        self.stdout.write('Identical photos: %d issues in %d groups' % (identical_issues, groups.count()))
+        self.stdout.write('Saved by storing identical uploads once: %.1f MB' % (shared_bytes / 1e6))
+        if options['merge']:
+            self.stdout.write('Reclaimed by merging older copies: %.1f MB' % (reclaimed / 1e6))
+        else:
+            self.stdout.write('Reclaimable with --merge: %.1f MB' % (reclaimable / 1e6))
+
+        # Visually similar but not byte-identical: one index lookup per photo
+        pairs = []
+        hashes = Issue.objects.filter(image_dhash__isnull=False).order_by('id').values_list('id', 'image_sha256', 'image_dhash')
+        sha_by_id = {}
+        for pk, sha, value in hashes.iterator():
+            sha_by_id[pk] = sha
+            for other, distance in find_similar_photos(value, exclude_id=pk):
+                # Only pairs with an earlier issue, so each pair is counted once
+                if other < pk and sha_by_id.get(other) != sha:
+                    pairs.append((distance, other, pk))
+        self.stdout.write('Visually similar photo pairs: %d' % len(pairs))
+        for distance, first, second in sorted(pairs)[:options['limit']]:
+            self.stdout.write('  #%d ~ #%d (%d bits apart)' % (first, second, distance))
@@ -0,0 +1,32 @@
+"""Re-encode issue photos and build their thumbnails."""
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from issues.images import fingerprint_issue, process_issue_image
+from issues.models import Issue
+
+
+class Command(BaseCommand):
+    help = 'Strip EXIF from issue photos, write their WebP/JPEG thumbnails and fingerprint them (only unprocessed ones unless --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Also re-process photos that already have thumbnails')
+
+    def handle(self, *args, **options):
+        issues = Issue.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            issues = issues.filter(Q(image_variants={}) | Q(image_sha256=''))
+        start = time.perf_counter()
+        done = failed = 0
+        rows = issues.order_by('id').values_list('id', 'image_variants').iterator()
+        for issue_id, variants in rows:
+            try:
+                if variants and not options['all']:
+                    # Thumbnails exist; only the fingerprint is missing
+                    done += fingerprint_issue(issue_id)
+                else:
+                    done += process_issue_image(issue_id)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write('Issue %d: %s' % (issue_id, exc))
+        self.stdout.write('Processed %d issue photos (%d failed) in %.1fs' % (done, failed, time.perf_counter() - start))
@@ -0,0 +1,15 @@
+"""Rebuild the full-text search index over issues."""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from issues.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Repopulate and optimize the FTS5 issue search index from the issues table'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError('Full-text issue search needs SQLite (FTS5); other databases search without an index')
+        start = time.perf_counter()
+        count = rebuild_index()
+        self.stdout.write('Indexed %d issues in %.1fs' % (count, time.perf_counter() - start))
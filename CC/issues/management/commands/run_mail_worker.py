@@ -0,0 +1,32 @@
+"""Send queued issue emails from the outbox."""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from issues.outbox import deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Drain the email outbox in batches over one SMTP connection, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'MAIL_OUTBOX_BATCH_SIZE', 50),
+                            help='Emails sent per connection')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Send everything that is due, then exit')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = deliver_batch(options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write('Sent %d emails, %d failed' % (sent, failed))
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Sent %d emails in total, %d failed attempts' % (total_sent, total_failed))
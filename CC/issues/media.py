@@ -0,0 +1,137 @@
+"""Serving permission-checked media files.
+
+Views decide who may see a file, then ``serve_media`` sends it. With
+``MEDIA_SENDFILE = 'nginx'`` the response only carries an ``X-Accel-Redirect``
+to an internal location (``MEDIA_ACCEL_PREFIX``) and nginx streams the bytes;
+``'apache'`` does the same with ``X-Sendfile`` (mod_xsendfile). Otherwise the
+file is served by Django with ``FileResponse``, which the WSGI server can send
+with zero-copy ``sendfile``, plus single-range ``Range`` support.
+
+Content-hashed names (see ``issues.images``) never change their bytes, so
+they get a strong ETag from the name. The URL of a photo stays the same when
+the file behind it is replaced, so links carry the digest as ``?v=`` (see
+``Issue.photo_url``) and only a request whose ``v`` matches the current file
+gets a year-long ``immutable`` lifetime; everything else is revalidated on
+every use.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import quote_etag
+
+# <20 hex digest>[-<width>].<ext>, as written by issues.images
+_HASHED_NAME_RE = re.compile(r'^[0-9a-f]{20}(-\d+)?\.[a-z]+$')
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+CHUNK_SIZE = 64 * 1024
+
+
+def is_content_hashed(name):
+    return bool(_HASHED_NAME_RE.match(posixpath.basename(name)))
+
+
+def content_digest(name):
+    """The digest in a content-hashed file name, '' for other names."""
+    return posixpath.basename(name)[:20] if is_content_hashed(name) else ''
+
+
+def _etag(name, stat):
+    if is_content_hashed(name):
+        return quote_etag(posixpath.basename(name).split('.')[0])
+    return quote_etag('%x-%x' % (int(stat.st_mtime), stat.st_size))
+
+
+def _etag_matches(header, etag):
+    return header.strip() == '*' or etag in [t.strip() for t in header.split(',')]
+
+
+def _parse_range(header, size):
+    """``(start, end)`` inclusive for a single satisfiable byte range, None to send everything, or False."""
+    match = _RANGE_RE.match(header.strip())
+    if not match or size == 0:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(f, start, length):
+    f.seek(start)
+    try:
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def serve_media(request, name, version=None):
+    """Send the file ``name`` (relative to ``MEDIA_ROOT``) after the caller checked access.
+
+    ``version`` is the digest the link was built with; the response is only
+    cacheable forever when it is that of ``name``.
+    """
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        raise Http404('File not found')
+    stat = os.stat(path)
+    etag = _etag(name, stat)
+    if version and version == content_digest(name):
+        cache_control = 'private, max-age=%d, immutable' % IMMUTABLE_MAX_AGE
+    else:
+        cache_control = 'private, no-cache'
+
+    if _etag_matches(request.headers.get('If-None-Match', ''), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    mode = getattr(settings, 'MEDIA_SENDFILE', '')
+    if mode in ('nginx', 'apache'):
+        # The proxy handles Range and conditional requests from here on
+        response = HttpResponse(content_type=content_type)
+        if mode == 'nginx':
+            prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + name.lstrip('/')
+        else:
+            response['X-Sendfile'] = path
+    else:
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if 'Range' in request.headers and (if_range is None or if_range.strip() == etag):
+            byte_range = _parse_range(request.headers['Range'], stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % stat.st_size
+            return response
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(_read_range(open(path, 'rb'), start, length),
+                                             status=206, content_type=content_type)
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, stat.st_size)
+            response['Content-Length'] = str(length)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
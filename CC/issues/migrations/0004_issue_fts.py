@@ -0,0 +1,16 @@
+# Generated by Django 4.2
+
+from django.db import migrations
+from issues.fts import migration_drop, migration_install
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issues', '0003_issue_access_path_indexes'),
+    ]
+
+    operations = [
+        # FTS5 is SQLite-only; other databases use the icontains fallback in issues.search
+        migrations.RunPython(migration_install, migration_drop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issues', '0004_issue_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='issues.issue'),
+        ),
+        migrations.AddField(
+            model_name='issue',
+            name='minhash',
+            field=models.BinaryField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='IssueLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('issue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='issues.issue')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key'], name='issue_lsh_key_idx')],
+            },
+        ),
+    ]
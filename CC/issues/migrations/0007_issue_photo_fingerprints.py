@@ -0,0 +1,35 @@
+# Generated by Django 4.2
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issues', '0006_issue_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='image_sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='issue',
+            name='image_dhash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='PhotoHashBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.IntegerField()),
+                ('issue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='photo_hash_blocks', to='issues.issue')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key'], name='photo_hash_key_idx')],
+            },
+        ),
+    ]
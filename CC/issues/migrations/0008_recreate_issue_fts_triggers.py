@@ -0,0 +1,17 @@
+# Generated by Django 4.2
+
+from django.db import migrations
+from issues.fts import migration_install
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issues', '0007_issue_photo_fingerprints'),
+    ]
+
+    operations = [
+        # 0006 and 0007 rebuild issues_issue on SQLite, which drops the FTS sync
+        # triggers; put them back and re-index rows written in between
+        migrations.RunPython(migration_install, migrations.RunPython.noop),
+    ]
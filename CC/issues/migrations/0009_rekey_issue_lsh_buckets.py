@@ -0,0 +1,21 @@
+# Generated by Django 4.2
+
+from django.db import migrations
+
+
+def clear_buckets(apps, schema_editor):
+    # Bucket keys now include category and building and use wider bands; clearing
+    # the signatures makes index_issue_duplicates rebuild every issue's buckets
+    apps.get_model('issues', 'IssueLSHBucket').objects.all().delete()
+    apps.get_model('issues', 'Issue').objects.update(minhash=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issues', '0008_recreate_issue_fts_triggers'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_buckets, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,18 @@
 from django.db import models
 from django.conf import settings
+from django.urls import reverse
 from django.utils import timezone
+from .media import content_digest
+
+
+class IssueQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Issues a user may list: all for admins, own or unassigned for staff, own for students."""
+        if user.role == 'admin':
+            return self
+        if user.role == 'maintenance':
+            return self.filter(models.Q(assigned_to=user) | models.Q(assigned_to__isnull=True))
+        return self.filter(reported_by=user)
 
 
 class Issue(models.Model):
@@ -30,6 +42,11 @@ class Issue(models.Model):
     priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='medium')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     image = models.ImageField(upload_to='issue_images/', blank=True, null=True)
+    # Re-encoded thumbnails of ``image`` written by issues.images: {'width', 'height', 'sizes': {width: {fmt: name}}}
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Photo fingerprints: SHA-256 of the uploaded bytes and a 64-bit dHash (signed)
+    image_sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    image_dhash = models.BigIntegerField(null=True, blank=True, editable=False)
     location_building = models.CharField(max_length=100, blank=True)
     location_room = models.CharField(max_length=50, blank=True)
     reported_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reported_issues')
@@ -38,13 +55,64 @@ class Issue(models.Model):
     resolved_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates')
+    # MinHash of title + description for near-duplicate lookups (see issues.dedup)
+    minhash = models.BinaryField(null=True, editable=False)
+
+    objects = IssueQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        # One index per list/count path: admin list and monthly trend, per-role
+        # lists (students by reporter, staff by assignee incl. unassigned),
+        # status counts and the category/priority filters, all newest first
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='issue_created_idx'),
+            models.Index(fields=['reported_by', '-created_at', '-id'], name='issue_reporter_created_idx'),
+            models.Index(fields=['reported_by', 'status'], name='issue_reporter_status_idx'),
+            models.Index(fields=['assigned_to', '-created_at', '-id'], name='issue_assignee_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='issue_status_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='issue_category_created_idx'),
+            models.Index(fields=['priority', '-created_at', '-id'], name='issue_priority_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def photo_url(self, width=None, fmt=None):
+        """URL of the photo (or one thumbnail) carrying the stored file's digest.
+
+        The digest changes whenever the file does, so browsers never keep a
+        replaced photo; unprocessed uploads have none and are revalidated.
+        """
+        if width is None:
+            url, name = reverse('issues:issue_photo', args=[self.pk]), self.image.name
+        else:
+            url = reverse('issues:issue_photo_variant', args=[self.pk, int(width), fmt])
+            name = self.image_variants['sizes'][str(width)][fmt]
+        digest = content_digest(name)
+        return '%s?v=%s' % (url, digest) if digest else url
+
+    def image_srcset(self, fmt):
+        """``srcset`` value listing every thumbnail of the photo in ``fmt``."""
+        sizes = self.image_variants.get('sizes', {})
+        return ', '.join(
+            '%s %sw' % (self.photo_url(width, fmt), width)
+            for width in sorted(sizes, key=int) if fmt in sizes[width]
+        )
+
+    @property
+    def image_url(self):
+        return self.photo_url()
+
+    @property
+    def webp_srcset(self):
+        return self.image_srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self.image_srcset('jpeg')
+
     @property
     def resolution_time(self):
         """Auto-calculated duration from creation to resolution."""
@@ -65,3 +133,57 @@ class IssueHistory(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Issue histories'
+        indexes = [
+            models.Index(fields=['issue', '-created_at'], name='issuehist_issue_created_idx'),
+        ]
+
+
+class IssueLSHBucket(models.Model):
+    """One LSH band of an issue's MinHash; issues sharing a key are duplicate candidates."""
+    issue = models.ForeignKey(Issue, on_delete=models.CASCADE, related_name='lsh_buckets')
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key'], name='issue_lsh_key_idx'),
+        ]
+
+
+class PhotoHashBlock(models.Model):
+    """One block of an issue photo's dHash; photos sharing a key are similar-photo candidates."""
+    issue = models.ForeignKey(Issue, on_delete=models.CASCADE, related_name='photo_hash_blocks')
+    key = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key'], name='photo_hash_key_idx'),
+        ]
+
+
+class OutboxEmail(models.Model):
+    """Email queued in the same transaction as the change it reports; sent by run_mail_worker."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {self.to}'
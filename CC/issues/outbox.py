@@ -0,0 +1,82 @@
+"""Delivery of queued ``OutboxEmail`` rows.
+
+``deliver_batch`` claims up to ``MAIL_OUTBOX_BATCH_SIZE`` due emails by pushing
+their ``next_attempt_at`` a lease into the future, then sends them over one
+reused SMTP connection. A failed email is retried with exponential backoff and
+marked ``failed`` after ``MAIL_OUTBOX_MAX_ATTEMPTS`` tries. Delivery is
+at-least-once: a worker killed mid-batch leaves its claimed rows to be sent
+again once the lease runs out.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 300
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next try after ``attempts`` failures."""
+    base = getattr(settings, 'MAIL_OUTBOX_BACKOFF', 30)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'MAIL_OUTBOX_MAX_BACKOFF', 3600))
+
+
+def claim_batch(batch_size):
+    """Lease the oldest due pending emails to this worker and return them."""
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=LEASE_SECONDS)
+    with transaction.atomic():
+        ids = list(
+            OutboxEmail.objects.filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        # Only rows still due are ours; another worker may have leased some meanwhile
+        OutboxEmail.objects.filter(id__in=ids, status='pending', next_attempt_at__lte=now).update(
+            next_attempt_at=lease_until)
+    return list(OutboxEmail.objects.filter(id__in=ids, status='pending', next_attempt_at=lease_until).order_by('id'))
+
+
+def _record_failure(email, exc):
+    email.attempts += 1
+    email.last_error = '%s: %s' % (type(exc).__name__, exc)
+    if email.attempts >= getattr(settings, 'MAIL_OUTBOX_MAX_ATTEMPTS', 8):
+        email.status = 'failed'
+        logger.error('Giving up on outbox email %s after %d attempts: %s', email.id, email.attempts, email.last_error)
+    else:
+        email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(email.attempts))
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def deliver_batch(batch_size=None, connection=None):
+    """Send one batch of due emails; return ``(sent, failed)`` counts."""
+    batch = claim_batch(batch_size or getattr(settings, 'MAIL_OUTBOX_BATCH_SIZE', 50))
+    if not batch:
+        return 0, 0
+    connection = connection or get_connection(fail_silently=False)
+    sent_ids = []
+    failed = 0
+    try:
+        for email in batch:
+            message = EmailMessage(email.subject, email.body, email.from_email, [email.to], connection=connection)
+            try:
+                # open() is a no-op while the connection is up and reconnects after an error
+                connection.open()
+                connection.send_messages([message])
+            except Exception as exc:
+                failed += 1
+                _record_failure(email, exc)
+                connection.close()
+            else:
+                sent_ids.append(email.id)
+    finally:
+        connection.close()
+        if sent_ids:
+            OutboxEmail.objects.filter(id__in=sent_ids).update(status='sent', sent_at=timezone.now(), last_error='')
+    return len(sent_ids), failed
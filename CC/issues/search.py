@@ -0,0 +1,96 @@
+"""Ranked full-text search over issues.
+
+On SQLite the ``issues_issue_fts`` FTS5 table (see ``issues.fts``) indexes
+each issue's title, description, location and resolution notes, and triggers
+keep it in step with ``issues_issue``. Matches are ranked with bm25, weighting
+the title highest, and come with a highlighted description snippet. Other
+databases fall back to ``icontains`` filters without ranking or snippets.
+"""
+import re
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from .fts import FTS_TABLE, install_triggers
+
+# bm25 weights for title, description, location_building, location_room, resolution_notes
+BM25_WEIGHTS = (10.0, 1.0, 2.0, 2.0, 1.0)
+SNIPPET_TOKENS = 16
+# Control characters never typed into a form; swapped for <mark> after escaping
+_HL_START, _HL_END = '\x02', '\x03'
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def to_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix."""
+    tokens = _TOKEN_RE.findall(text)
+    if not tokens:
+        return ''
+    terms = ['"%s"' % t for t in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _highlight(snippet):
+    html = escape(snippet).replace(_HL_START, '<mark>').replace(_HL_END, '</mark>')
+    return mark_safe(html)
+
+
+def search_issues(queryset, text, page=1, page_size=25):
+    """Return ``(issues, has_next)`` for one page of ``queryset`` matching ``text``.
+
+    ``queryset`` carries the caller's visibility and filters; on SQLite each
+    returned issue has ``search_snippet`` set to highlighted HTML.
+    """
+    offset = (page - 1) * page_size
+    if not fts_available():
+        from django.db.models import Q
+        q = Q()
+        for token in _TOKEN_RE.findall(text):
+            q &= (Q(title__icontains=token) | Q(description__icontains=token)
+                  | Q(location_building__icontains=token) | Q(location_room__icontains=token)
+                  | Q(resolution_notes__icontains=token))
+        rows = list(queryset.filter(q).order_by('-created_at', '-id')[offset:offset + page_size + 1])
+        return rows[:page_size], len(rows) > page_size
+
+    match = to_match_query(text)
+    if not match:
+        return [], False
+    sql = (
+        'SELECT rowid, snippet({t}, 1, %s, %s, %s, {n}) FROM {t} WHERE {t} MATCH %s'
+        .format(t=FTS_TABLE, n=SNIPPET_TOKENS)
+    )
+    params = [_HL_START, _HL_END, '…', match]
+    if queryset.query.where:
+        # Restrict to rows the caller may see; skipped when unfiltered (admins)
+        ids_sql, ids_params = queryset.order_by().values('id').query.sql_with_params()
+        sql += ' AND rowid IN (%s)' % ids_sql
+        params += list(ids_params)
+    sql += ' ORDER BY bm25({t}, {w}) LIMIT %s OFFSET %s'.format(
+        t=FTS_TABLE, w=', '.join(str(w) for w in BM25_WEIGHTS))
+    params += [page_size + 1, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        hits = cursor.fetchall()
+    has_next = len(hits) > page_size
+    hits = hits[:page_size]
+    by_id = queryset.in_bulk([pk for pk, _ in hits])
+    issues = []
+    for pk, snippet in hits:
+        issue = by_id.get(pk)
+        if issue is not None:
+            issue.search_snippet = _highlight(snippet)
+            issues.append(issue)
+    return issues, has_next
+
+
+def rebuild_index():
+    """Recreate missing sync triggers, repopulate the FTS table from ``issues_issue`` and return the row count."""
+    install_triggers(connection)
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO {t}({t}) VALUES ('optimize')".format(t=FTS_TABLE))
+        cursor.execute('SELECT COUNT(*) FROM issues_issue')
+        return cursor.fetchone()[0]
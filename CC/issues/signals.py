@@ -0,0 +1,20 @@
+import logging
+from django.db import connections
+from .fts import install_triggers, missing_triggers
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_fts_triggers(sender, using='default', **kwargs):
+    """Reinstall FTS sync triggers a migration dropped and re-index the issues.
+
+    A migration that rebuilds ``issues_issue`` on SQLite without calling
+    ``issues.fts.install_triggers`` would otherwise leave search silently stale.
+    """
+    connection = connections[using]
+    if 'issues_issue' not in connection.introspection.table_names():
+        return
+    missing = missing_triggers(connection)
+    if missing:
+        logger.warning('Recreating dropped issue search triggers: %s', ', '.join(missing))
+        install_triggers(connection)
@@ -0,0 +1,488 @@
+import hashlib
+import io
+import random
+import shutil
+import socketserver
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+from django.apps import apps
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from accounts.models import User
+from .bulk import bulk_assign, bulk_set_status
+from .dedup import band_keys, bucket_scope, index_issue, lsh_candidates, minhash
+from .fts import missing_triggers
+from .images import fingerprint_issue, fingerprint_upload, process_issue_image
+from .models import Issue, IssueHistory, IssueLSHBucket, OutboxEmail
+from .outbox import deliver_batch, retry_delay
+from .search import search_issues
+from .signals import ensure_fts_triggers
+
+
+def make_issue(user, **fields):
+    fields.setdefault('title', 'Broken projector')
+    fields.setdefault('description', 'The projector in the lecture hall does not turn on.')
+    fields.setdefault('category', 'classroom_equipment')
+    return Issue.objects.create(reported_by=user, **fields)
+
+
+class IssueSearchTriggerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', 'student@example.com', 'pw', role='student')
+
+    def test_triggers_survive_migrations(self):
+        self.assertEqual(missing_triggers(connection), [])
+
+    def test_new_and_edited_issues_are_searchable(self):
+        issue = make_issue(self.student, title='Leaking radiator')
+        self.assertEqual(search_issues(Issue.objects.all(), 'radiator')[0], [issue])
+        issue.title = 'Leaking sink'
+        issue.save()
+        self.assertEqual(search_issues(Issue.objects.all(), 'radiator')[0], [])
+        self.assertEqual(search_issues(Issue.objects.all(), 'sink')[0], [issue])
+
+    def test_post_migrate_restores_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER issues_issue_fts_ai')
+        issue = make_issue(self.student, title='Flickering lights')
+        self.assertEqual(search_issues(Issue.objects.all(), 'flickering')[0], [])
+
+        with self.assertLogs('issues.signals', 'WARNING'):
+            ensure_fts_triggers(sender=apps.get_app_config('issues'), using='default')
+        self.assertEqual(missing_triggers(connection), [])
+        self.assertEqual(search_issues(Issue.objects.all(), 'flickering')[0], [issue])
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server.smtp
+        server.connection_opened()
+        self.reply('220 fake.smtp ready')
+        for raw in self.rfile:
+            command = raw.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 fake.smtp')
+            elif verb == 'RCPT':
+                rejected = any(address in command for address in server.reject)
+                self.reply('550 mailbox unavailable' if rejected else '250 OK')
+            elif verb == 'DATA':
+                self.reply('354 go ahead')
+                lines = []
+                for line in self.rfile:
+                    if line.rstrip(b'\r\n') == b'.':
+                        break
+                    lines.append(line)
+                server.received.append(b''.join(lines))
+                self.reply('250 queued')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class FakeSMTPServer:
+    """Minimal local SMTP server: counts connections, keeps messages, refuses ``reject`` recipients."""
+
+    def __init__(self, reject=()):
+        self.reject = tuple(reject)
+        self.connections = 0
+        self.received = []
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPHandler)
+        self._server.daemon_threads = True
+        self._server.smtp = self
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def smtp_settings(server):
+    return override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1',
+        EMAIL_PORT=server.port, EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', EMAIL_TIMEOUT=5,
+    )
+
+
+class OutboxTransactionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', 'student@example.com', 'pw', role='student')
+
+    def submit(self):
+        self.client.force_login(self.student)
+        return self.client.post(reverse('issues:issue_create'), {
+            'title': 'Broken window', 'description': 'The window in room 12 is cracked.',
+            'category': 'other', 'priority': 'medium', 'location_building': 'Main', 'location_room': '12',
+        })
+
+    def test_email_is_queued_with_the_issue(self):
+        self.submit()
+        issue = Issue.objects.get()
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.to, email.status), ('student@example.com', 'pending'))
+        self.assertIn(issue.title, email.subject)
+
+    def test_email_is_rolled_back_with_the_issue(self):
+        # Fails after the email was queued, inside the same transaction
+        with mock.patch('issues.views.index_issue', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.submit()
+        self.assertFalse(Issue.objects.exists())
+        self.assertFalse(OutboxEmail.objects.exists())
+
+
+@override_settings(MAIL_OUTBOX_BACKOFF=30, MAIL_OUTBOX_MAX_BACKOFF=3600, MAIL_OUTBOX_MAX_ATTEMPTS=3)
+class OutboxDeliveryTests(TestCase):
+    def queue(self, *recipients):
+        return [OutboxEmail.objects.create(subject='Hello', body='Body', from_email='noreply@example.com', to=to)
+                for to in recipients]
+
+    def test_batch_uses_one_connection(self):
+        self.queue(*['user%d@example.com' % i for i in range(5)])
+        with FakeSMTPServer() as smtp, smtp_settings(smtp):
+            self.assertEqual(deliver_batch(batch_size=10), (5, 0))
+        self.assertEqual(smtp.connections, 1)
+        self.assertEqual(len(smtp.received), 5)
+        self.assertEqual(OutboxEmail.objects.filter(status='sent', sent_at__isnull=False).count(), 5)
+
+    def test_batch_size_limits_one_round(self):
+        self.queue(*['user%d@example.com' % i for i in range(3)])
+        with FakeSMTPServer() as smtp, smtp_settings(smtp):
+            self.assertEqual(deliver_batch(batch_size=2), (2, 0))
+            self.assertEqual(deliver_batch(batch_size=2), (1, 0))
+            self.assertEqual(deliver_batch(batch_size=2), (0, 0))
+        self.assertEqual(smtp.connections, 2)
+
+    def test_failures_back_off_then_fail(self):
+        bad, good = self.queue('bounce@example.com', 'ok@example.com')
+        with FakeSMTPServer(reject=['bounce@example.com']) as smtp, smtp_settings(smtp), \
+                self.assertLogs('issues.outbox', 'ERROR'):
+            for attempt in (1, 2, 3):
+                before = timezone.now()
+                self.assertEqual(deliver_batch(batch_size=10), (0 if attempt > 1 else 1, 1))
+                bad.refresh_from_db()
+                self.assertEqual(bad.attempts, attempt)
+                self.assertIn('SMTPRecipientsRefused', bad.last_error)
+                if attempt < 3:
+                    self.assertEqual(bad.status, 'pending')
+                    delay = (bad.next_attempt_at - before).total_seconds()
+                    self.assertAlmostEqual(delay, retry_delay(attempt), delta=2)
+                    # Not due yet: nothing is sent until the backoff has passed
+                    self.assertEqual(deliver_batch(batch_size=10), (0, 0))
+                    OutboxEmail.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        bad.refresh_from_db()
+        good.refresh_from_db()
+        self.assertEqual(bad.status, 'failed')
+        self.assertEqual(good.status, 'sent')
+        self.assertEqual([retry_delay(n) for n in (1, 2, 3)], [30, 60, 120])
+
+
+class IssueListQueryTests(TestCase):
+    """The list costs the same number of queries on every page, for every role."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            'admin': User.objects.create_user('admin', 'admin@example.com', 'pw', role='admin'),
+            'maintenance': User.objects.create_user('staff', 'staff@example.com', 'pw', role='maintenance'),
+            'student': User.objects.create_user('student', 'student@example.com', 'pw', role='student'),
+        }
+        staff = cls.users['maintenance']
+        Issue.objects.bulk_create([
+            Issue(title='Issue %d' % i, description='Description %d' % i, category='other',
+                  reported_by=cls.users['student'], assigned_to=staff if i % 2 else None)
+            for i in range(80)
+        ])
+
+    def assert_pages(self, role, queries):
+        self.client.force_login(self.users[role])
+        url = reverse('issues:issue_list')
+        self.client.get(url)  # Warm the session and per-process caches
+        with self.assertNumQueries(queries):
+            first = self.client.get(url)
+        self.assertEqual(len(first.context['issues']), 25)
+        with self.assertNumQueries(queries):
+            second = self.client.get(url, {'before': first.context['older_cursor']})
+        self.assertEqual(len(second.context['issues']), 25)
+        self.assertLess(second.context['issues'][0].pk, first.context['issues'][-1].pk)
+
+    def test_admin(self):
+        self.assert_pages('admin', 4)
+
+    def test_maintenance(self):
+        self.assert_pages('maintenance', 3)
+
+    def test_student(self):
+        self.assert_pages('student', 3)
+
+
+class BulkUpdateLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', role='admin')
+        cls.student = User.objects.create_user('student', 'student@example.com', 'pw', role='student')
+        for i in range(5):
+            make_issue(cls.student, title='Issue %d' % i)
+
+    def post_status(self, **data):
+        self.client.force_login(self.admin)
+        data = dict({'action': 'status', 'status': 'in_progress', 'scope': 'filter'}, **data)
+        return self.client.post(reverse('issues:issue_bulk_update'), data, follow=True)
+
+    def test_selection_over_the_limit_is_rejected(self):
+        with mock.patch('issues.bulk.MAX_BULK_ISSUES', 3):
+            response = self.post_status()
+        self.assertContains(response, '5 issues match; bulk actions are limited to 3 at a time.')
+        self.assertFalse(Issue.objects.exclude(status='pending').exists())
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_selection_within_the_limit_is_applied(self):
+        with mock.patch('issues.bulk.MAX_BULK_ISSUES', 5):
+            response = self.post_status()
+        self.assertContains(response, 'Updated 5 issues.')
+        self.assertEqual(Issue.objects.filter(status='in_progress').count(), 5)
+
+
+class BulkQueryCountTests(TestCase):
+    """Bulk actions cost the same number of queries however many issues are selected."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', role='admin')
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', role='maintenance')
+        reporters = [User.objects.create_user('student%d' % i, 's%d@example.com' % i, 'pw', role='student')
+                     for i in range(3)]
+        for i in range(55):
+            make_issue(reporters[i % 3], title='Issue %d' % i)
+        cls.small = Issue.objects.order_by('id')[:5].values('id')
+        cls.large = Issue.objects.order_by('id')[5:].values('id')
+
+    def test_set_status(self):
+        for selection, count in ((self.small, 5), (self.large, 50)):
+            with self.subTest(count=count), self.assertNumQueries(7):
+                changed = bulk_set_status(Issue.objects.filter(id__in=selection), 'in_progress', self.admin)
+            self.assertEqual(changed, count)
+
+    def test_assign(self):
+        for selection, count in ((self.small, 5), (self.large, 50)):
+            with self.subTest(count=count), self.assertNumQueries(6):
+                changed = bulk_assign(Issue.objects.filter(id__in=selection), self.staff)
+            self.assertEqual(changed, count)
+
+
+def photo_bytes(color=(200, 30, 30)):
+    buf = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def use_temp_media(test):
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media, ignore_errors=True)
+    settings = override_settings(MEDIA_ROOT=media)
+    settings.enable()
+    test.addCleanup(settings.disable)
+
+
+def upload_photo(user, data):
+    issue = Issue(reported_by=user, title='Broken window', description='Cracked glass.',
+                  category='classroom_equipment', image=SimpleUploadedFile('photo.png', data))
+    fingerprint_upload(issue)
+    issue.save()
+    return issue
+
+
+class PhotoFingerprintTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', 'student@example.com', 'pw', role='student')
+
+    def setUp(self):
+        use_temp_media(self)
+
+    def upload(self, data):
+        return upload_photo(self.student, data)
+
+    def test_upload_and_processing_hash_the_uploaded_bytes(self):
+        data = photo_bytes()
+        issue = self.upload(data)
+        self.assertEqual(issue.image_sha256, hashlib.sha256(data).hexdigest())
+        Issue.objects.filter(pk=issue.pk).update(image_sha256='')
+        self.assertTrue(process_issue_image(issue.pk))
+        issue.refresh_from_db()
+        self.assertEqual(issue.image_sha256, hashlib.sha256(data).hexdigest())
+
+    def test_upload_reuses_backfilled_photo(self):
+        data = photo_bytes()
+        first = self.upload(data)
+        process_issue_image(first.pk)
+        Issue.objects.filter(pk=first.pk).update(image_sha256='', image_dhash=None)
+        self.assertTrue(fingerprint_issue(first.pk))
+        first.refresh_from_db()
+        # Backfilled from the re-encoded file, the original is gone
+        self.assertNotEqual(first.image_sha256, hashlib.sha256(data).hexdigest())
+
+        second = self.upload(data)
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(second.image_variants, first.image_variants)
+        self.assertEqual(second.image_sha256, hashlib.sha256(data).hexdigest())
+
+
+class PhotoCachingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', 'student@example.com', 'pw', role='student')
+
+    def setUp(self):
+        use_temp_media(self)
+        self.client.force_login(self.student)
+
+    def fetch(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        b''.join(response.streaming_content)
+        return response
+
+    def test_replaced_photo_gets_new_url_and_old_url_is_revalidated(self):
+        issue = upload_photo(self.student, photo_bytes())
+        process_issue_image(issue.pk)
+        issue.refresh_from_db()
+        old_url, old_thumb = issue.image_url, issue.photo_url(320, 'webp')
+        self.assertIn('?v=', old_url)
+        self.assertIn('?v=', old_thumb)
+        self.assertIn(old_thumb, issue.webp_srcset)
+        self.assertIn('immutable', self.fetch(old_url)['Cache-Control'])
+        self.assertIn('immutable', self.fetch(old_thumb)['Cache-Control'])
+        # The bare URL doesn't name a version, so it can't be cached forever
+        self.assertEqual(self.fetch(reverse('issues:issue_photo', args=[issue.pk]))['Cache-Control'],
+                         'private, no-cache')
+        old_etag = self.fetch(old_url)['ETag']
+
+        issue.image = SimpleUploadedFile('new.png', photo_bytes((30, 30, 200)))
+        issue.image_variants = {}
+        issue.save()
+        process_issue_image(issue.pk)
+        issue.refresh_from_db()
+        self.assertNotEqual(issue.image_url, old_url)
+        self.assertNotEqual(issue.photo_url(320, 'webp'), old_thumb)
+
+        stale = self.fetch(old_url)
+        self.assertEqual(stale['Cache-Control'], 'private, no-cache')
+        self.assertNotEqual(stale['ETag'], old_etag)
+        self.assertEqual(self.fetch(old_thumb)['Cache-Control'], 'private, no-cache')
+        self.assertIn('immutable', self.fetch(issue.image_url)['Cache-Control'])
+
+
+class IndexDuplicatesCommandTests(TestCase):
+    def test_issues_are_loaded_once(self):
+        student = User.objects.create_user('student', 'student@example.com', 'pw', role='student')
+        for i in range(3):
+            make_issue(student, title='Issue %d' % i, image_dhash=i)
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('index_issue_duplicates', '--all', stdout=io.StringIO())
+        selects = [q['sql'] for q in ctx.captured_queries
+                   if q['sql'].startswith('SELECT') and 'FROM "issues_issue"' in q['sql']]
+        # One batch and the empty read that ends the loop; no deferred field loads
+        self.assertEqual(len(selects), 2, selects)
+
+
+class LinkDuplicateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', 'student@example.com', 'pw', role='student')
+        other = User.objects.create_user('other', 'other@example.com', 'pw', role='student')
+        cls.original = make_issue(other, title='Projector broken in room 101', location_building='Main')
+        cls.elsewhere = make_issue(other, title='Projector broken in room 101', location_building='Library')
+        cls.unrelated = make_issue(other, title='Secret exam schedule leak',
+                                   description='Private note about the exam papers.', location_building='Main')
+        cls.issue = make_issue(cls.student, title='Projector broken in room 101', location_building='main')
+        for issue in (cls.original, cls.elsewhere, cls.unrelated, cls.issue):
+            index_issue(issue)
+
+    def link(self, target):
+        self.client.force_login(self.student)
+        self.client.post(reverse('issues:issue_link_duplicate', args=[self.issue.pk]), {'duplicate_of': target.pk})
+        self.issue.refresh_from_db()
+        return self.issue.duplicate_of_id
+
+    def test_only_suggested_issues_in_the_same_building_can_be_linked(self):
+        self.assertIsNone(self.link(self.unrelated))
+        self.assertIsNone(self.link(self.elsewhere))
+        self.assertEqual(self.link(self.original), self.original.pk)
+
+    def test_linked_title_is_not_shown_to_the_reporter(self):
+        self.link(self.original)
+        note = IssueHistory.objects.get(issue=self.issue).notes
+        self.assertEqual(note, 'Linked as a duplicate of #%d' % self.original.pk)
+        response = self.client.get(reverse('issues:issue_detail', args=[self.issue.pk]))
+        self.assertContains(response, 'Duplicate of:</strong> #%d</p>' % self.original.pk, html=False)
+
+
+class LSHCandidateTests(TestCase):
+    ITEMS = ('projector', 'fan', 'light', 'wifi', 'tap', 'door lock', 'window', 'socket', 'router', 'whiteboard')
+    PROBLEMS = ('not working', 'broken', 'making noise', 'leaking', 'very slow', 'damaged')
+    PLACES = ('room', 'hostel block', 'lab', 'library floor', 'lecture hall')
+    BUILDINGS = ('Main', 'Library', 'Hostel A', 'Hostel B', 'Science')
+    CATEGORIES = ('electrical', 'network', 'plumbing', 'classroom_equipment')
+
+    @classmethod
+    def setUpTestData(cls):
+        student = User.objects.create_user('student', 'student@example.com', 'pw', role='student')
+        rng = random.Random(7)
+        issues = []
+        for _ in range(1000):
+            item, problem, place = rng.choice(cls.ITEMS), rng.choice(cls.PROBLEMS), rng.choice(cls.PLACES)
+            number = rng.randint(1, 300)
+            issues.append(Issue(
+                reported_by=student, category=rng.choice(cls.CATEGORIES),
+                location_building=rng.choice(cls.BUILDINGS),
+                title='%s %s in %s %d' % (item.title(), problem, place, number),
+                description='The %s in the %s %d is %s. Please fix it soon.' % (item, place, number, problem),
+            ))
+        cls.corpus = Issue.objects.bulk_create(issues)
+        buckets = []
+        for issue in cls.corpus:
+            signature = minhash('%s %s' % (issue.title, issue.description))
+            buckets.extend(IssueLSHBucket(issue_id=issue.pk, key=k)
+                           for k in band_keys(signature, bucket_scope(issue)))
+        IssueLSHBucket.objects.bulk_create(buckets)
+
+    def test_lookup_reads_few_candidates(self):
+        for issue in self.corpus[::50]:
+            probe = Issue(category=issue.category, location_building=' %s ' % issue.location_building.upper(),
+                          title=issue.title, description=issue.description)
+            candidates = lsh_candidates(probe, minhash('%s %s' % (probe.title, probe.description)))
+            self.assertIn(issue.pk, candidates)
+            # Shared template wording makes a good part of the same category and
+            # building candidates, but nothing outside it
+            elsewhere = Issue.objects.filter(id__in=candidates).exclude(
+                category=issue.category, location_building=issue.location_building)
+            self.assertFalse(elsewhere.exists())
+            self.assertLess(len(candidates), len(self.corpus) // 20)
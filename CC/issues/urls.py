@@ -6,7 +6,11 @@ app_name = 'issues'
 urlpatterns = [
     path('', views.issue_list, name='issue_list'),
     path('create/', views.issue_create, name='issue_create'),
+    path('bulk/', views.issue_bulk_update, name='issue_bulk_update'),
     path('<int:pk>/', views.issue_detail, name='issue_detail'),
     path('<int:pk>/assign/', views.issue_assign, name='issue_assign'),
     path('<int:pk>/update-status/', views.issue_update_status, name='issue_update_status'),
+    path('<int:pk>/photo/', views.issue_photo, name='issue_photo'),
+    path('<int:pk>/photo/<int:width>.<str:fmt>', views.issue_photo, name='issue_photo_variant'),
+    path('<int:pk>/link-duplicate/', views.issue_link_duplicate, name='issue_link_duplicate'),
 ]
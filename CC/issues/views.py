@@ -1,10 +1,20 @@
+import base64
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.http import require_http_methods
 from .models import Issue, IssueHistory
-from .forms import IssueForm, IssueAssignForm, IssueStatusForm
+from .dedup import OPEN_STATUSES, find_duplicates, index_issue
+from .bulk import BulkLimitExceeded, bulk_assign, bulk_set_status
+from .forms import IssueForm, IssueAssignForm, IssueStatusForm, IssueBulkForm
+from .images import fingerprint_upload, schedule_processing
+from .media import serve_media
+from .search import search_issues
 from .utils import (
     notify_user, send_issue_submitted_email, send_issue_assigned_email,
     send_status_changed_email, send_issue_resolved_email
@@ -13,31 +23,95 @@ from accounts.decorators import student_required, admin_required, maintenance_re
 from accounts.models import User
 
 
+ISSUE_PAGE_SIZE = 25
+DUPLICATE_SESSION_KEY = 'issue_duplicate_suggestions'
+# Columns the issue list template renders
+ISSUE_LIST_FIELDS = ('id', 'title', 'category', 'priority', 'status', 'created_at', 'assigned_to', 'assigned_to__username')
+
+
+def _encode_cursor(issue):
+    raw = '%s|%d' % (issue.created_at.isoformat(), issue.pk)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(value):
+    ts, _, pk = base64.urlsafe_b64decode(value.encode()).decode().partition('|')
+    created_at = parse_datetime(ts)
+    if created_at is None:
+        raise ValueError(value)
+    return created_at, int(pk)
+
+
+def _apply_filters(issues, params, prefix=''):
+    """Narrow ``issues`` by the list page's category/priority/status filters."""
+    for field in ('category', 'priority', 'status'):
+        value = params.get(prefix + field)
+        if value:
+            issues = issues.filter(**{field: value})
+    return issues
+
+
 @login_required
 def issue_list(request):
-    """List issues - filtered by user role."""
-    user = request.user
-    if user.role == 'admin':
-        issues = Issue.objects.all()
-    elif user.role == 'maintenance':
-        issues = Issue.objects.filter(assigned_to=user) | Issue.objects.filter(assigned_to__isnull=True)
+    """List issues - filtered by user role, newest first, keyset-paginated.
+
+    ``?before=<cursor>`` shows the next older page and ``?after=<cursor>`` the
+    next newer one, so each page is an index range scan on ``(created_at, id)``
+    however deep it is. ``?q=`` switches to ranked full-text search.
+    """
+    issues = _apply_filters(Issue.objects.visible_to(request.user), request.GET)
+    issues = issues.select_related('assigned_to').only(*ISSUE_LIST_FIELDS)
+
+    # Filters carried over to the paging links
+    query = request.GET.copy()
+    for key in ('before', 'after', 'page'):
+        query.pop(key, None)
+    context = {
+        'issue_category_choices': Issue.CATEGORY_CHOICES,
+        'filter_query': query.urlencode(),
+        'bulk_form': IssueBulkForm() if request.user.role == 'admin' else None,
+    }
+
+    search = request.GET.get('q', '').strip()
+    if search:
+        # Ranked search pages by offset: relevance order has no stable keyset
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        rows, has_next = search_issues(issues, search, page=page, page_size=ISSUE_PAGE_SIZE)
+        context.update({
+            'issues': rows, 'search': search,
+            'prev_page': page - 1 if page > 1 else None,
+            'next_page': page + 1 if has_next else None,
+        })
+        return render(request, 'issues/issue_list.html', context)
+
+    try:
+        before = _decode_cursor(request.GET['before']) if request.GET.get('before') else None
+        after = _decode_cursor(request.GET['after']) if request.GET.get('after') else None
+    except (ValueError, TypeError):
+        before = after = None
+    if after:
+        ts, pk = after
+        issues = issues.filter(Q(created_at__gt=ts) | Q(created_at=ts, id__gt=pk))
+        rows = list(issues.order_by('created_at', 'id')[:ISSUE_PAGE_SIZE + 1])
+        has_newer, has_older = len(rows) > ISSUE_PAGE_SIZE, True
+        rows = list(reversed(rows[:ISSUE_PAGE_SIZE]))
     else:
-        issues = Issue.objects.filter(reported_by=user)
-
-    category = request.GET.get('category')
-    priority = request.GET.get('priority')
-    status = request.GET.get('status')
-    if category:
-        issues = issues.filter(category=category)
-    if priority:
-        issues = issues.filter(priority=priority)
-    if status:
-        issues = issues.filter(status=status)
-
-    return render(request, 'issues/issue_list.html', {
-        'issues': issues,
-        'issue_category_choices': Issue.CATEGORY_CHOICES
+        if before:
+            ts, pk = before
+            issues = issues.filter(Q(created_at__lt=ts) | Q(created_at=ts, id__lt=pk))
+        rows = list(issues.order_by('-created_at', '-id')[:ISSUE_PAGE_SIZE + 1])
+        has_newer, has_older = before is not None, len(rows) > ISSUE_PAGE_SIZE
+        rows = rows[:ISSUE_PAGE_SIZE]
+
+    context.update({
+        'issues': rows,
+        'older_cursor': _encode_cursor(rows[-1]) if rows and has_older else None,
+        'newer_cursor': _encode_cursor(rows[0]) if rows and has_newer else None,
     })
+    return render(request, 'issues/issue_list.html', context)
 
 
 @student_required
@@ -46,11 +120,22 @@ def issue_create(request):
     if request.method == 'POST':
         form = IssueForm(request.POST, request.FILES)
         if form.is_valid():
-            issue = form.save(commit=False)
-            issue.reported_by = request.user
-            issue.save()
-            notify_user(request.user, 'Issue Submitted', f'Your issue "{issue.title}" has been submitted.', f'/issues/{issue.id}/')
-            send_issue_submitted_email(issue)
+            with transaction.atomic():
+                issue = form.save(commit=False)
+                issue.reported_by = request.user
+                if issue.image:
+                    fingerprint_upload(issue)
+                issue.save()
+                notify_user(request.user, 'Issue Submitted', f'Your issue "{issue.title}" has been submitted.', f'/issues/{issue.id}/')
+                send_issue_submitted_email(issue)
+                signature = index_issue(issue)
+                schedule_processing(issue)
+            matches = find_duplicates(issue, signature)
+            if matches:
+                # Shown once on the detail page so the reporter can link the issue
+                suggestions = request.session.get(DUPLICATE_SESSION_KEY, {})
+                suggestions[str(issue.pk)] = [candidate.pk for candidate, _ in matches]
+                request.session[DUPLICATE_SESSION_KEY] = suggestions
             messages.success(request, 'Issue submitted successfully!')
             return redirect('issues:issue_detail', pk=issue.pk)
         messages.error(request, 'Please correct the errors below.')
@@ -59,25 +144,84 @@ def issue_create(request):
     return render(request, 'issues/issue_form.html', {'form': form, 'action': 'Submit'})
 
 
+def can_view_issue(user, issue):
+    """Students see their own issues; staff see theirs and unassigned ones."""
+    if user.role == 'student' and issue.reported_by_id != user.pk:
+        return False
+    if user.role == 'maintenance' and issue.assigned_to_id and issue.assigned_to_id != user.pk:
+        return False
+    return True
+
+
 @login_required
 def issue_detail(request, pk):
     """View issue details."""
     issue = get_object_or_404(Issue, pk=pk)
     user = request.user
-    if user.role == 'student' and issue.reported_by != user:
-        messages.error(request, 'You do not have permission to view this issue.')
-        return redirect('issues:issue_list')
-    if user.role == 'maintenance' and issue.assigned_to != user and issue.assigned_to:
+    if not can_view_issue(user, issue):
         messages.error(request, 'You do not have permission to view this issue.')
         return redirect('issues:issue_list')
 
     assign_form = IssueAssignForm(instance=issue) if user.role == 'admin' else None
     status_form = IssueStatusForm(instance=issue) if user.role in ('admin', 'maintenance') else None
+    possible_duplicates = []
+    suggestions = request.session.get(DUPLICATE_SESSION_KEY, {})
+    if str(issue.pk) in suggestions:
+        ids = suggestions.pop(str(issue.pk))
+        request.session[DUPLICATE_SESSION_KEY] = suggestions
+        if issue.reported_by == user and issue.duplicate_of_id is None:
+            possible_duplicates = list(Issue.objects.filter(
+                id__in=ids, status__in=OPEN_STATUSES, location_building__iexact=issue.location_building,
+            ).only('id', 'title', 'status', 'location_building', 'location_room', 'created_at'))
     return render(request, 'issues/issue_detail.html', {
-        'issue': issue, 'assign_form': assign_form, 'status_form': status_form
+        'issue': issue, 'assign_form': assign_form, 'status_form': status_form,
+        'possible_duplicates': possible_duplicates,
     })
 
 
+@login_required
+@require_http_methods(['GET', 'HEAD'])
+def issue_photo(request, pk, width=None, fmt=None):
+    """An issue's photo, or one of its thumbnails, for users allowed to see the issue."""
+    issue = get_object_or_404(Issue.objects.only(
+        'id', 'image', 'image_variants', 'reported_by_id', 'assigned_to_id'), pk=pk)
+    if not issue.image or not can_view_issue(request.user, issue):
+        raise Http404('No photo')
+    name = issue.image.name
+    if width is not None:
+        name = issue.image_variants.get('sizes', {}).get(str(width), {}).get(fmt)
+        if not name:
+            raise Http404('No such thumbnail')
+    return serve_media(request, name, request.GET.get('v'))
+
+
+@login_required
+@require_http_methods(['POST'])
+def issue_link_duplicate(request, pk):
+    """Reporter (or an admin) marks an issue as a duplicate of one the duplicate check suggests."""
+    issue = get_object_or_404(Issue, pk=pk)
+    if issue.reported_by != request.user and request.user.role != 'admin':
+        messages.error(request, 'Permission denied.')
+        return redirect('issues:issue_list')
+    # Only issues the duplicate check itself suggests: any other pk would let
+    # a reporter probe for issues they can't see
+    original = next((candidate for candidate, _ in find_duplicates(issue)
+                     if str(candidate.pk) == request.POST.get('duplicate_of')
+                     and candidate.location_building.lower() == issue.location_building.lower()), None)
+    if original is None:
+        messages.error(request, 'That issue cannot be linked.')
+        return redirect('issues:issue_detail', pk=pk)
+    with transaction.atomic():
+        issue.duplicate_of = original
+        issue.save(update_fields=['duplicate_of', 'updated_at'])
+        IssueHistory.objects.create(
+            issue=issue, old_status=issue.status, new_status=issue.status,
+            changed_by=request.user, notes=f'Linked as a duplicate of #{original.pk}'
+        )
+    messages.success(request, f'Linked to issue #{original.pk}. Maintenance will handle both together.')
+    return redirect('issues:issue_detail', pk=pk)
+
+
 @admin_required
 def issue_assign(request, pk):
     """Admin assigns issue to staff."""
@@ -86,16 +230,52 @@ def issue_assign(request, pk):
         form = IssueAssignForm(request.POST, instance=issue)
         if form.is_valid():
             old_assigned = issue.assigned_to
-            form.save()
-            if issue.assigned_to != old_assigned:
-                notify_user(issue.reported_by, 'Issue Assigned', f'Issue "{issue.title}" has been assigned.', f'/issues/{issue.id}/')
-                if issue.assigned_to:
-                    notify_user(issue.assigned_to, 'New Assignment', f'You have been assigned: {issue.title}', f'/issues/{issue.id}/')
-                send_issue_assigned_email(issue)
+            with transaction.atomic():
+                form.save()
+                if issue.assigned_to != old_assigned:
+                    notify_user(issue.reported_by, 'Issue Assigned', f'Issue "{issue.title}" has been assigned.', f'/issues/{issue.id}/')
+                    if issue.assigned_to:
+                        notify_user(issue.assigned_to, 'New Assignment', f'You have been assigned: {issue.title}', f'/issues/{issue.id}/')
+                    send_issue_assigned_email(issue)
             messages.success(request, 'Issue updated.')
     return redirect('issues:issue_detail', pk=pk)
 
 
+@admin_required
+@require_http_methods(['POST'])
+def issue_bulk_update(request):
+    """Assign or change the status of many issues at once.
+
+    Applies to the checked ``ids``, or with ``scope=filter`` to every issue
+    matching the list filters posted as ``filter_<field>``.
+    """
+    form = IssueBulkForm(request.POST)
+    back = redirect('%s?%s' % (reverse('issues:issue_list'), request.POST.get('filter_query', '')))
+    if not form.is_valid():
+        messages.error(request, ' '.join(form.non_field_errors()) or 'Please choose a valid bulk action.')
+        return back
+    if request.POST.get('scope') == 'filter':
+        issues = _apply_filters(Issue.objects.all(), request.POST, prefix='filter_')
+    else:
+        ids = [int(i) for i in request.POST.getlist('ids') if i.isdigit()]
+        if not ids:
+            messages.error(request, 'Select at least one issue.')
+            return back
+        issues = Issue.objects.filter(id__in=ids)
+    try:
+        if form.cleaned_data['action'] == 'assign':
+            count = bulk_assign(issues, form.cleaned_data['assigned_to'])
+        else:
+            count = bulk_set_status(issues, form.cleaned_data['status'], request.user,
+                                    notes=form.cleaned_data['resolution_notes'])
+    except BulkLimitExceeded as exc:
+        messages.error(request, f'{exc.count} issues match; bulk actions are limited to {exc.limit} '
+                                f'at a time. Narrow the filters and try again.')
+        return back
+    messages.success(request, f'Updated {count} issue{"s" if count != 1 else ""}.')
+    return back
+
+
 @maintenance_required
 def issue_update_status(request, pk):
     """Maintenance staff updates issue status."""
@@ -112,14 +292,15 @@ def issue_update_status(request, pk):
                 from django.utils import timezone
                 issue.resolved_at = timezone.now()
                 issue.resolution_notes = form.cleaned_data.get('resolution_notes', '') or issue.resolution_notes
-            issue.save()
-            IssueHistory.objects.create(
-                issue=issue, old_status=old_status, new_status=issue.status,
-                changed_by=request.user, notes=issue.resolution_notes or ''
-            )
-            notify_user(issue.reported_by, 'Status Update', f'Issue "{issue.title}" is now {issue.status}.', f'/issues/{issue.id}/')
-            send_status_changed_email(issue, old_status, issue.status)
-            if issue.status == 'resolved':
-                send_issue_resolved_email(issue)
+            with transaction.atomic():
+                issue.save()
+                IssueHistory.objects.create(
+                    issue=issue, old_status=old_status, new_status=issue.status,
+                    changed_by=request.user, notes=issue.resolution_notes or ''
+                )
+                notify_user(issue.reported_by, 'Status Update', f'Issue "{issue.title}" is now {issue.status}.', f'/issues/{issue.id}/')
+                send_status_changed_email(issue, old_status, issue.status)
+                if issue.status == 'resolved':
+                    send_issue_resolved_email(issue)
             messages.success(request, 'Status updated.')
     return redirect('issues:issue_detail', pk=pk)